@@ -1,27 +1,7 @@
 import streamlit as st
-import psycopg2
 import pandas as pd
 from datetime import datetime
-
-# Функція для підключення до бази даних PostgreSQL
-def connect_to_db():
-    try:
-        # Підключаємося до бази даних, використовуючи секрети зі Streamlit
-        connection = psycopg2.connect(
-            host=st.secrets["db_host"],
-            database=st.secrets["db_name"],
-            user=st.secrets["db_username"],
-            password=st.secrets["db_password"],
-            port=st.secrets["db_port"],
-            sslmode=st.secrets["ssl_mode"],
-            sslrootcert=st.secrets["db_ssl_root_cert"]
-        )
-        st.write("Successfully connected to the database")
-        return connection
-    except Exception as e:
-        st.error(f"Error connecting to the database: {e}")
-        return None
-
+from db_pool import db_connection
 
 # Функція для рендерингу сітки змін за місяцями
 def render_contribution_chart_by_months(change_dates, selected_year):
@@ -110,56 +90,55 @@ def render_contribution_chart_by_months(change_dates, selected_year):
 
 # Основна функція для відображення даних у Streamlit
 def main():
-    # Підключаємося до бази даних
-    conn = connect_to_db()
-
-    if conn:
-        st.title("Аналіз Конкурентів")
-
-        # Візуалізація змін контенту
-        with st.expander("Візуалізація змін контенту", expanded=False):
-            st.subheader('Візуалізація змін контенту для конкурентів')
-            competitor = st.selectbox("Виберіть конкурента",
-                                      ['docebo_com', 'ispringsolutions_com', 'talentlms_com', 'paradisosolutions_com'],
-                                      key="content_competitor_selectbox")
-
-            view_all = st.checkbox("Показати всі зміни конкурента", key="content_view_all_checkbox")
-
-            if view_all:
-                query = f"SELECT change_date FROM content_changes_temp WHERE competitor_name = '{competitor}'"
-                df = pd.read_sql(query, conn)
-
-                if not df.empty:
-                    # Додаємо selectbox для вибору року після вибору сторінки
-                    selected_year = st.selectbox("Оберіть рік", [2024, 2025], key="year_selectbox")
-
-                    st.subheader(f"Загальні зміни для {competitor} у {selected_year} році")
-                    render_contribution_chart_by_months(df, selected_year)
+    # Підключаємося до бази даних (з'єднання береться з пулу і повертається після рендерингу)
+    with db_connection() as conn:
+        if conn:
+            st.title("Аналіз Конкурентів")
+
+            # Візуалізація змін контенту
+            with st.expander("Візуалізація змін контенту", expanded=False):
+                st.subheader('Візуалізація змін контенту для конкурентів')
+                competitor = st.selectbox("Виберіть конкурента",
+                                          ['docebo_com', 'ispringsolutions_com', 'talentlms_com', 'paradisosolutions_com'],
+                                          key="content_competitor_selectbox")
+
+                view_all = st.checkbox("Показати всі зміни конкурента", key="content_view_all_checkbox")
+
+                if view_all:
+                    query = f"SELECT change_date FROM content_changes_temp WHERE competitor_name = '{competitor}'"
+                    df = pd.read_sql(query, conn)
+
+                    if not df.empty:
+                        # Додаємо selectbox для вибору року після вибору сторінки
+                        selected_year = st.selectbox("Оберіть рік", [2024, 2025], key="year_selectbox")
+
+                        st.subheader(f"Загальні зміни для {competitor} у {selected_year} році")
+                        render_contribution_chart_by_months(df, selected_year)
+                    else:
+                        st.write("Немає змін для цього конкурента.")
                 else:
-                    st.write("Немає змін для цього конкурента.")
-            else:
-                page_query = f"SELECT DISTINCT url FROM content_changes_temp WHERE competitor_name = '{competitor}'"
-                pages = pd.read_sql(page_query, conn)['url'].tolist()
+                    page_query = f"SELECT DISTINCT url FROM content_changes_temp WHERE competitor_name = '{competitor}'"
+                    pages = pd.read_sql(page_query, conn)['url'].tolist()
 
-                if not pages:
-                    st.write("Немає доступних сторінок для цього конкурента.")
-                    return
+                    if not pages:
+                        st.write("Немає доступних сторінок для цього конкурента.")
+                        return
 
-                page = st.selectbox("Виберіть сторінку", pages, key="content_page_selectbox")
+                    page = st.selectbox("Виберіть сторінку", pages, key="content_page_selectbox")
 
-                query = f"SELECT change_date FROM content_changes_temp WHERE competitor_name = '{competitor}' AND url = '{page}'"
-                df = pd.read_sql(query, conn)
+                    query = f"SELECT change_date FROM content_changes_temp WHERE competitor_name = '{competitor}' AND url = '{page}'"
+                    df = pd.read_sql(query, conn)
 
-                if not df.empty:
-                    # Додаємо selectbox для вибору року після вибору сторінки
-                    selected_year = st.selectbox("Оберіть рік", [2024, 2025], key="year_selectbox")
+                    if not df.empty:
+                        # Додаємо selectbox для вибору року після вибору сторінки
+                        selected_year = st.selectbox("Оберіть рік", [2024, 2025], key="year_selectbox")
 
-                    st.markdown(f"<p style='font-size:12px;color:gray;'>Зміни для сторінки: {page} у {selected_year} році</p>",
-                                unsafe_allow_html=True)
-                    render_contribution_chart_by_months(df, selected_year)
-                else:
-                    st.markdown("<p style='font-size:10px;color:gray;'>Немає змін для цієї сторінки.</p>",
-                                unsafe_allow_html=True)
+                        st.markdown(f"<p style='font-size:12px;color:gray;'>Зміни для сторінки: {page} у {selected_year} році</p>",
+                                    unsafe_allow_html=True)
+                        render_contribution_chart_by_months(df, selected_year)
+                    else:
+                        st.markdown("<p style='font-size:10px;color:gray;'>Немає змін для цієї сторінки.</p>",
+                                    unsafe_allow_html=True)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,114 @@
+from datetime import datetime
+
+import pandas as pd
+import streamlit as st
+from psycopg2.extras import execute_values
+
+from content_changes import refresh_change_rollup_if_stale
+
+# Як часто (у секундах) реєстр конкурентів оновлюється з каталогу та агрегатів змін
+COMPETITOR_REGISTRY_TTL = 600
+# Таблиці знімків конкурентів названі за доменом: docebo_com, talentlms_com, ...
+COMPETITOR_TABLE_PATTERN = '%_com'
+
+
+# Функція для створення таблиці реєстру конкурентів
+def create_competitors_table_if_not_exists(conn):
+    cursor = conn.cursor()
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS competitors (
+            name TEXT PRIMARY KEY,
+            has_snapshots BOOLEAN NOT NULL DEFAULT FALSE,
+            row_count BIGINT NOT NULL DEFAULT 0,
+            last_snapshot DATE,
+            change_count BIGINT NOT NULL DEFAULT 0,
+            last_change DATE,
+            refreshed_at TIMESTAMP NOT NULL
+        );
+    ''')
+    conn.commit()
+    cursor.close()
+
+
+# Функція для оновлення реєстру конкурентів: таблиці знімків беруться з каталогу Postgres,
+# кількість змін — з щоденних агрегатів content_changes_daily (без сканування журналу змін).
+# Повертає кількість конкурентів у реєстрі.
+def refresh_competitor_registry(conn):
+    try:
+        create_competitors_table_if_not_exists(conn)
+        # Агрегати змін мають бути актуальними, інакше нові конкуренти з'являться лише після наступного оновлення
+        refresh_change_rollup_if_stale(conn)
+        cursor = conn.cursor()
+
+        # Кількість рядків — оцінка зі статистики Postgres, щоб не рахувати COUNT(*) по кожній таблиці
+        cursor.execute('''
+            SELECT c.relname, GREATEST(c.reltuples, 0)::bigint
+            FROM pg_class c
+            JOIN pg_namespace n ON n.oid = c.relnamespace
+            WHERE n.nspname = current_schema() AND c.relkind IN ('r', 'p') AND c.relname LIKE %s
+        ''', (COMPETITOR_TABLE_PATTERN,))
+        registry = {}
+        for name, row_count in cursor.fetchall():
+            cursor.execute(f'SELECT MAX(date_checked)::date FROM {name}')
+            registry[name] = [True, row_count, cursor.fetchone()[0], 0, None]
+
+        cursor.execute('''
+            SELECT competitor_name, SUM(change_count), MAX(day)
+            FROM content_changes_daily
+            GROUP BY competitor_name
+        ''')
+        for name, change_count, last_change in cursor.fetchall():
+            entry = registry.setdefault(name, [False, 0, None, 0, None])
+            entry[3], entry[4] = change_count, last_change
+
+        refreshed_at = datetime.now()
+        if registry:
+            execute_values(cursor, '''
+                INSERT INTO competitors (name, has_snapshots, row_count, last_snapshot, change_count, last_change,
+                                         refreshed_at)
+                VALUES %s
+                ON CONFLICT (name) DO UPDATE
+                SET has_snapshots = EXCLUDED.has_snapshots, row_count = EXCLUDED.row_count,
+                    last_snapshot = EXCLUDED.last_snapshot, change_count = EXCLUDED.change_count,
+                    last_change = EXCLUDED.last_change, refreshed_at = EXCLUDED.refreshed_at
+            ''', [(name, *entry, refreshed_at) for name, entry in registry.items()])
+        # Конкуренти, яких більше немає ні в каталозі, ні в змінах, видаляються з реєстру
+        cursor.execute('DELETE FROM competitors WHERE refreshed_at < %s', (refreshed_at,))
+        conn.commit()
+        cursor.close()
+        return len(registry)
+    except Exception as e:
+        conn.rollback()
+        st.error(f"Помилка при оновленні реєстру конкурентів: {e}")
+        return 0
+
+
+# Оновлення реєстру не частіше ніж раз на COMPETITOR_REGISTRY_TTL секунд для всього процесу
+@st.cache_data(ttl=COMPETITOR_REGISTRY_TTL, show_spinner=False)
+def refresh_competitor_registry_if_stale(_conn):
+    return refresh_competitor_registry(_conn)
+
+
+# Функція для отримання реєстру конкурентів з метаданими (кількість рядків, дата останнього знімка, зміни)
+def get_competitor_registry(conn):
+    refresh_competitor_registry_if_stale(conn)
+    query = """
+        SELECT name, has_snapshots, row_count, last_snapshot, change_count, last_change, refreshed_at
+        FROM competitors
+        ORDER BY name
+    """
+    return pd.read_sql(query, conn)
+
+
+# Функція для отримання конкурентів, для яких є таблиця знімків сторінок
+def get_snapshot_competitors(conn):
+    refresh_competitor_registry_if_stale(conn)
+    query = "SELECT name FROM competitors WHERE has_snapshots ORDER BY name"
+    return pd.read_sql(query, conn)['name'].tolist()
+
+
+# Функція для отримання конкурентів, для яких є зміни контенту
+def get_change_competitors(conn):
+    refresh_competitor_registry_if_stale(conn)
+    query = "SELECT name FROM competitors WHERE change_count > 0 ORDER BY name"
+    return pd.read_sql(query, conn)['name'].tolist()
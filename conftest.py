@@ -0,0 +1 @@
+# Модулі застосунку лежать у корені репозиторію, тож корінь додається в sys.path для тестів у tests/
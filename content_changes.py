@@ -0,0 +1,221 @@
+import calendar
+import html
+from datetime import date, timedelta
+
+import pandas as pd
+import streamlit as st
+
+from db_pool import create_index_concurrently
+
+
+# Як часто (у секундах) сторінки можуть запускати інкрементальне оновлення агрегатів
+ROLLUP_REFRESH_INTERVAL = 300
+# Скільки останніх днів перераховується при кожному оновленні: так враховуються зміни, які краулер
+# закомітив із запізненням або записав заднім числом (старіші за це вікно зміни не потраплять в агрегати)
+ROLLUP_OVERLAP_DAYS = 3
+ROLLUP_NAME = 'content_changes_daily'
+
+
+# Функція для створення таблиці щоденних агрегатів змін та таблиці водяних знаків
+def create_change_rollup_tables_if_not_exists(conn):
+    cursor = conn.cursor()
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS content_changes_daily (
+            competitor_name TEXT NOT NULL,
+            url TEXT NOT NULL,
+            day DATE NOT NULL,
+            change_count INTEGER NOT NULL,
+            PRIMARY KEY (competitor_name, day, url)
+        );
+        CREATE INDEX IF NOT EXISTS idx_content_changes_daily_url
+            ON content_changes_daily (competitor_name, url, day);
+        CREATE TABLE IF NOT EXISTS rollup_watermarks (
+            name TEXT PRIMARY KEY,
+            last_processed TIMESTAMP
+        );
+    ''')
+    conn.commit()
+    cursor.close()
+
+
+# Функція для створення індексу content_changes за датою зміни, за яким оновлюються агрегати — лише для воркера:
+# content_changes пише краулер, тож індекс будується CONCURRENTLY і не під час рендерингу сторінок
+def create_change_date_index(conn):
+    create_index_concurrently(conn, 'idx_content_changes_change_date', 'content_changes', 'change_date')
+
+
+# Підготовка таблиць агрегатів один раз за час роботи процесу
+@st.cache_resource(show_spinner=False)
+def create_change_rollup_tables_once(_conn):
+    create_change_rollup_tables_if_not_exists(_conn)
+    return True
+
+
+# Функція для оновлення агрегатів: дні, починаючи з ROLLUP_OVERLAP_DAYS днів до водяного знака,
+# перераховуються з content_changes повністю (перший запуск рахує всю історію).
+# Повертає кількість перерахованих рядків content_changes.
+def refresh_change_rollup(conn):
+    try:
+        create_change_rollup_tables_once(conn)
+        cursor = conn.cursor()
+        cursor.execute(
+            'INSERT INTO rollup_watermarks (name, last_processed) VALUES (%s, NULL) ON CONFLICT (name) DO NOTHING',
+            (ROLLUP_NAME,)
+        )
+        # Блокуємо водяний знак, щоб паралельні сесії не перераховували ті самі дні одночасно
+        cursor.execute('SELECT last_processed FROM rollup_watermarks WHERE name = %s FOR UPDATE', (ROLLUP_NAME,))
+        last_processed = cursor.fetchone()[0]
+        window_start = last_processed.date() - timedelta(days=ROLLUP_OVERLAP_DAYS) if last_processed else None
+
+        cursor.execute(
+            "DELETE FROM content_changes_daily WHERE day >= COALESCE(%s::date, '-infinity'::date)",
+            (window_start,)
+        )
+        cursor.execute('''
+            INSERT INTO content_changes_daily (competitor_name, url, day, change_count)
+            SELECT competitor_name, url, change_date::date, COUNT(*)
+            FROM content_changes
+            WHERE change_date >= COALESCE(%s::date, '-infinity'::date)
+            GROUP BY competitor_name, url, change_date::date
+            RETURNING change_count
+        ''', (window_start,))
+        processed_rows = sum(change_count for change_count, in cursor.fetchall())
+
+        cursor.execute('''
+            UPDATE rollup_watermarks
+            SET last_processed = GREATEST(last_processed, (SELECT MAX(change_date) FROM content_changes))
+            WHERE name = %s
+        ''', (ROLLUP_NAME,))
+
+        conn.commit()
+        cursor.close()
+        return processed_rows
+    except Exception as e:
+        conn.rollback()
+        st.error(f"Помилка при оновленні агрегатів змін: {e}")
+        return 0
+
+
+# Оновлення агрегатів не частіше ніж раз на ROLLUP_REFRESH_INTERVAL секунд для всього процесу
+@st.cache_data(ttl=ROLLUP_REFRESH_INTERVAL, show_spinner=False)
+def refresh_change_rollup_if_stale(_conn):
+    return refresh_change_rollup(_conn)
+
+
+# Функція для отримання списку сторінок конкурента, на яких були зміни
+def get_changed_pages(conn, competitor):
+    query = "SELECT DISTINCT url FROM content_changes_daily WHERE competitor_name = %s ORDER BY url"
+    return pd.read_sql(query, conn, params=[competitor])['url'].tolist()
+
+
+# Функція для отримання першого і останнього дня зі змінами; повертає (None, None), якщо змін немає
+def get_change_date_range(conn):
+    cursor = conn.cursor()
+    cursor.execute('SELECT MIN(day), MAX(day) FROM content_changes_daily')
+    date_range = cursor.fetchone()
+    cursor.close()
+    return date_range
+
+
+# Функція для отримання років, у яких були зміни (для всього конкурента або однієї сторінки)
+def get_change_years(conn, competitor, selected_page=None):
+    query = "SELECT DISTINCT EXTRACT(YEAR FROM day)::int AS year FROM content_changes_daily WHERE competitor_name = %s"
+    params = [competitor]
+    if selected_page:
+        query += " AND url = %s"
+        params.append(selected_page)
+    query += " ORDER BY year"
+    return pd.read_sql(query, conn, params=params)['year'].tolist()
+
+
+# Функція для отримання змін конкурента за рік, згрупованих по днях, з таблиці агрегатів.
+# Повертає словник {дата: (кількість змін, [url, ...])}.
+def get_daily_changes(conn, competitor, selected_year, selected_page=None):
+    query = """
+        SELECT day, SUM(change_count) AS change_count, array_agg(url ORDER BY url) AS urls
+        FROM content_changes_daily
+        WHERE competitor_name = %s
+          AND day >= %s AND day < %s
+    """
+    params = [competitor, date(selected_year, 1, 1), date(selected_year + 1, 1, 1)]
+    if selected_page:
+        query += " AND url = %s"
+        params.append(selected_page)
+    query += " GROUP BY day"
+
+    df = pd.read_sql(query, conn, params=params)
+    return {
+        pd.to_datetime(day).date(): (int(change_count), list(urls))
+        for day, change_count, urls in zip(df['day'], df['change_count'], df['urls'])
+    }
+
+
+# Функція для визначення рівня кольору клітинки за кількістю змін
+def _get_contribution_level(count):
+    if count == 0:
+        return 'contribution-box'
+    elif count <= 1:
+        return 'contribution-box contribution-level-1'
+    elif count <= 3:
+        return 'contribution-box contribution-level-2'
+    elif count <= 5:
+        return 'contribution-box contribution-level-3'
+    else:
+        return 'contribution-box contribution-level-4'
+
+
+# Функція для побудови HTML сітки змін за місяцями з уже згрупованих по днях даних
+def build_contribution_grid_html(changes_by_day, selected_year, selected_page=None):
+    months_html = ['<div style="display: flex; flex-wrap: wrap; gap: 20px;">']
+
+    for month in range(1, 13):
+        months_html.append(
+            f'<div style="text-align: center;"><div style="margin-bottom: 5px;">{calendar.month_abbr[month]}</div>'
+            '<div style="display: grid; grid-template-columns: repeat(7, 14px); grid-gap: 2px;">'
+        )
+
+        for day in range(1, calendar.monthrange(selected_year, month)[1] + 1):
+            current_date = date(selected_year, month, day)
+            change_count, pages = changes_by_day.get(current_date, (0, []))
+
+            if not change_count:
+                tooltip = f"{current_date} - немає змін"
+            elif selected_page:
+                tooltip = f"{current_date} - зміни на цій сторінці"
+            else:
+                tooltip = f"{current_date} - зміни:\n" + "\n".join(pages)
+
+            months_html.append(
+                f'<div class="{_get_contribution_level(change_count)}" title="{html.escape(tooltip)}"></div>'
+            )
+
+        months_html.append('</div></div>')
+
+    months_html.append('</div>')
+    return ''.join(months_html)
+
+
+# Функція для рендерингу сітки змін за місяцями
+def render_contribution_chart_by_months(selected_year, conn, competitor, selected_page=None):
+    st.markdown(
+        """
+        <style>
+        .contribution-box {
+            width: 12px;
+            height: 12px;
+            margin: 2px;
+            display: inline-block;
+            background-color: #ebedf0;
+        }
+        .contribution-level-1 { background-color: #c6e48b; }
+        .contribution-level-2 { background-color: #7bc96f; }
+        .contribution-level-3 { background-color: #239a3b; }
+        .contribution-level-4 { background-color: #196127; }
+        </style>
+        """,
+        unsafe_allow_html=True
+    )
+
+    # Усі дані за рік читаємо одним запитом із таблиці щоденних агрегатів
+    changes_by_day = get_daily_changes(conn, competitor, selected_year, selected_page)
+    st.markdown(build_contribution_grid_html(changes_by_day, selected_year, selected_page), unsafe_allow_html=True)
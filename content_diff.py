@@ -0,0 +1,389 @@
+import difflib
+import html
+import re
+import time
+from bisect import bisect_left
+from collections import Counter
+
+# Налаштування порівняння контенту
+DIFF_CONTEXT_LINES = 3  # скільки незмінених рядків показується навколо кожної зміни
+DIFF_MAX_LINES = 20000  # більші сторінки одразу отримують лише зведення змін
+DIFF_TIME_BUDGET = 2.0  # скільки секунд може тривати точне порівняння, перш ніж перейти до зведення
+DIFF_SMALL_REGION = 250000  # ділянки без унікальних рядків такого розміру (рядків до × рядків після) порівнює difflib
+DIFF_MAX_EDITS = 2000  # більші ділянки без унікальних рядків, що відрізняються більше ніж на стільки рядків, дають зведення
+DIFF_WORD_MAX_CHARS = 2000  # довші рядки не підсвічуються по словах
+DIFF_MAX_HUNKS = 200  # скільки фрагментів змін показується на сторінці
+DIFF_SUMMARY_SAMPLE = 50  # скільки доданих і видалених рядків показує зведення
+DEFAULT_DIFF_ENGINE = 'patience'
+
+_WORD_PATTERN = re.compile(r'\s+|\w+|[^\w\s]')
+
+_DIFF_STYLE = """
+    <style>
+        body { font-family: monospace; font-size: 13px; margin: 0; }
+        .diff-stats { padding: 6px 8px; background: #f6f8fa; border-bottom: 1px solid #d0d7de; }
+        .diff-note { padding: 6px 8px; background: #fff8c5; }
+        table.diff { border-collapse: collapse; width: 100%; table-layout: fixed; }
+        table.diff td { padding: 1px 6px; vertical-align: top; white-space: pre-wrap; word-break: break-word; }
+        td.ln { width: 48px; color: #57606a; text-align: right; user-select: none; }
+        tr.hunk td { background: #ddf4ff; color: #57606a; }
+        tr.del td.text { background: #ffebe9; }
+        tr.ins td.text { background: #e6ffec; }
+        tr.del del { background: #ff8182; text-decoration: none; }
+        tr.ins ins { background: #abf2bc; text-decoration: none; }
+    </style>
+"""
+
+
+# Виняток, яким точне порівняння повідомляє про перевищення бюджету часу
+class DiffBudgetExceeded(Exception):
+    pass
+
+
+# Функція для кодування рядків цілими числами: однакові рядки отримують однаковий код,
+# тож подальші порівняння — це порівняння чисел, а не текстів
+def _encode_lines(before_lines, after_lines):
+    codes = {}
+    before = [codes.setdefault(line, len(codes)) for line in before_lines]
+    after = [codes.setdefault(line, len(codes)) for line in after_lines]
+    return before, after
+
+
+# Функція для пошуку опорних рядків patience diff: рядки, унікальні в обох ділянках,
+# з яких вибирається найдовша зростаюча послідовність (сортування "пасьянсом", O(n log n))
+def _unique_anchors(a, b, alo, ahi, blo, bhi):
+    a_counts = Counter(a[alo:ahi])
+    b_counts = Counter(b[blo:bhi])
+    b_positions = {b[j]: j for j in range(blo, bhi) if b_counts[b[j]] == 1}
+    pairs = [(i, b_positions[a[i]]) for i in range(alo, ahi) if a_counts[a[i]] == 1 and a[i] in b_positions]
+
+    tails = []
+    tail_indexes = []
+    previous = [None] * len(pairs)
+    for k, (_, j) in enumerate(pairs):
+        pos = bisect_left(tails, j)
+        if pos == len(tails):
+            tails.append(j)
+            tail_indexes.append(k)
+        else:
+            tails[pos] = j
+            tail_indexes[pos] = k
+        previous[k] = tail_indexes[pos - 1] if pos else None
+
+    anchors = []
+    k = tail_indexes[-1] if tail_indexes else None
+    while k is not None:
+        anchors.append(pairs[k])
+        k = previous[k]
+    return anchors[::-1]
+
+
+# Функція для перетворення відсортованих пар однакових рядків на операції у форматі difflib
+def _matches_to_opcodes(matches, before_len, after_len):
+    opcodes = []
+    i = j = 0
+    for match_i, match_j in matches + [(before_len, after_len)]:
+        if i < match_i and j < match_j:
+            opcodes.append(('replace', i, match_i, j, match_j))
+        elif i < match_i:
+            opcodes.append(('delete', i, match_i, j, match_j))
+        elif j < match_j:
+            opcodes.append(('insert', i, match_i, j, match_j))
+        if match_i == before_len:
+            break
+        if opcodes and opcodes[-1][0] == 'equal':
+            tag, i1, _, j1, _ = opcodes.pop()
+            opcodes.append((tag, i1, match_i + 1, j1, match_j + 1))
+        else:
+            opcodes.append(('equal', match_i, match_i + 1, match_j, match_j + 1))
+        i, j = match_i + 1, match_j + 1
+    return opcodes
+
+
+# Функція для пошуку однакових рядків ділянки алгоритмом Маєрса O((N+M)·D): для великих ділянок без унікальних
+# рядків (повторювані шаблонні рядки), де difflib був би квадратичним. Пам'ять — O(D²) для відновлення шляху,
+# тому ділянки, що відрізняються більше ніж на DIFF_MAX_EDITS рядків, не порівнюються точно (DiffBudgetExceeded).
+# Повертає список пар (індекс у a, індекс у b) однакових рядків.
+def _myers_matches(a, b, alo, ahi, blo, bhi, deadline=None):
+    n, m = ahi - alo, bhi - blo
+    max_d = min(n + m, DIFF_MAX_EDITS)
+    offset = max_d + 1
+    v = [0] * (2 * max_d + 3)
+    # trace[d] — стан v (для k від -d до d) перед кроком d
+    trace = []
+    for d in range(max_d + 1):
+        if deadline is not None and time.monotonic() > deadline:
+            raise DiffBudgetExceeded()
+        trace.append(v[offset - d:offset + d + 1])
+        for k in range(-d, d + 1, 2):
+            if k == -d or (k != d and v[offset + k - 1] < v[offset + k + 1]):
+                x = v[offset + k + 1]
+            else:
+                x = v[offset + k - 1] + 1
+            y = x - k
+            while x < n and y < m and a[alo + x] == b[blo + y]:
+                x += 1
+                y += 1
+            v[offset + k] = x
+            if x >= n and y >= m:
+                return _myers_backtrack(trace, n, m, alo, blo)
+    raise DiffBudgetExceeded()
+
+
+# Функція для відновлення однакових рядків з ходів алгоритму Маєрса (від кінця ділянки до початку)
+def _myers_backtrack(trace, n, m, alo, blo):
+    matches = []
+    x, y = n, m
+    for d in range(len(trace) - 1, -1, -1):
+        k = x - y
+        if d == 0:
+            prev_x = prev_y = 0
+        else:
+            state = trace[d]
+            if k == -d or (k != d and state[k - 1 + d] < state[k + 1 + d]):
+                prev_k = k + 1
+            else:
+                prev_k = k - 1
+            prev_x = state[prev_k + d]
+            prev_y = prev_x - prev_k
+        while x > prev_x and y > prev_y:
+            x -= 1
+            y -= 1
+            matches.append((alo + x, blo + y))
+        x, y = prev_x, prev_y
+    return matches
+
+
+# Рушій patience diff: спільні початок і кінець відкидаються, ділянки діляться за унікальними рядками,
+# а ділянки без унікальних рядків порівнюються difflib (невеликі) або алгоритмом Маєрса (великі).
+# Повертає операції у форматі SequenceMatcher.get_opcodes().
+def patience_opcodes(a, b, deadline=None):
+    matches = []
+    ranges = [(0, len(a), 0, len(b))]
+    while ranges:
+        if deadline is not None and time.monotonic() > deadline:
+            raise DiffBudgetExceeded()
+        alo, ahi, blo, bhi = ranges.pop()
+        while alo < ahi and blo < bhi and a[alo] == b[blo]:
+            matches.append((alo, blo))
+            alo += 1
+            blo += 1
+        while alo < ahi and blo < bhi and a[ahi - 1] == b[bhi - 1]:
+            ahi -= 1
+            bhi -= 1
+            matches.append((ahi, bhi))
+        if alo == ahi or blo == bhi:
+            continue
+
+        anchors = _unique_anchors(a, b, alo, ahi, blo, bhi)
+        if anchors:
+            prev_i, prev_j = alo, blo
+            for i, j in anchors:
+                matches.append((i, j))
+                ranges.append((prev_i, i, prev_j, j))
+                prev_i, prev_j = i + 1, j + 1
+            ranges.append((prev_i, ahi, prev_j, bhi))
+        elif (ahi - alo) * (bhi - blo) <= DIFF_SMALL_REGION:
+            matcher = difflib.SequenceMatcher(None, a[alo:ahi], b[blo:bhi], autojunk=False)
+            for i, j, size in matcher.get_matching_blocks():
+                matches.extend((alo + i + k, blo + j + k) for k in range(size))
+        else:
+            matches.extend(_myers_matches(a, b, alo, ahi, blo, bhi, deadline))
+    matches.sort()
+    return _matches_to_opcodes(matches, len(a), len(b))
+
+
+# Рушій на основі difflib.SequenceMatcher (квадратичний у гіршому випадку; лише для невеликих текстів)
+def difflib_opcodes(a, b, deadline=None):
+    return difflib.SequenceMatcher(None, a, b, autojunk=False).get_opcodes()
+
+
+# Доступні рушії порівняння: функція (коди рядків до, коди рядків після, дедлайн) -> операції difflib
+DIFF_ENGINES = {
+    'patience': patience_opcodes,
+    'difflib': difflib_opcodes,
+}
+
+
+# Функція для групування операцій у фрагменти змін з context незміненими рядками навколо
+# (так само, як SequenceMatcher.get_grouped_opcodes)
+def group_opcodes(opcodes, context=DIFF_CONTEXT_LINES):
+    opcodes = list(opcodes)
+    if not opcodes:
+        return []
+    if opcodes[0][0] == 'equal':
+        tag, i1, i2, j1, j2 = opcodes[0]
+        opcodes[0] = tag, max(i1, i2 - context), i2, max(j1, j2 - context), j2
+    if opcodes[-1][0] == 'equal':
+        tag, i1, i2, j1, j2 = opcodes[-1]
+        opcodes[-1] = tag, i1, min(i2, i1 + context), j1, min(j2, j1 + context)
+
+    groups = []
+    group = []
+    for tag, i1, i2, j1, j2 in opcodes:
+        if tag == 'equal' and i2 - i1 > context * 2:
+            group.append((tag, i1, min(i2, i1 + context), j1, min(j2, j1 + context)))
+            groups.append(group)
+            group = []
+            i1, j1 = max(i1, i2 - context), max(j1, j2 - context)
+        group.append((tag, i1, i2, j1, j2))
+    if group and not (len(group) == 1 and group[0][0] == 'equal'):
+        groups.append(group)
+    return [group for group in groups if any(tag != 'equal' for tag, *_ in group)]
+
+
+# Функція для побудови компактних фрагментів змін: кожен фрагмент — словник з початком і довжиною
+# у старій та новій версії і списком рядків [позначка, текст], де ' ' — контекст, '-' — видалено, '+' — додано
+def build_hunks(before_lines, after_lines, opcodes, context=DIFF_CONTEXT_LINES):
+    hunks = []
+    for group in group_opcodes(opcodes, context):
+        lines = []
+        for tag, i1, i2, j1, j2 in group:
+            if tag == 'equal':
+                lines.extend([' ', line] for line in before_lines[i1:i2])
+                continue
+            lines.extend(['-', line] for line in before_lines[i1:i2])
+            lines.extend(['+', line] for line in after_lines[j1:j2])
+        hunks.append({
+            'before_start': group[0][1] + 1,
+            'before_count': group[-1][2] - group[0][1],
+            'after_start': group[0][3] + 1,
+            'after_count': group[-1][4] - group[0][3],
+            'lines': lines,
+        })
+    return hunks
+
+
+# Функція для грубого зведення змін за лінійний час: порівнюються мультимножини рядків без їхнього порядку
+def summarize_changes(before_lines, after_lines, sample=DIFF_SUMMARY_SAMPLE):
+    removed = Counter(before_lines) - Counter(after_lines)
+    added = Counter(after_lines) - Counter(before_lines)
+    lines = [['-', line] for line in list(removed)[:sample]] + [['+', line] for line in list(added)[:sample]]
+    return {
+        'added': sum(added.values()),
+        'removed': sum(removed.values()),
+        'coarse': True,
+        'hunks': [{'before_start': 0, 'before_count': 0, 'after_start': 0, 'after_count': 0, 'lines': lines}]
+        if lines else [],
+    }
+
+
+# Функція для порівняння двох версій контенту сторінки.
+# Великі сторінки, порівняння, що не вклалося в time_budget секунд, і великі ділянки з повторюваних рядків
+# з понад DIFF_MAX_EDITS змінами отримують грубе зведення (coarse=True).
+# Повертає словник: added, removed (кількість рядків), coarse і hunks (див. build_hunks).
+def build_content_diff(content_before, content_after, engine=DEFAULT_DIFF_ENGINE, context=DIFF_CONTEXT_LINES,
+                       max_lines=DIFF_MAX_LINES, time_budget=DIFF_TIME_BUDGET):
+    before_lines = (content_before or '').splitlines()
+    after_lines = (content_after or '').splitlines()
+    # Однакові рядки — точно без змін, навіть для великої сторінки (грубе зведення означає, що зміни є)
+    if before_lines == after_lines:
+        return {'added': 0, 'removed': 0, 'coarse': False, 'hunks': []}
+    if len(before_lines) + len(after_lines) > max_lines:
+        return summarize_changes(before_lines, after_lines)
+
+    before, after = _encode_lines(before_lines, after_lines)
+    try:
+        opcodes = DIFF_ENGINES[engine](before, after, time.monotonic() + time_budget)
+    except DiffBudgetExceeded:
+        return summarize_changes(before_lines, after_lines)
+
+    return {
+        'added': sum(j2 - j1 for tag, _, _, j1, j2 in opcodes if tag in ('replace', 'insert')),
+        'removed': sum(i2 - i1 for tag, i1, i2, _, _ in opcodes if tag in ('replace', 'delete')),
+        'coarse': False,
+        'hunks': build_hunks(before_lines, after_lines, opcodes, context),
+    }
+
+
+# Функція для підсвічування змінених слів у парі рядків "було" / "стало"
+def _highlight_words(old_line, new_line):
+    if len(old_line) > DIFF_WORD_MAX_CHARS or len(new_line) > DIFF_WORD_MAX_CHARS:
+        return html.escape(old_line), html.escape(new_line)
+    old_words = _WORD_PATTERN.findall(old_line)
+    new_words = _WORD_PATTERN.findall(new_line)
+    old_html = []
+    new_html = []
+    for tag, i1, i2, j1, j2 in difflib.SequenceMatcher(None, old_words, new_words, autojunk=False).get_opcodes():
+        old_text = html.escape(''.join(old_words[i1:i2]))
+        new_text = html.escape(''.join(new_words[j1:j2]))
+        if tag == 'equal':
+            old_html.append(old_text)
+            new_html.append(new_text)
+            continue
+        if old_text:
+            old_html.append(f'<del>{old_text}</del>')
+        if new_text:
+            new_html.append(f'<ins>{new_text}</ins>')
+    return ''.join(old_html), ''.join(new_html)
+
+
+# Функція для побудови HTML рядків одного фрагмента: видалені та додані рядки, що йдуть поспіль,
+# об'єднуються в пари, щоб підсвітити змінені слова
+def _render_hunk_rows(hunk):
+    rows = []
+    before_no = hunk['before_start']
+    after_no = hunk['after_start']
+    lines = hunk['lines']
+    k = 0
+    while k < len(lines):
+        if lines[k][0] == ' ':
+            text = html.escape(lines[k][1])
+            rows.append(f'<tr><td class="ln">{before_no}</td><td class="ln">{after_no}</td>'
+                        f'<td class="text">{text}</td></tr>')
+            before_no += 1
+            after_no += 1
+            k += 1
+            continue
+
+        removed = []
+        while k < len(lines) and lines[k][0] == '-':
+            removed.append(lines[k][1])
+            k += 1
+        added = []
+        while k < len(lines) and lines[k][0] == '+':
+            added.append(lines[k][1])
+            k += 1
+        removed_html = [html.escape(line) for line in removed]
+        added_html = [html.escape(line) for line in added]
+        for pair in range(min(len(removed), len(added))):
+            removed_html[pair], added_html[pair] = _highlight_words(removed[pair], added[pair])
+
+        for text in removed_html:
+            number = before_no if hunk['before_start'] else ''
+            rows.append(f'<tr class="del"><td class="ln">{number}</td><td class="ln"></td>'
+                        f'<td class="text">{text}</td></tr>')
+            before_no += 1
+        for text in added_html:
+            number = after_no if hunk['after_start'] else ''
+            rows.append(f'<tr class="ins"><td class="ln"></td><td class="ln">{number}</td>'
+                        f'<td class="text">{text}</td></tr>')
+            after_no += 1
+    return rows
+
+
+# Функція для побудови компактного HTML порівняння: статистика і лише змінені фрагменти з контекстом
+def render_diff_html(diff, max_hunks=DIFF_MAX_HUNKS):
+    summary = ' (зведення)' if diff['coarse'] else ''
+    parts = [_DIFF_STYLE, f'<div class="diff-stats">Додано рядків: {diff["added"]}, '
+                          f'видалено рядків: {diff["removed"]}{summary}</div>']
+    if diff['coarse']:
+        parts.append('<div class="diff-note">Детальне порівняння недоступне (сторінка завелика, змін забагато '
+                     'або порівняння не вклалося в час): показано зведення доданих і видалених рядків '
+                     'без їхнього розташування.</div>')
+        if not diff['added'] and not diff['removed']:
+            parts.append('<div class="diff-note">Контент змінився, але набір рядків той самий: '
+                         'рядки переставлено місцями.</div>')
+    hunks = diff['hunks']
+    if len(hunks) > max_hunks:
+        parts.append(f'<div class="diff-note">Показано перші {max_hunks} з {len(hunks)} фрагментів змін.</div>')
+
+    rows = []
+    for hunk in hunks[:max_hunks]:
+        if not diff['coarse']:
+            rows.append(f'<tr class="hunk"><td class="ln"></td><td class="ln"></td>'
+                        f'<td>@@ -{hunk["before_start"]},{hunk["before_count"]} '
+                        f'+{hunk["after_start"]},{hunk["after_count"]} @@</td></tr>')
+        rows.extend(_render_hunk_rows(hunk))
+    parts.append(f'<table class="diff">{"".join(rows)}</table>')
+    return ''.join(parts)
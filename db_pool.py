@@ -0,0 +1,186 @@
+import atexit
+import base64
+import logging
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+
+import psycopg2
+from psycopg2 import pool
+import streamlit as st
+from dotenv import load_dotenv
+
+# Завантаження змінних середовища з файлу .env (для локального запуску без secrets.toml)
+load_dotenv()
+
+# Розмір пулу з'єднань можна змінити через змінні середовища
+POOL_MIN_CONNECTIONS = int(os.getenv('DB_POOL_MIN', 1))
+POOL_MAX_CONNECTIONS = int(os.getenv('DB_POOL_MAX', 10))
+# Скільки секунд сесія чекає на вільне з'єднання, коли всі з'єднання пулу зайняті
+POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 60))
+
+# Помилки дублюються в лог: воркер rank_worker.py працює без сесії Streamlit, і st.error там нікуди не виводиться
+logger = logging.getLogger(__name__)
+
+
+# Функція для читання секрету Streamlit (повертає None, якщо secrets.toml або ключ відсутні)
+def _get_secret(key):
+    try:
+        return st.secrets[key]
+    except Exception:
+        return None
+
+
+# Функція для видалення тимчасового файлу сертифіката при завершенні процесу
+def _remove_file(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+# Функція для отримання шляху до SSL-сертифіката.
+# Сертифікат із secrets декодується з Base64 і записується у тимчасовий файл лише один раз на процес.
+@st.cache_resource
+def _get_ssl_cert_path(ssl_root_cert):
+    if os.path.isfile(ssl_root_cert):
+        return ssl_root_cert
+
+    ssl_cert_decoded = base64.b64decode(ssl_root_cert)
+    with tempfile.NamedTemporaryFile(delete=False, suffix='.crt') as cert_file:
+        cert_file.write(ssl_cert_decoded)
+        cert_file_path = cert_file.name
+
+    atexit.register(_remove_file, cert_file_path)
+    return cert_file_path
+
+
+# Функція для формування параметрів підключення: спочатку st.secrets, потім змінні середовища
+def _get_connection_params():
+    if _get_secret("db_host"):
+        params = {
+            'host': _get_secret("db_host"),
+            'database': _get_secret("db_name"),
+            'user': _get_secret("db_username"),
+            'password': _get_secret("db_password"),
+            'port': _get_secret("db_port"),
+            'sslmode': _get_secret("ssl_mode"),
+        }
+        ssl_root_cert = _get_secret("db_ssl_root_cert")
+        if ssl_root_cert:
+            params['sslrootcert'] = _get_ssl_cert_path(ssl_root_cert)
+    else:
+        params = {
+            'host': os.getenv('DB_HOST', 'localhost'),
+            'database': os.getenv('DB_NAME', 'competitor_content'),
+            'user': os.getenv('DB_USER'),
+            'password': os.getenv('DB_PASSWORD'),
+            'port': os.getenv('DB_PORT'),
+        }
+
+    # Не передаємо в psycopg2 параметри, які не задані
+    return {key: value for key, value in params.items() if value is not None}
+
+
+# Пул з'єднань, спільний для всіх сесій і сторінок процесу Streamlit
+@st.cache_resource
+def get_connection_pool():
+    return pool.ThreadedConnectionPool(POOL_MIN_CONNECTIONS, POOL_MAX_CONNECTIONS, **_get_connection_params())
+
+
+# Семафор на розмір пулу: ThreadedConnectionPool.getconn одразу кидає PoolError, коли всі з'єднання зайняті,
+# тож нова сесія спершу чекає на семафорі, поки інша сесія поверне з'єднання
+@st.cache_resource
+def _get_pool_semaphore():
+    return threading.BoundedSemaphore(POOL_MAX_CONNECTIONS)
+
+
+# Функція для перевірки, що з'єднання з пулу ще живе
+def _is_healthy(connection):
+    if connection.closed:
+        return False
+    try:
+        cursor = connection.cursor()
+        cursor.execute('SELECT 1')
+        cursor.close()
+        connection.rollback()
+        return True
+    except psycopg2.Error:
+        return False
+
+
+# Функція для отримання з'єднання з пулу.
+# Мертві з'єднання (перезапуск БД, обрив TLS) відкидаються, і пул прозоро відкриває нові.
+# Якщо всі з'єднання зайняті, функція чекає до POOL_TIMEOUT секунд.
+def connect_to_db():
+    semaphore = _get_pool_semaphore()
+    if not semaphore.acquire(timeout=POOL_TIMEOUT):
+        logger.error("Усі з'єднання з базою даних зайняті довше за %s с", POOL_TIMEOUT)
+        st.error("Error connecting to database: усі з'єднання з базою даних зайняті, спробуйте пізніше")
+        return None
+    try:
+        connection_pool = get_connection_pool()
+        for _ in range(POOL_MAX_CONNECTIONS + 1):
+            connection = connection_pool.getconn()
+            if _is_healthy(connection):
+                return connection
+            connection_pool.putconn(connection, close=True)
+        raise psycopg2.OperationalError("Не вдалося отримати робоче з'єднання з пулу")
+    except Exception as e:
+        semaphore.release()
+        logger.exception("Error connecting to database")
+        st.error(f"Error connecting to database: {e}")
+        return None
+
+
+# Функція для повернення з'єднання в пул
+def release_connection(connection):
+    if connection is None:
+        return
+    try:
+        if not connection.closed:
+            # Не повертаємо в пул незавершену транзакцію
+            connection.rollback()
+    except psycopg2.Error:
+        pass
+    try:
+        get_connection_pool().putconn(connection, close=bool(connection.closed))
+    finally:
+        _get_pool_semaphore().release()
+
+
+# Контекстний менеджер: з'єднання повертається в пул навіть після st.stop() або помилки
+@contextmanager
+def db_connection():
+    connection = connect_to_db()
+    try:
+        yield connection
+    finally:
+        release_connection(connection)
+
+
+# Функція для створення індексу без блокування записів у таблицю (CREATE INDEX CONCURRENTLY).
+# Така команда не виконується всередині транзакції, тож з'єднання тимчасово переводиться в autocommit.
+# Невалідний індекс, що лишився після перерваної побудови, видаляється і будується заново.
+# where — необов'язкова умова часткового індексу.
+def create_index_concurrently(connection, index_name, table_name, columns, where=None):
+    connection.commit()
+    autocommit = connection.autocommit
+    connection.autocommit = True
+    try:
+        cursor = connection.cursor()
+        cursor.execute('''
+            SELECT i.indisvalid
+            FROM pg_class c
+            JOIN pg_index i ON i.indexrelid = c.oid
+            WHERE c.relname = %s AND c.relnamespace = current_schema()::regnamespace
+        ''', (index_name,))
+        index = cursor.fetchone()
+        if index and not index[0]:
+            cursor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {index_name}')
+        predicate = f' WHERE {where}' if where else ''
+        cursor.execute(f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {index_name} ON {table_name} ({columns}){predicate}')
+        cursor.close()
+    finally:
+        connection.autocommit = autocommit
@@ -1,12 +1,14 @@
 import streamlit as st
 import requests
-import psycopg2
 from bs4 import BeautifulSoup
-import re
 import json
 import pandas as pd
 from datetime import datetime
 import logging
+from db_pool import db_connection
+from search_api import API_DAILY_LIMIT, get_api_usage, perform_cached_search
+from page_fetcher import fetch_page_content, fetch_pages_with_progress, get_page_analysis
+from keyword_matcher import build_keyword_matcher, count_keywords
 
 # Логування для відстеження запитів і відповідей
 logging.basicConfig(filename='api_usage.log', level=logging.INFO)
@@ -53,87 +55,6 @@ def get_keywords_by_tag(connection, tag):
         st.error(f"Помилка при отриманні ключових слів за тегом '{tag}': {e}")
         return []
 
-# Функція для отримання використання API
-def get_api_usage(connection, today_str):
-    try:
-        cursor = connection.cursor()
-        cursor.execute('SELECT count FROM api_usage WHERE date = %s', (today_str,))
-        result = cursor.fetchone()
-        if result:
-            cursor.close()
-            return result[0]
-        else:
-            # Якщо запису немає, створити його з count=0
-            cursor.execute('INSERT INTO api_usage (date, count) VALUES (%s, %s)', (today_str, 0))
-            connection.commit()
-            cursor.close()
-            return 0
-    except Exception as e:
-        st.error(f"Помилка при отриманні використання API: {e}")
-        return 0
-
-# Функція для оновлення використання API
-def update_api_usage(connection, today_str, increment=1):
-    try:
-        cursor = connection.cursor()
-        cursor.execute('SELECT count FROM api_usage WHERE date = %s', (today_str,))
-        result = cursor.fetchone()
-        if result:
-            new_count = result[0] + increment
-            cursor.execute('UPDATE api_usage SET count = %s WHERE date = %s', (new_count, today_str))
-        else:
-            cursor.execute('INSERT INTO api_usage (date, count) VALUES (%s, %s)', (today_str, increment))
-        connection.commit()
-        cursor.close()
-    except Exception as e:
-        st.error(f"Помилка при оновленні використання API: {e}")
-
-# Функція для отримання історії використання API
-def get_api_usage_history(connection):
-    try:
-        cursor = connection.cursor()
-        cursor.execute('SELECT date, count FROM api_usage ORDER BY date ASC')
-        data = cursor.fetchall()
-        cursor.close()
-        return data
-    except Exception as e:
-        st.error(f"Помилка при отриманні історії використання API: {e}")
-        return []
-
-# Функція для виконання пошуку
-def perform_search(query, api_key, cx, region=None):
-    url = "https://www.googleapis.com/customsearch/v1"
-    params = {
-        'q': query,
-        'key': api_key,
-        'cx': cx,
-        'num': 10  # Максимум 10 результатів
-    }
-    if region:
-        params['gl'] = region  # Додавання параметра регіону
-
-    try:
-        response = requests.get(url, params=params)
-        response.raise_for_status()
-        results = response.json()
-        return results.get('items', [])
-    except requests.exceptions.RequestException as e:
-        st.error(f"Помилка при отриманні результатів пошуку: {e}")
-        return []
-
-# Функція для отримання контенту сторінки
-def fetch_page_content(url):
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64)"
-    }
-    try:
-        response = requests.get(url, headers=headers, timeout=10)
-        response.raise_for_status()
-        return response.text
-    except requests.exceptions.RequestException as e:
-        st.warning(f"Не вдалося завантажити сторінку {url}: {e}")
-        return ""
-
 # Функція для аналізу контенту сторінки
 def analyze_page_content(html_content, related_keywords):
     soup = BeautifulSoup(html_content, 'html.parser')
@@ -156,17 +77,14 @@ def analyze_page_content(html_content, related_keywords):
     # Отримання основного тексту сторінки
     body_text = soup.get_text(separator=' ', strip=True)
 
-    # Функція для підрахунку кількості входжень ключових слів
-    def count_occurrences(text, keyword):
-        if not text:
-            return 0
-        return len(re.findall(r'\b' + re.escape(keyword.lower()) + r'\b', text.lower()))
+    # Автомат для групи ключових слів будується один раз і кешується
+    matcher = build_keyword_matcher(tuple(related_keywords))
 
-    # Підрахунок кількості ключових слів у різних секціях
-    counts_title = {kw: count_occurrences(title, kw) for kw in related_keywords if count_occurrences(title, kw) > 0}
-    counts_description = {kw: count_occurrences(meta_description, kw) for kw in related_keywords if count_occurrences(meta_description, kw) > 0}
-    counts_headers = {kw: count_occurrences(headers_text, kw) for kw in related_keywords if count_occurrences(headers_text, kw) > 0}
-    counts_content = {kw: count_occurrences(body_text, kw) for kw in related_keywords if count_occurrences(body_text, kw) > 0}
+    # Підрахунок кількості ключових слів у різних секціях (один прохід по кожній секції)
+    counts_title = count_keywords(matcher, title)
+    counts_description = count_keywords(matcher, meta_description)
+    counts_headers = count_keywords(matcher, headers_text)
+    counts_content = count_keywords(matcher, body_text)
 
     # Підсумкова кількість ключових слів
     total_keyword_count = sum(counts_title.values()) + sum(counts_description.values()) + sum(counts_headers.values()) + sum(counts_content.values())
@@ -401,297 +319,295 @@ def main():
         st.warning("Будь ласка, введіть ваші API ключі та CX у бічному меню.")
         st.stop()
 
-    # Підключення до бази даних
-    conn = connect_to_db()
-    if conn is None:
-        st.stop()
+    # Підключення до бази даних (з'єднання береться з пулу і повертається після рендерингу)
+    with db_connection() as conn:
+        if conn is None:
+            st.stop()
 
-    # Перевірка та створення таблиці, якщо вона не існує
-    create_page_analysis_table_if_not_exists(conn)
+        # Перевірка та створення таблиці, якщо вона не існує
+        create_page_analysis_table_if_not_exists(conn)
 
-    # Отримання поточної дати
-    today_str = datetime.now().strftime("%Y-%m-%d")
+        # Отримання поточної дати
+        today_str = datetime.now().strftime("%Y-%m-%d")
 
-    # Отримання використання API
-    current_usage = get_api_usage(conn, today_str)
-    api_limit = 100
+        # Отримання використання API
+        current_usage = get_api_usage(conn, today_str)
+        api_limit = API_DAILY_LIMIT
 
-    # Відображення використання API
-    col1, col2 = st.columns([1, 2])
-    with col1:
-        st.metric("Використано API-запитів сьогодні", f"{current_usage}/{api_limit}")
+        # Відображення використання API
+        col1, col2 = st.columns([1, 2])
+        with col1:
+            st.metric("Використано API-запитів сьогодні", f"{current_usage}/{api_limit}")
 
-    # Отримання ключових слів
-    keywords = get_keywords(conn)
+        # Отримання ключових слів
+        keywords = get_keywords(conn)
 
-    # Додамо змінну для відстеження введеного ключового слова
-    manual_search = False
+        # Додамо змінну для відстеження введеного ключового слова
+        manual_search = False
 
-    # Поле для введення ключового слова від користувача
-    st.subheader("Введіть своє ключове слово для пошуку")
-    user_keyword = st.text_input("Ключове слово", "")
+        # Поле для введення ключового слова від користувача
+        st.subheader("Введіть своє ключове слово для пошуку")
+        user_keyword = st.text_input("Ключове слово", "")
 
-    if st.button("Виконати пошук за введеним ключовим словом"):
-        manual_search = True  # Виконаний ручний пошук
-        if current_usage >= api_limit:
-            st.error("Ви досягли ліміту використання API на сьогодні. Спробуйте завтра.")
-            st.stop()
+        if st.button("Виконати пошук за введеним ключовим словом"):
+            manual_search = True  # Виконаний ручний пошук
+            if not user_keyword:
+                st.warning("Введіть ключове слово для пошуку.")
+                st.stop()
 
-        if not user_keyword:
-            st.warning("Введіть ключове слово для пошуку.")
+            # Виконання пошуку за введеним ключовим словом (повторний пошук береться зі збереженої видачі)
+            search_results, from_cache = perform_cached_search(conn, user_keyword, api_key, cx,
+                                                               region=region_code, api_limit=api_limit)
+            if not search_results:
+                st.info("Не вдалося знайти результати за цим ключовим словом.")
+                st.stop()
+            if from_cache:
+                st.caption("Результати взято зі збереженої видачі, API-запит не витрачено.")
+            else:
+                current_usage += 1
+
+            # Збереження результатів у session_state
+            st.session_state['search_results'] = search_results
+
+            # Відображення результатів пошуку
+            results_data = []
+            for idx, item in enumerate(search_results, 1):
+                url = item.get('link')
+                title = item.get('title') if item.get('title') else ''
+                snippet = item.get('snippet') if item.get('snippet') else ''
+                results_data.append({
+                    '№': idx,
+                    'Назва': title,
+                    'Посилання': url,
+                    'Опис': snippet,
+                })
+
+            # Збереження результатів у session_state
+            st.session_state['search_results'] = results_data
+
+        if not keywords:
+            st.info("Таблиця 'keywords' порожня. Додайте ключові слова до бази даних.")
             st.stop()
 
-        # Виконання пошуку за введеним ключовим словом
-        search_results = perform_search(user_keyword, api_key, cx, region=region_code)
-        if not search_results:
-            st.info("Не вдалося знайти результати за цим ключовим словом.")
-            st.stop()
+        # Вибір ключового слова
+        selected_keyword = st.selectbox("Оберіть ключове слово для пошуку", keywords)
 
-        # Збереження результатів у session_state
-        st.session_state['search_results'] = search_results
+        # Кнопка для запуску пошуку за вибраним ключовим словом
+        if st.button("Виконати пошук"):
+            # Отримання тегу для обраного ключового слова
+            tag = get_tag_for_keyword(conn, selected_keyword)
+            if not tag:
+                st.error(f"Не вдалося знайти тег для ключового слова '{selected_keyword}'.")
+                st.stop()
 
-        # Оновлення використання API
-        update_api_usage(conn, today_str, increment=1)
-        current_usage += 1
+            # Отримання пов'язаних ключових слів за тегом
+            related_keywords = get_keywords_by_tag(conn, tag)
+            if not related_keywords:
+                st.error(f"Не вдалося знайти пов'язані ключові слова для тегу '{tag}'.")
+                st.stop()
 
-        # Відображення результатів пошуку
-        results_data = []
-        for idx, item in enumerate(search_results, 1):
-            url = item.get('link')
-            title = item.get('title') if item.get('title') else ''
-            snippet = item.get('snippet') if item.get('snippet') else ''
-            results_data.append({
-                '№': idx,
-                'Назва': title,
-                'Посилання': url,
-                'Опис': snippet,
-            })
-
-        # Збереження результатів у session_state
-        st.session_state['search_results'] = results_data
-
-    if not keywords:
-        st.info("Таблиця 'keywords' порожня. Додайте ключові слова до бази даних.")
-        conn.close()
-        st.stop()
+            # Збереження related_keywords у session_state
+            st.session_state['related_keywords'] = related_keywords
+
+            with st.spinner('Виконується пошук...'):
+                # Виконання пошуку (квоту API витрачає лише промах кешу видачі)
+                search_results, from_cache = perform_cached_search(conn, selected_keyword, api_key, cx,
+                                                                   region=region_code, api_limit=api_limit)
+                if not search_results:
+                    st.info("Не вдалося знайти результати за цим ключовим словом.")
+                    st.stop()
+                if from_cache:
+                    st.caption("Результати взято зі збереженої видачі, API-запит не витрачено.")
+                else:
+                    current_usage += 1
+
+            # Функція для аналізу сторінки одразу після її завантаження
+            def analyze_fetched_page(url, html_content):
+                if not html_content:
+                    return {
+                        'counts_title': {},
+                        'counts_description': {},
+                        'counts_headers': {},
+                        'counts_content': {},
+                        'total_keywords': 0
+                    }
+                return get_page_analysis(url, related_keywords, analyze_page_content, html_content)
+
+            # Сторінки результатів завантажуються паралельно і аналізуються в міру надходження
+            analysis_by_url = fetch_pages_with_progress([item.get('link') for item in search_results],
+                                                        analyze_fetched_page)
+
+            # Аналіз результатів пошуку
+            results_data = []
+            all_analysis_results = []
+            for idx, item in enumerate(search_results, 1):
+                url = item.get('link')
+                title = item.get('title') if item.get('title') else ''
+                snippet = item.get('snippet') if item.get('snippet') else ''
+
+                # Результат аналізу сторінки
+                analysis_results = analysis_by_url.get(url) or analyze_fetched_page(url, "")
+                all_analysis_results.append(analysis_results)
+
+                counts_title = analysis_results['counts_title']
+                counts_description = analysis_results['counts_description']
+                counts_headers = analysis_results['counts_headers']
+                counts_content = analysis_results['counts_content']
+                total_keywords = analysis_results['total_keywords']
+
+                # Додавання даних до списку
+                results_data.append({
+                    '№': idx,
+                    'Назва': title,
+                    'Посилання': url,
+                    'Опис': snippet,
+                    'Кількість в Title': sum(counts_title.values()),
+                    'Кількість в Description': sum(counts_description.values()),
+                    'Кількість в H1/H2/H3': sum(counts_headers.values()),
+                    'Кількість в Content': sum(counts_content.values()),
+                    'Загальна кількість ключових слів': total_keywords
+                })
+
+            # Збереження результатів у session_state
+            st.session_state['search_results'] = results_data
+
+        # Перевірка, чи є пошукові результати в session_state
+        if 'search_results' in st.session_state:
+            search_results = st.session_state['search_results']
+        else:
+            search_results = []
 
-    # Вибір ключового слова
-    selected_keyword = st.selectbox("Оберіть ключове слово для пошуку", keywords)
+        # Відображення результатів пошуку
+        if st.session_state['search_results']:
+            results_data = st.session_state['search_results']
+
+            df_results = pd.DataFrame(results_data)
+            # Переміщення № до першого стовпця
+            cols = df_results.columns.tolist()
+            cols = [cols[0]] + sorted(cols[1:], key=lambda x: (x != 'Посилання', x))
+            df_results = df_results[cols]
+
+            st.success(f"Знайдено {len(results_data)} результатів:")
+            st.dataframe(df_results, use_container_width=True)
+
+            # Додавання можливості вибору сторінки для детального перегляду
+            if not manual_search:
+                st.markdown("---")
+                st.subheader("Детальний перегляд сторінки")
+                selected_result = st.selectbox("Оберіть сторінку для детального перегляду", df_results['Посилання'])
+
+                if selected_result:
+                    # Знаходимо відповідний запис
+                    selected_record = next((item for item in results_data if item['Посилання'] == selected_result), None)
+                    if selected_record:
+                        st.markdown(f"### {selected_record['Назва']}")
+                        st.markdown(f"**Посилання:** [Перейти]({selected_result})")
+                        st.markdown(f"**Опис:** {selected_record['Опис']}")
+                        st.markdown("---")
+
+                        # Отримання та аналіз контенту сторінки
+                        html_content = fetch_page_content(selected_result)
+                        if not html_content:
+                            st.warning("Не вдалося завантажити контент сторінки.")
+                        else:
+                            # Перевірка наявності related_keywords у session_state
+                            if 'related_keywords' in st.session_state and st.session_state['related_keywords']:
+                                related_keywords = st.session_state['related_keywords']
+                                analysis_results = get_page_analysis(selected_result, related_keywords, analyze_page_content, html_content)
+
+                                counts_title = analysis_results['counts_title']
+                                counts_description = analysis_results['counts_description']
+                                counts_headers = analysis_results['counts_headers']
+                                counts_content = analysis_results['counts_content']
+                                total_keywords = analysis_results['total_keywords']
+
+                                # Створення таблиці з ключовими словами та їх кількістю у різних секціях
+                                st.subheader("Кількість ключових слів на сторінці")
+                                data = {
+                                    'Секція': [],
+                                    'Ключове слово': [],
+                                    'Кількість': []
+                                }
+                                for kw, count in counts_title.items():
+                                    data['Секція'].append('Title')
+                                    data['Ключове слово'].append(kw)
+                                    data['Кількість'].append(count)
+                                for kw, count in counts_description.items():
+                                    data['Секція'].append('Description')
+                                    data['Ключове слово'].append(kw)
+                                    data['Кількість'].append(count)
+                                for kw, count in counts_headers.items():
+                                    data['Секція'].append('H1/H2/H3')
+                                    data['Ключове слово'].append(kw)
+                                    data['Кількість'].append(count)
+                                for kw, count in counts_content.items():
+                                    data['Секція'].append('Content')
+                                    data['Ключове слово'].append(kw)
+                                    data['Кількість'].append(count)
+
+                                if any(data['Секція']):
+                                    df_keyword_counts = pd.DataFrame(data)
+                                    st.table(df_keyword_counts)
+                                    st.markdown(f"**Загальна кількість ключових слів:** {total_keywords}")
+                                else:
+                                    st.info("Не знайдено ключових слів на цій сторінці.")
+                            else:
+                                st.error("Пов'язані ключові слова не збережені. Виконайте пошук спочатку.")
+                                st.stop()
 
-    # Кнопка для запуску пошуку за вибраним ключовим словом
-    if st.button("Виконати пошук"):
-        if current_usage >= api_limit:
-            st.error("Ви досягли ліміту використання API на сьогодні. Спробуйте завтра.")
-            st.stop()
+                    # Додавання можливості введення основного URL для порівняння
+                    st.subheader("Введіть основне посилання для порівняння")
+                    main_url = st.text_input("Основне посилання", "")
 
-        # Отримання тегу для обраного ключового слова
-        tag = get_tag_for_keyword(conn, selected_keyword)
-        if not tag:
-            st.error(f"Не вдалося знайти тег для ключового слова '{selected_keyword}'.")
-            st.stop()
+                    if st.button("Зберегти результати та виконати API запит"):
+                        if not main_url:
+                            st.error("Будь ласка, введіть основне посилання для порівняння.")
+                            st.stop()
 
-        # Отримання пов'язаних ключових слів за тегом
-        related_keywords = get_keywords_by_tag(conn, tag)
-        if not related_keywords:
-            st.error(f"Не вдалося знайти пов'язані ключові слова для тегу '{tag}'.")
-            st.stop()
+                        # Отримання контенту основної сторінки
+                        main_html_content = fetch_page_content(main_url)
+                        if not main_html_content:
+                            st.error(f"Не вдалося завантажити контент для основної сторінки: {main_url}")
+                        else:
+                            # Аналіз контенту основної сторінки
+                            related_keywords = st.session_state.get('related_keywords', [])
+                            main_analysis_results = get_page_analysis(main_url, related_keywords, analyze_page_content, main_html_content)
+
+                            # Порівняння з конкурентами (сторінки конкурентів завантажуються паралельно)
+                            competitor_urls = [result.get('Посилання') for result in search_results]
+                            competitor_analysis = fetch_pages_with_progress(
+                                competitor_urls,
+                                lambda url, html_content: get_page_analysis(url, related_keywords, analyze_page_content, html_content) if html_content else None
+                            )
+                            competitor_pages = []
+                            for url in competitor_urls:
+                                analysis_results = competitor_analysis.get(url)
+                                if analysis_results:
+                                    competitor_pages.append(analysis_results)
+
+                            # Генерація промпту для OpenAI API
+                            keyword_group = {
+                                'title': related_keywords,
+                                'description': related_keywords,
+                                'headers': related_keywords,
+                                'body': related_keywords,
+                                'faq': related_keywords
+                            }
 
-        # Збереження related_keywords у session_state
-        st.session_state['related_keywords'] = related_keywords
+                            # Генерація промпту
+                            prompt = generate_api_prompt_for_single_page(main_analysis_results, competitor_pages,
+                                                                         keyword_group)
 
-        with st.spinner('Виконується пошук...'):
-            # Виконання пошуку
-            search_results = perform_search(selected_keyword, api_key, cx, region=region_code)
-            if not search_results:
-                st.info("Не вдалося знайти результати за цим ключовим словом.")
-                st.stop()
+                            # Виклик функції для виконання запиту до OpenAI API
+                            response = get_openai_response(openai_api_key, selected_model, prompt)
 
-            # Оновлення використання API
-            update_api_usage(conn, today_str, increment=1)
-            current_usage += 1
-
-        # Аналіз результатів пошуку
-        results_data = []
-        all_analysis_results = []
-        for idx, item in enumerate(search_results, 1):
-            url = item.get('link')
-            title = item.get('title') if item.get('title') else ''
-            snippet = item.get('snippet') if item.get('snippet') else ''
-
-            # Отримання контенту сторінки
-            html_content = fetch_page_content(url)
-            if not html_content:
-                analysis_results = {
-                    'counts_title': {},
-                    'counts_description': {},
-                    'counts_headers': {},
-                    'counts_content': {},
-                    'total_keywords': 0
-                }
-            else:
-                analysis_results = analyze_page_content(html_content, related_keywords)
-
-            all_analysis_results.append(analysis_results)
-
-            counts_title = analysis_results['counts_title']
-            counts_description = analysis_results['counts_description']
-            counts_headers = analysis_results['counts_headers']
-            counts_content = analysis_results['counts_content']
-            total_keywords = analysis_results['total_keywords']
-
-            # Додавання даних до списку
-            results_data.append({
-                '№': idx,
-                'Назва': title,
-                'Посилання': url,
-                'Опис': snippet,
-                'Кількість в Title': sum(counts_title.values()),
-                'Кількість в Description': sum(counts_description.values()),
-                'Кількість в H1/H2/H3': sum(counts_headers.values()),
-                'Кількість в Content': sum(counts_content.values()),
-                'Загальна кількість ключових слів': total_keywords
-            })
-
-        # Збереження результатів у session_state
-        st.session_state['search_results'] = results_data
-
-    # Перевірка, чи є пошукові результати в session_state
-    if 'search_results' in st.session_state:
-        search_results = st.session_state['search_results']
-    else:
-        search_results = []
-
-    # Відображення результатів пошуку
-    if st.session_state['search_results']:
-        results_data = st.session_state['search_results']
-
-        df_results = pd.DataFrame(results_data)
-        # Переміщення № до першого стовпця
-        cols = df_results.columns.tolist()
-        cols = [cols[0]] + sorted(cols[1:], key=lambda x: (x != 'Посилання', x))
-        df_results = df_results[cols]
-
-        st.success(f"Знайдено {len(results_data)} результатів:")
-        st.dataframe(df_results, use_container_width=True)
-
-        # Додавання можливості вибору сторінки для детального перегляду
-        if not manual_search:
-            st.markdown("---")
-            st.subheader("Детальний перегляд сторінки")
-            selected_result = st.selectbox("Оберіть сторінку для детального перегляду", df_results['Посилання'])
-
-            if selected_result:
-                # Знаходимо відповідний запис
-                selected_record = next((item for item in results_data if item['Посилання'] == selected_result), None)
-                if selected_record:
-                    st.markdown(f"### {selected_record['Назва']}")
-                    st.markdown(f"**Посилання:** [Перейти]({selected_result})")
-                    st.markdown(f"**Опис:** {selected_record['Опис']}")
-                    st.markdown("---")
-
-                    # Отримання та аналіз контенту сторінки
-                    html_content = fetch_page_content(selected_result)
-                    if not html_content:
-                        st.warning("Не вдалося завантажити контент сторінки.")
-                    else:
-                        # Перевірка наявності related_keywords у session_state
-                        if 'related_keywords' in st.session_state and st.session_state['related_keywords']:
-                            related_keywords = st.session_state['related_keywords']
-                            analysis_results = analyze_page_content(html_content, related_keywords)
-
-                            counts_title = analysis_results['counts_title']
-                            counts_description = analysis_results['counts_description']
-                            counts_headers = analysis_results['counts_headers']
-                            counts_content = analysis_results['counts_content']
-                            total_keywords = analysis_results['total_keywords']
-
-                            # Створення таблиці з ключовими словами та їх кількістю у різних секціях
-                            st.subheader("Кількість ключових слів на сторінці")
-                            data = {
-                                'Секція': [],
-                                'Ключове слово': [],
-                                'Кількість': []
-                            }
-                            for kw, count in counts_title.items():
-                                data['Секція'].append('Title')
-                                data['Ключове слово'].append(kw)
-                                data['Кількість'].append(count)
-                            for kw, count in counts_description.items():
-                                data['Секція'].append('Description')
-                                data['Ключове слово'].append(kw)
-                                data['Кількість'].append(count)
-                            for kw, count in counts_headers.items():
-                                data['Секція'].append('H1/H2/H3')
-                                data['Ключове слово'].append(kw)
-                                data['Кількість'].append(count)
-                            for kw, count in counts_content.items():
-                                data['Секція'].append('Content')
-                                data['Ключове слово'].append(kw)
-                                data['Кількість'].append(count)
-
-                            if any(data['Секція']):
-                                df_keyword_counts = pd.DataFrame(data)
-                                st.table(df_keyword_counts)
-                                st.markdown(f"**Загальна кількість ключових слів:** {total_keywords}")
+                            # Виведення відповіді
+                            st.subheader("Відповідь OpenAI:")
+                            if isinstance(response, dict):
+                                st.write(
+                                    response.get('choices', [{}])[0].get('message', {}).get('content', 'Немає відповіді'))
                             else:
-                                st.info("Не знайдено ключових слів на цій сторінці.")
-                        else:
-                            st.error("Пов'язані ключові слова не збережені. Виконайте пошук спочатку.")
-                            st.stop()
-
-                # Додавання можливості введення основного URL для порівняння
-                st.subheader("Введіть основне посилання для порівняння")
-                main_url = st.text_input("Основне посилання", "")
-
-                if st.button("Зберегти результати та виконати API запит"):
-                    if not main_url:
-                        st.error("Будь ласка, введіть основне посилання для порівняння.")
-                        st.stop()
-
-                    # Отримання контенту основної сторінки
-                    main_html_content = fetch_page_content(main_url)
-                    if not main_html_content:
-                        st.error(f"Не вдалося завантажити контент для основної сторінки: {main_url}")
-                    else:
-                        # Аналіз контенту основної сторінки
-                        related_keywords = st.session_state.get('related_keywords', [])
-                        main_analysis_results = analyze_page_content(main_html_content, related_keywords)
-
-                        # Порівняння з конкурентами
-                        competitor_pages = []
-                        for result in search_results:
-                            url = result.get('Посилання')
-                            html_content = fetch_page_content(url)
-                            if html_content:
-                                analysis_results = analyze_page_content(html_content, related_keywords)
-                                competitor_pages.append(analysis_results)
-
-                        # Генерація промпту для OpenAI API
-                        keyword_group = {
-                            'title': related_keywords,
-                            'description': related_keywords,
-                            'headers': related_keywords,
-                            'body': related_keywords,
-                            'faq': related_keywords
-                        }
-
-                        # Генерація промпту
-                        prompt = generate_api_prompt_for_single_page(main_analysis_results, competitor_pages,
-                                                                     keyword_group)
-
-                        # Виклик функції для виконання запиту до OpenAI API
-                        response = get_openai_response(openai_api_key, selected_model, prompt)
-
-                        # Виведення відповіді
-                        st.subheader("Відповідь OpenAI:")
-                        if isinstance(response, dict):
-                            st.write(
-                                response.get('choices', [{}])[0].get('message', {}).get('content', 'Немає відповіді'))
-                        else:
-                            st.error(response)
-
-    # Закриття з'єднання з базою даних
-    conn.close()
+                                st.error(response)
 
 
 # Запуск програми
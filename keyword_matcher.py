@@ -0,0 +1,107 @@
+from collections import deque
+from functools import lru_cache
+
+
+# Символ вважається частиною слова так само, як \w у регулярних виразах Python
+def _is_word_char(char):
+    return char.isalnum() or char == '_'
+
+
+# Функція для перевірки межі слова (\b) перед позицією index у тексті
+def _is_word_boundary(text, index):
+    before = index > 0 and _is_word_char(text[index - 1])
+    after = index < len(text) and _is_word_char(text[index])
+    return before != after
+
+
+# Функція для побудови автомата Ахо-Корасік для групи ключових слів.
+# Автомат будується один раз для групи і далі використовується для будь-якої кількості текстів.
+@lru_cache(maxsize=64)
+def build_keyword_matcher(keywords):
+    # Ключові слова порівнюються в нижньому регістрі; кілька оригінальних варіантів можуть мати один шаблон
+    patterns = {}
+    for keyword in keywords:
+        if keyword:
+            patterns.setdefault(keyword.lower(), []).append(keyword)
+    pattern_list = list(patterns)
+
+    transitions = [{}]
+    outputs = [[]]
+    for pattern_id, pattern in enumerate(pattern_list):
+        state = 0
+        for char in pattern:
+            next_state = transitions[state].get(char)
+            if next_state is None:
+                next_state = len(transitions)
+                transitions[state][char] = next_state
+                transitions.append({})
+                outputs.append([])
+            state = next_state
+        outputs[state].append(pattern_id)
+
+    # Посилання-відкати (fail links) будуються обходом у ширину
+    fail = [0] * len(transitions)
+    queue = deque(transitions[0].values())
+    while queue:
+        state = queue.popleft()
+        for char, next_state in transitions[state].items():
+            fallback = fail[state]
+            while fallback and char not in transitions[fallback]:
+                fallback = fail[fallback]
+            fail[next_state] = transitions[fallback].get(char, 0)
+            if fail[next_state] == next_state:
+                fail[next_state] = 0
+            outputs[next_state] = outputs[next_state] + outputs[fail[next_state]]
+            queue.append(next_state)
+
+    return {
+        'keywords': tuple(keywords),
+        'patterns': pattern_list,
+        'originals': [patterns[pattern] for pattern in pattern_list],
+        'transitions': transitions,
+        'fail': fail,
+        'outputs': outputs,
+    }
+
+
+# Функція для підрахунку входжень усіх ключових слів групи за один прохід по тексту.
+# Результат збігається з len(re.findall(r'\b' + re.escape(kw.lower()) + r'\b', text.lower())) для кожного слова:
+# враховуються лише входження на межах слів і без перекриття для одного й того ж слова.
+# Повертає {ключове слово: кількість} лише для слів, що зустрілися, у порядку групи.
+def count_keywords(matcher, text):
+    if not text or not matcher['patterns']:
+        return {}
+
+    text = text.lower()
+    transitions = matcher['transitions']
+    fail = matcher['fail']
+    outputs = matcher['outputs']
+    patterns = matcher['patterns']
+
+    counts = [0] * len(patterns)
+    last_end = [0] * len(patterns)
+    state = 0
+    for index, char in enumerate(text):
+        while state and char not in transitions[state]:
+            state = fail[state]
+        state = transitions[state].get(char, 0)
+        if not outputs[state]:
+            continue
+
+        end = index + 1
+        for pattern_id in outputs[state]:
+            start = end - len(patterns[pattern_id])
+            if start < last_end[pattern_id]:
+                continue
+            if _is_word_boundary(text, start) and _is_word_boundary(text, end):
+                counts[pattern_id] += 1
+                last_end[pattern_id] = end
+
+    found = {}
+    for pattern_id, count in enumerate(counts):
+        if count:
+            for keyword in matcher['originals'][pattern_id]:
+                found[keyword] = count
+
+    # Зберігаємо порядок ключових слів у групі
+    return {keyword: found[keyword] for keyword in matcher['keywords'] if keyword in found}
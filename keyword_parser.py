@@ -0,0 +1,47 @@
+import pandas as pd
+
+# Формат одного запису в keywords_found: "ключове слово - N разів", записи розділені комами
+KEYWORD_ENTRY_PATTERN = r'^\s*(?P<keyword>.*?)\s*-\s*(?P<count>\d+)\s*разів'
+
+
+# Функція для векторизованого розбору цілої колонки keywords_found за один прохід.
+# Повертає long-form таблицю (row_id, keyword, count), де row_id — індекс рядка вхідної Series.
+def parse_keywords_found(keywords_found):
+    entries = keywords_found.dropna().astype(str).str.split(',').explode()
+    parsed = entries.str.extract(KEYWORD_ENTRY_PATTERN).dropna(subset=['count'])
+
+    parsed['keyword'] = parsed['keyword'].str.strip().str.lower()
+    parsed['count'] = parsed['count'].astype(int)
+    parsed = parsed.rename_axis('row_id').reset_index()
+
+    # Повтори одного ключового слова в межах рядка підсумовуються
+    return parsed.groupby(['row_id', 'keyword'], as_index=False, sort=False)['count'].sum()
+
+
+# Функція для вилучення ключових слів і кількості їх повторень з одного значення keywords_found
+def extract_keywords(row):
+    if pd.isna(row) or not str(row).strip():
+        return {}
+    parsed = parse_keywords_found(pd.Series([row]))
+    return dict(zip(parsed['keyword'].tolist(), parsed['count'].tolist()))
+
+
+# Функція для порівняння keywords_found
+def compare_keywords(old_keywords, new_keywords):
+    parsed = parse_keywords_found(pd.Series([old_keywords, new_keywords], index=['old', 'new']))
+    counts = parsed.pivot(index='keyword', columns='row_id', values='count').reindex(columns=['old', 'new'])
+
+    # Визначаємо додані, видалені і змінені ключові слова
+    added = counts[counts['old'].isna()]
+    removed = counts[counts['new'].isna()]
+    changed = counts[counts['old'].notna() & counts['new'].notna() & (counts['old'] != counts['new'])]
+
+    result = []
+    for k, v in added['new'].items():
+        result.append((k, 'Додано', '-', f"{int(v)} разів"))
+    for k, v in removed['old'].items():
+        result.append((k, 'Видалено', f"{int(v)} разів", '-'))
+    for k, row in changed.iterrows():
+        result.append((k, 'Змінено', f"{int(row['old'])} разів", f"{int(row['new'])} разів"))
+
+    return pd.DataFrame(result, columns=['Ключове слово', 'Зміна', 'Було', 'Стало'])
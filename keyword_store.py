@@ -0,0 +1,298 @@
+import sys
+from datetime import timedelta
+
+import pandas as pd
+import streamlit as st
+from psycopg2.extras import execute_values
+
+from db_pool import create_index_concurrently, db_connection
+from keyword_parser import parse_keywords_found
+
+# Скільки рядків знімків конкурента обробляється і комітиться за один крок backfill
+BACKFILL_BATCH_SIZE = 500
+# Як часто (у секундах) сторінки можуть дозавантажувати нові знімки в keyword_occurrences
+SYNC_INTERVAL = 300
+# Скільки порцій нових знімків сторінка дозавантажує за одне оновлення (повний backfill — у CLI або воркері)
+SYNC_MAX_BATCHES = 4
+
+
+# Функція для створення таблиці нормалізованих входжень ключових слів і таблиці прогресу backfill
+def create_keyword_occurrences_table_if_not_exists(conn):
+    cursor = conn.cursor()
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS keyword_occurrences (
+            competitor TEXT NOT NULL,
+            url TEXT NOT NULL,
+            date_checked TIMESTAMP NOT NULL,
+            keyword TEXT NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (competitor, keyword, url, date_checked)
+        );
+        CREATE INDEX IF NOT EXISTS idx_keyword_occurrences_snapshot
+            ON keyword_occurrences (competitor, url, date_checked);
+        CREATE TABLE IF NOT EXISTS keyword_backfill_progress (
+            competitor TEXT PRIMARY KEY,
+            last_date_checked TIMESTAMP NOT NULL,
+            last_url TEXT NOT NULL
+        );
+    ''')
+    conn.commit()
+    cursor.close()
+
+
+# Підготовка таблиці keyword_occurrences один раз за час роботи процесу
+@st.cache_resource(show_spinner=False)
+def create_keyword_occurrences_table_once(_conn):
+    create_keyword_occurrences_table_if_not_exists(_conn)
+    return True
+
+
+# Функція для отримання списку таблиць конкурентів
+def get_competitor_tables(conn):
+    query = """
+    SELECT table_name
+    FROM information_schema.tables
+    WHERE table_name LIKE '%_com';
+    """
+    return pd.read_sql(query, conn)['table_name'].tolist()
+
+
+# Функція для обробки однієї порції знімків конкурента.
+# Порція береться після збереженої позиції (date_checked, url), тож перерваний backfill продовжується з місця зупинки.
+# Повертає кількість оброблених рядків (0 — якщо нових знімків немає).
+def backfill_keyword_occurrences_batch(conn, competitor_name, batch_size=BACKFILL_BATCH_SIZE):
+    cursor = conn.cursor()
+    cursor.execute(
+        'SELECT last_date_checked, last_url FROM keyword_backfill_progress WHERE competitor = %s',
+        (competitor_name,)
+    )
+    progress = cursor.fetchone()
+
+    if progress:
+        query = f"""
+            SELECT url, date_checked, keywords_found
+            FROM {competitor_name}
+            WHERE (date_checked, url) > (%s, %s)
+            ORDER BY date_checked, url
+            LIMIT %s
+        """
+        params = [progress[0], progress[1], batch_size]
+    else:
+        query = f"""
+            SELECT url, date_checked, keywords_found
+            FROM {competitor_name}
+            ORDER BY date_checked, url
+            LIMIT %s
+        """
+        params = [batch_size]
+    snapshots = pd.read_sql(query, conn, params=params)
+
+    if snapshots.empty:
+        cursor.close()
+        return 0
+
+    snapshots['date_checked'] = pd.to_datetime(snapshots['date_checked'])
+    parsed = parse_keywords_found(snapshots['keywords_found'])
+    rows = [
+        (competitor_name, snapshots.at[row_id, 'url'], snapshots.at[row_id, 'date_checked'].to_pydatetime(),
+         keyword, count)
+        for row_id, keyword, count in zip(parsed['row_id'], parsed['keyword'], parsed['count'].tolist())
+    ]
+    if rows:
+        execute_values(cursor, '''
+            INSERT INTO keyword_occurrences (competitor, url, date_checked, keyword, count)
+            VALUES %s
+            ON CONFLICT (competitor, keyword, url, date_checked) DO UPDATE SET count = EXCLUDED.count
+        ''', rows)
+
+    last_snapshot = snapshots.iloc[-1]
+    cursor.execute('''
+        INSERT INTO keyword_backfill_progress (competitor, last_date_checked, last_url)
+        VALUES (%s, %s, %s)
+        ON CONFLICT (competitor) DO UPDATE
+        SET last_date_checked = EXCLUDED.last_date_checked, last_url = EXCLUDED.last_url
+    ''', (competitor_name, last_snapshot['date_checked'].to_pydatetime(), last_snapshot['url']))
+
+    # Кожна порція комітиться разом зі своєю позицією
+    conn.commit()
+    cursor.close()
+    return len(snapshots)
+
+
+# Функція для обробки порцій знімків конкурента одна за одною; max_batches обмежує кількість порцій
+# (None — до кінця). Повертає кількість оброблених рядків.
+def _backfill_batches(conn, competitor_name, batch_size, max_batches):
+    total = 0
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        processed = backfill_keyword_occurrences_batch(conn, competitor_name, batch_size)
+        if not processed:
+            break
+        total += processed
+        batches += 1
+    return total
+
+
+# Функція для повного (або інкрементального) backfill одного конкурента — для CLI та воркера.
+# Індекс на таблиці краулера будується CONCURRENTLY, щоб не блокувати запис нових знімків.
+def backfill_keyword_occurrences(conn, competitor_name, batch_size=BACKFILL_BATCH_SIZE, max_batches=None):
+    create_keyword_occurrences_table_if_not_exists(conn)
+    # Індекс для посторінкового читання знімків конкурента за позицією (date_checked, url)
+    create_index_concurrently(conn, f'idx_{competitor_name}_date_url', competitor_name, 'date_checked, url')
+    return _backfill_batches(conn, competitor_name, batch_size, max_batches)
+
+
+# Дозавантаження нових знімків не частіше ніж раз на SYNC_INTERVAL секунд для кожного конкурента.
+# Сторінка лише продовжує backfill, уже розпочатий з CLI чи воркера, і не більше SYNC_MAX_BATCHES порцій.
+@st.cache_data(ttl=SYNC_INTERVAL, show_spinner=False)
+def sync_keyword_occurrences_if_stale(_conn, competitor_name):
+    try:
+        create_keyword_occurrences_table_once(_conn)
+        cursor = _conn.cursor()
+        cursor.execute('SELECT 1 FROM keyword_backfill_progress WHERE competitor = %s', (competitor_name,))
+        started = cursor.fetchone() is not None
+        cursor.close()
+        if not started:
+            return 0
+        return _backfill_batches(_conn, competitor_name, BACKFILL_BATCH_SIZE, SYNC_MAX_BATCHES)
+    except Exception as e:
+        _conn.rollback()
+        st.error(f"Помилка при оновленні таблиці keyword_occurrences: {e}")
+        return 0
+
+
+# Функція для отримання позиції (date_checked, url), до якої знімки конкурента вже перенесено в keyword_occurrences;
+# повертає None, якщо backfill ще не розпочато
+def get_backfill_position(conn, competitor_name):
+    cursor = conn.cursor()
+    cursor.execute(
+        'SELECT last_date_checked, last_url FROM keyword_backfill_progress WHERE competitor = %s',
+        (competitor_name,)
+    )
+    progress = cursor.fetchone()
+    cursor.close()
+    return progress
+
+
+# Функція для розбору історії ключових слів прямо зі знімків конкурента (для знімків, яких backfill ще не дійшов).
+# after — позиція (date_checked, url), після якої беруться знімки (None — усі знімки).
+def _parse_keywords_history(conn, competitor_name, keywords, url=None, after=None):
+    query = f"""
+        SELECT url, date_checked, keywords_found
+        FROM {competitor_name}
+        WHERE keywords_found ILIKE ANY(%s)
+    """
+    params = [[f"%{keyword}%" for keyword in keywords]]
+    if url is not None:
+        query += " AND url = %s"
+        params.append(url)
+    if after is not None:
+        query += " AND (date_checked, url) > (%s, %s)"
+        params.extend(after)
+    snapshots = pd.read_sql(query, conn, params=params)
+
+    parsed = parse_keywords_found(snapshots['keywords_found'])
+    parsed = parsed[parsed['keyword'].isin(keywords)]
+    return pd.DataFrame({
+        'url': snapshots['url'].reindex(parsed['row_id']).values,
+        'date_checked': snapshots['date_checked'].reindex(parsed['row_id']).values,
+        'keyword': parsed['keyword'].values,
+        'count': parsed['count'].values,
+    })
+
+
+# Функція для отримання історії кількох ключових слів одним запитом (пошук за індексом).
+# Знімки, до яких backfill ще не дійшов (або всі, якщо його не запускали), розбираються прямо з таблиці конкурента,
+# тож історія повна, навіть поки keyword_occurrences заповнюється.
+# Повертає довгу таблицю (url, date_checked, keyword, count); url обмежує історію однією сторінкою.
+def get_keywords_history(conn, competitor_name, keywords, url=None):
+    sync_keyword_occurrences_if_stale(conn, competitor_name)
+    keywords = [keyword.lower() for keyword in keywords]
+    progress = get_backfill_position(conn, competitor_name)
+    pending = _parse_keywords_history(conn, competitor_name, keywords, url, after=progress)
+    if progress is None:
+        return pending.sort_values('date_checked', kind='stable').reset_index(drop=True)
+
+    query = """
+        SELECT url, date_checked, keyword, count
+        FROM keyword_occurrences
+        WHERE competitor = %s AND keyword = ANY(%s)
+    """
+    params = [competitor_name, keywords]
+    if url is not None:
+        query += " AND url = %s"
+        params.append(url)
+    query += " ORDER BY date_checked ASC"
+    history = pd.read_sql(query, conn, params=params)
+    if pending.empty:
+        return history
+    history = pd.concat([history, pending], ignore_index=True)
+    return history.sort_values('date_checked', kind='stable').reset_index(drop=True)
+
+
+# Функція для отримання історичних даних по вибраному ключовому слову
+def get_keyword_history(conn, competitor_name, keyword):
+    return get_keywords_history(conn, competitor_name, [keyword])
+
+
+# Функція для отримання першої та останньої дати знімків конкурента; повертає (None, None), якщо знімків немає
+def get_snapshot_date_range(conn, competitor_name):
+    cursor = conn.cursor()
+    cursor.execute(f'SELECT MIN(date_checked)::date, MAX(date_checked)::date FROM {competitor_name}')
+    date_range = cursor.fetchone()
+    cursor.close()
+    return date_range
+
+
+# Функція для отримання URL конкурента, які мають знімки в межах дат (кінцева дата включно)
+def get_snapshot_urls(conn, competitor_name, start_date, end_date):
+    query = f"""
+        SELECT DISTINCT url
+        FROM {competitor_name}
+        WHERE date_checked >= %s AND date_checked < %s
+        ORDER BY url
+    """
+    params = [start_date, end_date + timedelta(days=1)]
+    return pd.read_sql(query, conn, params=params)['url'].tolist()
+
+
+# Функція для отримання кількості ключових слів вибраних URL за період — лише колонки, потрібні для графіка
+def get_keyword_counts(conn, competitor_name, urls, start_date, end_date):
+    query = f"""
+        SELECT url, date_checked, keywords_count
+        FROM {competitor_name}
+        WHERE url = ANY(%s) AND date_checked >= %s AND date_checked < %s
+        ORDER BY date_checked ASC
+    """
+    params = [list(urls), start_date, end_date + timedelta(days=1)]
+    return pd.read_sql(query, conn, params=params)
+
+
+# Функція для отримання знайдених ключових слів сторінки з першого знімка за період; повертає None, якщо знімка немає
+def get_first_keywords_found(conn, competitor_name, url, start_date, end_date):
+    cursor = conn.cursor()
+    cursor.execute(f"""
+        SELECT keywords_found
+        FROM {competitor_name}
+        WHERE url = %s AND date_checked >= %s AND date_checked < %s
+        ORDER BY date_checked ASC
+        LIMIT 1
+    """, (url, start_date, end_date + timedelta(days=1)))
+    result = cursor.fetchone()
+    cursor.close()
+    return result[0] if result else None
+
+
+# Запуск backfill з командного рядка: python keyword_store.py [таблиця_конкурента ...]
+def main():
+    with db_connection() as conn:
+        if conn is None:
+            sys.exit(1)
+        competitors = sys.argv[1:] or get_competitor_tables(conn)
+        for competitor_name in competitors:
+            processed = backfill_keyword_occurrences(conn, competitor_name)
+            print(f"{competitor_name}: оброблено {processed} знімків")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlsplit, urlunsplit
+
+import streamlit as st
+
+# Налаштування кешу сторінок
+PAGE_CACHE_TTL = 3600  # скільки секунд завантажена сторінка вважається актуальною
+PAGE_CACHE_MAX_ENTRIES = 256  # скільки сторінок тримається в пам'яті (найстаріші за використанням витісняються)
+PAGE_CACHE_DIR = os.environ.get("PAGE_CACHE_DIR")  # необов'язкова тека для збереження HTML на диску
+
+
+# Функція для нормалізації URL, щоб різні записи однієї сторінки мали один ключ у кеші
+def normalize_url(url):
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or '').lower()
+    try:
+        port = parts.port
+    except ValueError:
+        port = None
+    if port is None or (scheme, port) in (('http', 80), ('https', 443)):
+        netloc = host
+    else:
+        netloc = f"{host}:{port}"
+    # Фрагмент (#...) не впливає на відповідь сервера
+    return urlunsplit((scheme, netloc, parts.path or '/', parts.query, ''))
+
+
+# LRU-кеш сторінок з TTL: HTML сторінки та результати її аналізу для різних груп ключових слів.
+# HTML може додатково зберігатися на диску, щоб переживати перезапуск застосунку.
+class PageCache:
+    def __init__(self, max_entries=PAGE_CACHE_MAX_ENTRIES, ttl=PAGE_CACHE_TTL, cache_dir=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.cache_dir = cache_dir
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def _disk_path(self, key):
+        return os.path.join(self.cache_dir, hashlib.sha256(key.encode('utf-8')).hexdigest() + '.html')
+
+    def _get_entry(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if time.time() - entry['fetched_at'] > self.ttl:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _put_entry(self, key, html_content, fetched_at):
+        entry = {'html': html_content, 'fetched_at': fetched_at, 'analyses': {}}
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return entry
+
+    def _read_from_disk(self, key):
+        if not self.cache_dir:
+            return None
+        path = self._disk_path(key)
+        try:
+            fetched_at = os.path.getmtime(path)
+            if time.time() - fetched_at > self.ttl:
+                return None
+            with open(path, encoding='utf-8') as f:
+                return f.read(), fetched_at
+        except OSError:
+            return None
+
+    def _write_to_disk(self, key, html_content):
+        path = self._disk_path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(html_content)
+            os.replace(tmp_path, path)
+        except OSError:
+            # Дисковий кеш необов'язковий: помилка запису не повинна ламати аналіз
+            pass
+
+    # Повертає HTML сторінки з кешу або None, якщо сторінки немає чи вона застаріла
+    def get_content(self, url):
+        key = normalize_url(url)
+        with self._lock:
+            entry = self._get_entry(key)
+            if entry is not None:
+                return entry['html']
+        stored = self._read_from_disk(key)
+        if stored is None:
+            return None
+        with self._lock:
+            return self._put_entry(key, *stored)['html']
+
+    # Зберігає HTML сторінки; попередні результати аналізу цієї сторінки скидаються
+    def set_content(self, url, html_content):
+        key = normalize_url(url)
+        with self._lock:
+            self._put_entry(key, html_content, time.time())
+        if self.cache_dir:
+            self._write_to_disk(key, html_content)
+
+    # Повертає збережений результат аналізу сторінки для групи ключових слів або None
+    def get_analysis(self, url, keywords):
+        with self._lock:
+            entry = self._get_entry(normalize_url(url))
+            if entry is None:
+                return None
+            return entry['analyses'].get(tuple(keywords))
+
+    # Зберігає результат аналізу (лише для сторінок, HTML яких уже є в кеші)
+    def set_analysis(self, url, keywords, analysis):
+        with self._lock:
+            entry = self._get_entry(normalize_url(url))
+            if entry is not None:
+                entry['analyses'][tuple(keywords)] = analysis
+
+
+# Спільний кеш сторінок для всіх сесій застосунку
+@st.cache_resource
+def get_page_cache():
+    return PageCache(cache_dir=PAGE_CACHE_DIR)
@@ -0,0 +1,129 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FuturesTimeoutError
+from urllib.parse import urlsplit
+
+import requests
+import streamlit as st
+
+from page_cache import get_page_cache
+
+# Налаштування завантаження сторінок
+FETCH_TIMEOUT = 10  # таймаут одного запиту, секунд
+FETCH_DEADLINE = 25  # загальний час на завантаження всіх сторінок, секунд
+MAX_WORKERS = 8  # скільки сторінок завантажується одночасно
+PER_HOST_LIMIT = 2  # скільки одночасних запитів дозволено до одного домену
+
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64)"
+}
+
+
+# Функція для завантаження HTML сторінки (без виводу в Streamlit, тож її можна викликати з потоків)
+def download_page(url, timeout=FETCH_TIMEOUT):
+    response = requests.get(url, headers=HEADERS, timeout=timeout)
+    response.raise_for_status()
+    return response.text
+
+
+# Функція для отримання контенту сторінки (спершу з кешу, інакше — завантаження і збереження в кеш)
+def fetch_page_content(url):
+    cache = get_page_cache()
+    html_content = cache.get_content(url)
+    if html_content is not None:
+        return html_content
+    try:
+        html_content = download_page(url)
+    except requests.exceptions.RequestException as e:
+        st.warning(f"Не вдалося завантажити сторінку {url}: {e}")
+        return ""
+    cache.set_content(url, html_content)
+    return html_content
+
+
+# Функція для отримання результату аналізу сторінки: кожна сторінка аналізується для групи ключових слів один раз.
+# analyze(html, keywords) викликається лише тоді, коли в кеші ще немає результату; повертає None, якщо сторінка недоступна.
+def get_page_analysis(url, related_keywords, analyze, html_content=None):
+    cache = get_page_cache()
+    analysis = cache.get_analysis(url, related_keywords)
+    if analysis is not None:
+        return analysis
+
+    if html_content is None:
+        html_content = fetch_page_content(url)
+    if not html_content:
+        return None
+    analysis = analyze(html_content, related_keywords)
+    cache.set_analysis(url, related_keywords, analysis)
+    return analysis
+
+
+# Функція для паралельного завантаження кількох сторінок.
+# Повертає генератор кортежів (url, html, помилка) у порядку завершення завантаження;
+# сторінки з кешу повертаються одразу, а ті, що не встигли завантажитися до загального дедлайну, — з помилкою.
+def fetch_pages_concurrently(urls, max_workers=MAX_WORKERS, per_host_limit=PER_HOST_LIMIT, deadline=FETCH_DEADLINE):
+    cache = get_page_cache()
+    urls_to_fetch = []
+    for url in dict.fromkeys(urls):
+        if not url:
+            continue
+        html_content = cache.get_content(url)
+        if html_content is not None:
+            yield url, html_content, None
+        else:
+            urls_to_fetch.append(url)
+    urls = urls_to_fetch
+    if not urls:
+        return
+
+    deadline_at = time.monotonic() + deadline
+    host_limits = {}
+    for url in urls:
+        host_limits.setdefault(urlsplit(url).netloc.lower(), threading.BoundedSemaphore(per_host_limit))
+
+    def fetch(url):
+        with host_limits[urlsplit(url).netloc.lower()]:
+            remaining = deadline_at - time.monotonic()
+            if remaining <= 0:
+                raise requests.exceptions.Timeout("перевищено загальний час завантаження")
+            return download_page(url, timeout=min(FETCH_TIMEOUT, remaining))
+
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    futures = {executor.submit(fetch, url): url for url in urls}
+    pending = set(futures)
+    try:
+        for future in as_completed(futures, timeout=max(deadline_at - time.monotonic(), 0)):
+            pending.discard(future)
+            url = futures[future]
+            try:
+                html_content, error = future.result(), None
+            except Exception as e:
+                html_content, error = "", e
+            else:
+                cache.set_content(url, html_content)
+            yield url, html_content, error
+    except FuturesTimeoutError:
+        for future in pending:
+            yield futures[future], "", "перевищено загальний час завантаження"
+    finally:
+        # Не чекаємо на повільні сайти: незавершені завдання скасовуються, потоки завершаться самі
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+# Функція для паралельного завантаження сторінок з індикатором прогресу у Streamlit.
+# process_page(url, html) викликається для кожної сторінки одразу після її завантаження;
+# повертає словник {url: результат process_page}.
+def fetch_pages_with_progress(urls, process_page):
+    urls = [url for url in dict.fromkeys(urls) if url]
+    results = {}
+    if not urls:
+        return results
+
+    progress_bar = st.progress(0.0, text="Завантаження сторінок...")
+    for done, (url, html_content, error) in enumerate(fetch_pages_concurrently(urls), 1):
+        if error:
+            st.warning(f"Не вдалося завантажити сторінку {url}: {error}")
+        results[url] = process_page(url, html_content)
+        progress_bar.progress(done / len(urls), text=f"Завантажено сторінок: {done} з {len(urls)}")
+    progress_bar.empty()
+    return results
@@ -0,0 +1,552 @@
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime, timedelta
+
+import requests
+import streamlit as st
+from psycopg2.extras import execute_values
+
+from page_cache import normalize_url
+from rank_positions import create_rank_positions_table_if_not_exists, save_positions
+from search_api import (
+    API_DAILY_LIMIT,
+    MAX_SEARCH_DEPTH,
+    RESULTS_PER_PAGE,
+    consume_api_quota,
+    get_cached_serp_entry,
+    get_serp_depth,
+    create_serp_cache_table_once,
+    normalize_query,
+    request_search_results,
+    reserve_api_quota,
+    save_serps,
+)
+
+# Налаштування пакетного відстеження позицій
+SEARCH_WORKERS = 4  # скільки запитів до API виконується одночасно
+SEARCH_RATE_LIMIT = 5  # не більше стількох запитів до API за секунду
+DEFAULT_TRACKING_DEPTH = RESULTS_PER_PAGE  # глибина відстеження за замовчуванням (лише перша сторінка)
+TRACKING_DEPTH_OPTIONS = [10, 20, 30, 50, 100]
+RUN_CHUNK_SIZE = 20  # скільки запитів обробляється і фіксується в базі за одну порцію запуску
+
+# Налаштування планувальника перевірок
+TRACKING_CYCLE_DAYS = 7  # звичайне ключове слово перевіряється щонайменше раз на стільки днів
+VOLATILE_CYCLE_DAYS = 1  # нестабільне ключове слово перевіряється щодня
+VOLATILITY_THRESHOLD = 3.0  # стандартне відхилення позиції, з якого ключове слово вважається нестабільним
+VOLATILITY_WINDOW_DAYS = 30  # за скільки днів рахується стабільність позиції
+TRACKING_QUOTA_SHARE = 0.8  # частка денної квоти API для автоматичного відстеження (решта — для ручних пошуків)
+
+QUOTA_EXHAUSTED = "досягнуто денного ліміту API"
+
+
+# Обмежувач частоти запитів, спільний для всіх потоків одного запуску
+class RateLimiter:
+    def __init__(self, rate):
+        self.interval = 1.0 / rate
+        self._next_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            wait_for = self._next_at - now
+            self._next_at = max(now, self._next_at) + self.interval
+        if wait_for > 0:
+            time.sleep(wait_for)
+
+
+# Функція для отримання ключових слів для відстеження: список (keyword, tag, url)
+def get_tracked_keywords(connection):
+    cursor = connection.cursor()
+    cursor.execute('SELECT keyword, tag, url FROM keywords')
+    keywords_data = cursor.fetchall()
+    cursor.close()
+    return keywords_data
+
+
+# Функція для створення таблиць планувальника: остання перевірка ключового слова і вага тегів
+def create_tracking_schedule_tables_if_not_exists(connection):
+    cursor = connection.cursor()
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS rank_keyword_checks (
+            project TEXT NOT NULL,
+            keyword TEXT NOT NULL,
+            last_checked DATE NOT NULL,
+            -- Скільки запитів до API коштувала остання перевірка ключового слова (0 — видача з кешу)
+            api_requests INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (project, keyword)
+        );
+        CREATE TABLE IF NOT EXISTS rank_tag_priorities (
+            tag TEXT PRIMARY KEY,
+            weight REAL NOT NULL DEFAULT 1
+        );
+    ''')
+    connection.commit()
+    cursor.close()
+
+
+# Підготовка таблиць планувальника один раз за час роботи процесу
+@st.cache_resource(show_spinner=False)
+def create_tracking_schedule_tables_once(_connection):
+    create_tracking_schedule_tables_if_not_exists(_connection)
+    return True
+
+
+# Функція для отримання дати останньої перевірки і стабільності позиції кожного ключового слова проекту.
+# Повертає словник {keyword: (остання перевірка або None, стандартне відхилення позиції)}.
+def get_keyword_tracking_stats(connection, project):
+    cursor = connection.cursor()
+    cursor.execute('''
+        SELECT checks.keyword, checks.last_checked, COALESCE(positions.volatility, 0)
+        FROM rank_keyword_checks checks
+        LEFT JOIN (
+            SELECT keyword, STDDEV_SAMP(position) AS volatility
+            FROM rank_positions
+            WHERE project = %s AND date >= %s
+            GROUP BY keyword
+        ) positions ON positions.keyword = checks.keyword
+        WHERE checks.project = %s
+    ''', (project, datetime.now().date() - timedelta(days=VOLATILITY_WINDOW_DAYS), project))
+    stats = {keyword: (last_checked, float(volatility)) for keyword, last_checked, volatility in cursor.fetchall()}
+    cursor.close()
+    return stats
+
+
+# Функція для отримання ваг тегів (теги без запису мають вагу 1)
+def get_tag_weights(connection):
+    cursor = connection.cursor()
+    cursor.execute('SELECT tag, weight FROM rank_tag_priorities')
+    weights = dict(cursor.fetchall())
+    cursor.close()
+    return weights
+
+
+# Функція для впорядкування ключових слів за пріоритетом перевірки.
+# Пріоритет = (днів від останньої перевірки / бажаний інтервал) * вага тегу; ще не перевірені — першими.
+# Повертає список (keyword, tag, url, пріоритет) за спаданням пріоритету; пріоритет >= 1 означає, що час перевіряти.
+def prioritize_keywords(connection, project, keywords_data):
+    create_rank_positions_table_if_not_exists(connection)
+    create_tracking_schedule_tables_once(connection)
+    stats = get_keyword_tracking_stats(connection, project)
+    tag_weights = get_tag_weights(connection)
+    today = datetime.now().date()
+
+    prioritized = []
+    for keyword, tag, url in keywords_data:
+        weight = tag_weights.get(tag, 1)
+        last_checked, volatility = stats.get(keyword, (None, 0))
+        if last_checked is None:
+            priority = math.inf
+        else:
+            cycle_days = VOLATILE_CYCLE_DAYS if volatility >= VOLATILITY_THRESHOLD else TRACKING_CYCLE_DAYS
+            priority = (today - last_checked).days / cycle_days * weight
+        prioritized.append((keyword, tag, url, priority, weight))
+
+    prioritized.sort(key=lambda item: (item[3], item[4]), reverse=True)
+    return [(keyword, tag, url, priority) for keyword, tag, url, priority, _ in prioritized]
+
+
+# Функція для запису дати і вартості перевірки ключових слів проекту.
+# checked — список (keyword, кількість запитів до API, витрачених на цю перевірку).
+def save_keyword_checks(connection, project, checked, checked_on):
+    if not checked:
+        return
+    rows = {keyword: (project, keyword, checked_on, api_requests) for keyword, api_requests in checked}
+    cursor = connection.cursor()
+    execute_values(cursor, '''
+        INSERT INTO rank_keyword_checks (project, keyword, last_checked, api_requests)
+        VALUES %s
+        ON CONFLICT (project, keyword) DO UPDATE
+        SET last_checked = EXCLUDED.last_checked, api_requests = EXCLUDED.api_requests
+    ''', list(rows.values()))
+    connection.commit()
+    cursor.close()
+
+
+# Функція для побудови індексу видачі {нормалізований URL: позиція} за один прохід.
+# Один індекс використовується для всіх проектів і URL, що відстежуються за цим запитом.
+def build_position_index(search_results):
+    positions = {}
+    for idx, item in enumerate(search_results, 1):
+        link = item.get('link')
+        if link:
+            positions.setdefault(normalize_url(link), idx)
+    return positions
+
+
+# Функція для паралельного завантаження однієї сторінки видачі для кількох запитів.
+# pages — словник {запит: позиція першого результату сторінки}; потоки лише виконують HTTP-запити.
+# issued — список, у який додається кожен запит у момент звернення до API: за ним списується квота,
+# навіть якщо обробка відповіді завершилась винятком. Функція чекає на всі запити, перш ніж повернутись.
+# Повертає (словник {запит: результати сторінки}, словник {запит: помилка}).
+def _request_pages(pages, api_key, cx, region, limiter, executor, issued):
+    def search(query, start):
+        limiter.wait()
+        issued.append(query)
+        return request_search_results(query, api_key, cx, region, start=start)
+
+    fetched = {}
+    errors = {}
+    futures = {executor.submit(search, query, start): query for query, start in pages.items()}
+    wait(futures)
+    for future, query in futures.items():
+        try:
+            fetched[query] = future.result()
+        except requests.exceptions.RequestException as e:
+            errors[query] = str(e)
+    return fetched, errors
+
+
+# Функція для отримання видачі для кількох запитів одного регіону.
+# Збережена видача береться з serp_cache, решта запитується паралельно в межах залишку денної квоти.
+# Запити нормалізуються, тож однаковий запит кількох проектів коштує один пошук.
+# Повертає (словник {нормалізований запит: результати}, словник {запит: глибина видачі},
+# словник {запит: витрачено запитів до API}, словник {нормалізований запит: помилка}).
+def fetch_serps(connection, queries, api_key, cx, region,
+                api_limit=API_DAILY_LIMIT, max_workers=SEARCH_WORKERS, rate_limit=SEARCH_RATE_LIMIT):
+    create_serp_cache_table_once(connection)
+    serps = {}
+    depths = {}
+    api_requests = {}
+    errors = {}
+    misses = []
+    for query in dict.fromkeys(normalize_query(query) for query in queries):
+        cached = get_cached_serp_entry(connection, query, region)
+        if cached is not None:
+            serps[query], depths[query] = cached
+            api_requests[query] = 0
+        else:
+            misses.append(query)
+
+    # Квота резервується наперед на всю порцію, тож паралельні воркери не перевищать ліміт
+    today_str = datetime.now().strftime("%Y-%m-%d")
+    reservation_id, reserved = None, 0
+    if misses:
+        reservation_id, reserved = reserve_api_quota(connection, len(misses), api_limit, today_str)
+    for query in misses[reserved:]:
+        errors[query] = QUOTA_EXHAUSTED
+    misses = misses[:reserved]
+    if not misses:
+        return serps, depths, api_requests, errors
+
+    issued = []
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            fetched, request_errors = _request_pages({query: 1 for query in misses}, api_key, cx, region,
+                                                     RateLimiter(rate_limit), executor, issued)
+        errors.update(request_errors)
+    finally:
+        # Списуються всі запити, надіслані до API, решта резерву звільняється
+        consume_api_quota(connection, len(issued), reservation_id, today_str)
+
+    # Уся нова видача зберігається одним INSERT
+    if fetched:
+        for query, items in fetched.items():
+            serps[query] = items
+            depths[query] = get_serp_depth(items)
+            api_requests[query] = 1
+        save_serps(connection, region, fetched, depths)
+    return serps, depths, api_requests, errors
+
+
+# Функція для глибшого пошуку: наступні сторінки видачі (start=11, 21, ...) завантажуються лише для запитів,
+# де відстежувані URL ще не знайдено. Сторінки різних запитів запитуються паралельно, а для кожного запиту
+# пошук зупиняється, щойно всі його URL знайдено, видача закінчилась або досягнуто потрібної глибини.
+# wanted — словник {запит: (множина нормалізованих URL, потрібна глибина)}; serps, depths і api_requests
+# оновлюються на місці. Кожна сторінка коштує один запит до API; квота резервується на кожен раунд.
+def deepen_serps(connection, serps, depths, api_requests, wanted, api_key, cx, region,
+                 api_limit=API_DAILY_LIMIT, max_workers=SEARCH_WORKERS, rate_limit=SEARCH_RATE_LIMIT):
+    missing = {}
+    for query, (urls, depth) in wanted.items():
+        urls = set(urls) - set(build_position_index(serps.get(query, [])))
+        if urls and depths.get(query, MAX_SEARCH_DEPTH) < min(depth, MAX_SEARCH_DEPTH):
+            missing[query] = (urls, min(depth, MAX_SEARCH_DEPTH))
+    if not missing:
+        return
+
+    today_str = datetime.now().strftime("%Y-%m-%d")
+    limiter = RateLimiter(rate_limit)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while missing:
+            reservation_id, reserved = reserve_api_quota(connection, len(missing), api_limit, today_str)
+            if not reserved:
+                break
+            # Порядок запитів у wanted — це їхній пріоритет
+            pages = {query: depths[query] + 1 for query in list(missing)[:reserved]}
+            issued = []
+            try:
+                fetched, request_errors = _request_pages(pages, api_key, cx, region, limiter, executor, issued)
+            finally:
+                consume_api_quota(connection, len(issued), reservation_id, today_str)
+            for query in request_errors:
+                missing.pop(query)
+            if not fetched:
+                break
+
+            for query, items in fetched.items():
+                serps[query] = serps[query] + items
+                depths[query] = MAX_SEARCH_DEPTH if len(items) < RESULTS_PER_PAGE else depths[query] + RESULTS_PER_PAGE
+                api_requests[query] = api_requests.get(query, 0) + 1
+                urls, depth = missing[query]
+                urls -= set(build_position_index(items))
+                if not urls or depths[query] >= depth:
+                    missing.pop(query)
+
+            save_serps(connection, region, {query: serps[query] for query in fetched}, depths)
+
+
+# Функція для створення таблиць запусків відстеження та статусів ключових слів у запуску
+def create_tracking_run_tables_if_not_exists(connection):
+    cursor = connection.cursor()
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS rank_tracking_runs (
+            id SERIAL PRIMARY KEY,
+            project TEXT NOT NULL,
+            region TEXT NOT NULL,
+            run_date DATE NOT NULL,
+            status TEXT NOT NULL,
+            started_at TIMESTAMP NOT NULL,
+            finished_at TIMESTAMP,
+            UNIQUE (project, run_date)
+        );
+        CREATE TABLE IF NOT EXISTS rank_tracking_run_keywords (
+            run_id INTEGER NOT NULL REFERENCES rank_tracking_runs (id) ON DELETE CASCADE,
+            keyword TEXT NOT NULL,
+            status TEXT NOT NULL,
+            position INTEGER,
+            error TEXT,
+            -- Глибина, з якою ключове слово перевірено в запуску
+            depth INTEGER NOT NULL DEFAULT 10,
+            updated_at TIMESTAMP NOT NULL,
+            PRIMARY KEY (run_id, keyword)
+        );
+    ''')
+    connection.commit()
+    cursor.close()
+
+
+# Підготовка таблиць запусків відстеження один раз за час роботи процесу
+@st.cache_resource(show_spinner=False)
+def create_tracking_run_tables_once(_connection):
+    create_tracking_run_tables_if_not_exists(_connection)
+    return True
+
+
+# Функція для початку (або продовження) денного запуску відстеження проекту.
+# Для проекту існує один запуск на день: повторний виклик продовжує його з місця зупинки.
+# Ключове слово, перевірене сьогодні з меншою глибиною і не знайдене, перевіряється знову
+# (знайдена позиція не залежить від глибини пошуку).
+# Повертає (id запуску, словник {keyword: позиція або None} для ключових слів, уже виміряних сьогодні).
+def start_tracking_run(connection, project, region, keywords, depth=DEFAULT_TRACKING_DEPTH):
+    now = datetime.now()
+    cursor = connection.cursor()
+    cursor.execute('''
+        INSERT INTO rank_tracking_runs (project, region, run_date, status, started_at)
+        VALUES (%s, %s, %s, 'running', %s)
+        ON CONFLICT (project, run_date) DO UPDATE SET status = 'running', finished_at = NULL
+        RETURNING id
+    ''', (project, region, now.date(), now))
+    run_id = cursor.fetchone()[0]
+    execute_values(cursor, '''
+        INSERT INTO rank_tracking_run_keywords (run_id, keyword, status, updated_at)
+        VALUES %s
+        ON CONFLICT (run_id, keyword) DO NOTHING
+    ''', [(run_id, keyword, 'pending', now) for keyword in dict.fromkeys(keywords)])
+    cursor.execute('''
+        SELECT keyword, position
+        FROM rank_tracking_run_keywords
+        WHERE run_id = %s AND status = 'done' AND (position IS NOT NULL OR depth >= %s)
+    ''', (run_id, max(depth, RESULTS_PER_PAGE)))
+    done = dict(cursor.fetchall())
+    connection.commit()
+    cursor.close()
+    return run_id, done
+
+
+# Функція для запису статусів ключових слів запуску.
+# statuses — список (keyword, статус, позиція або None, помилка або None); статуси: done, deferred, failed.
+# depth — глибина відстеження, з якою ключові слова перевірено.
+def save_run_keyword_statuses(connection, run_id, statuses, depth=DEFAULT_TRACKING_DEPTH):
+    if not statuses:
+        return
+    now = datetime.now()
+    depth = max(depth, RESULTS_PER_PAGE)
+    cursor = connection.cursor()
+    execute_values(cursor, '''
+        INSERT INTO rank_tracking_run_keywords (run_id, keyword, status, position, error, depth, updated_at)
+        VALUES %s
+        ON CONFLICT (run_id, keyword) DO UPDATE
+        SET status = EXCLUDED.status, position = EXCLUDED.position, error = EXCLUDED.error,
+            depth = EXCLUDED.depth, updated_at = EXCLUDED.updated_at
+    ''', [(run_id, keyword, status, position, error, depth, now)
+          for keyword, status, position, error in statuses])
+    connection.commit()
+    cursor.close()
+
+
+# Функція для завершення запуску: completed, якщо всі ключові слова виміряно, інакше partial
+def finish_tracking_run(connection, run_id):
+    cursor = connection.cursor()
+    cursor.execute('''
+        UPDATE rank_tracking_runs
+        SET status = CASE WHEN EXISTS (
+                SELECT 1 FROM rank_tracking_run_keywords WHERE run_id = %s AND status <> 'done'
+            ) THEN 'partial' ELSE 'completed' END,
+            finished_at = %s
+        WHERE id = %s
+    ''', (run_id, datetime.now(), run_id))
+    connection.commit()
+    cursor.close()
+
+
+# Функція для відстеження однієї порції запитів: пошук, запис позицій, перевірок і статусів запуску.
+# Кожна порція комітиться окремо, тож перерваний запуск продовжується з наступної порції.
+# Повертає {project: {keyword: (позиція або None, помилка або None)}}.
+def _track_queries_chunk(connection, projects, queries, run_ids, api_key, cx, region, api_limit, depths):
+    serps, serp_depths, api_requests, errors = fetch_serps(connection, queries, api_key, cx, region,
+                                                           api_limit=api_limit)
+
+    # Запити, для яких потрібна глибша видача, у порядку пріоритету
+    wanted = {}
+    for project, keywords_data in projects:
+        depth = depths.get(project, DEFAULT_TRACKING_DEPTH)
+        if depth <= RESULTS_PER_PAGE:
+            continue
+        for keyword, _, url in keywords_data:
+            query = normalize_query(keyword)
+            if query in serps:
+                urls, needed = wanted.get(query, (set(), 0))
+                urls.add(normalize_url(url))
+                wanted[query] = (urls, max(needed, depth))
+    if wanted:
+        wanted = {query: wanted[query] for query in queries if query in wanted}
+        deepen_serps(connection, serps, serp_depths, api_requests, wanted, api_key, cx, region, api_limit=api_limit)
+
+    position_indexes = {query: build_position_index(items) for query, items in serps.items()}
+
+    date_obj = datetime.now().date()
+    results_by_project = {}
+    for project, keywords_data in projects:
+        depth = depths.get(project, DEFAULT_TRACKING_DEPTH)
+        rows = []
+        results = {}
+        checked = []
+        statuses = []
+        for keyword, tag, url in keywords_data:
+            query = normalize_query(keyword)
+            if query not in position_indexes:
+                error = errors.get(query)
+                results[keyword] = (None, error)
+                statuses.append((keyword, 'deferred' if error == QUOTA_EXHAUSTED else 'failed', None, error))
+                continue
+            position = position_indexes[query].get(normalize_url(url))
+            # Позиції, глибші за налаштування проекту, не враховуються (видачу могли поглибити інші проекти)
+            if position and position > max(depth, RESULTS_PER_PAGE):
+                position = None
+            if position:
+                rows.append((keyword, tag, url, region, date_obj, position))
+            results[keyword] = (position, None)
+            checked.append((keyword, api_requests.get(query, 0)))
+            statuses.append((keyword, 'done', position, None))
+
+        save_positions(connection, project, rows)
+        # Перевіреними вважаються всі ключові слова з отриманою видачею, навіть якщо URL у ній не знайдено
+        save_keyword_checks(connection, project, checked, date_obj)
+        save_run_keyword_statuses(connection, run_ids[project], statuses, depth)
+        results_by_project[project] = results
+    return results_by_project
+
+
+# Функція для пакетного відстеження позицій кількох проектів одного регіону.
+# projects — список (project, keywords_data), де project — ключ проекту (rank_positions.get_project_key),
+# а keywords_data — список (keyword, tag, url).
+# Кожен унікальний запит шукається один раз, і всі проекти та URL визначаються за його видачею.
+# Ключові слова, уже виміряні сьогодні в запуску проекту (з тією ж або більшою глибиною), не шукаються повторно;
+# решта обробляється порціями по RUN_CHUNK_SIZE запитів, і кожна порція фіксується в базі разом зі статусами
+# ключових слів.
+# queries задає порядок пошуку (якщо квоти не вистачить, відкладаються останні); за замовчуванням — порядок проектів.
+# depths — необов'язковий словник {project: глибина відстеження}; глибше першої сторінки шукаються лише
+# ключові слова, URL яких не знайдено на першій сторінці.
+# Повертає {project: список (keyword, позиція або None, помилка або None)}.
+def track_projects_batch(connection, projects, api_key, cx, region, api_limit=API_DAILY_LIMIT, queries=None,
+                         depths=None):
+    create_rank_positions_table_if_not_exists(connection)
+    create_tracking_schedule_tables_once(connection)
+    create_tracking_run_tables_once(connection)
+    depths = depths or {}
+
+    run_ids = {}
+    outcomes = {}
+    pending_projects = []
+    for project, keywords_data in projects:
+        run_id, done = start_tracking_run(connection, project, region, [keyword for keyword, _, _ in keywords_data],
+                                          depths.get(project, DEFAULT_TRACKING_DEPTH))
+        run_ids[project] = run_id
+        outcomes[project] = {keyword: (position, None) for keyword, position in done.items()}
+        pending_projects.append((project, [item for item in keywords_data if item[0] not in done]))
+
+    if queries is None:
+        queries = [keyword for _, keywords_data in projects for keyword, _, _ in keywords_data]
+    pending_queries = {normalize_query(keyword) for _, keywords_data in pending_projects for keyword, _, _ in keywords_data}
+    queries = [query for query in dict.fromkeys(normalize_query(query) for query in queries) if query in pending_queries]
+
+    for start in range(0, len(queries), RUN_CHUNK_SIZE):
+        chunk = set(queries[start:start + RUN_CHUNK_SIZE])
+        chunk_projects = [
+            (project, [item for item in keywords_data if normalize_query(item[0]) in chunk])
+            for project, keywords_data in pending_projects
+        ]
+        chunk_projects = [item for item in chunk_projects if item[1]]
+        chunk_results = _track_queries_chunk(connection, chunk_projects, queries[start:start + RUN_CHUNK_SIZE],
+                                             run_ids, api_key, cx, region, api_limit, depths)
+        for project, results in chunk_results.items():
+            outcomes[project].update(results)
+
+    for run_id in run_ids.values():
+        finish_tracking_run(connection, run_id)
+
+    return {
+        project: [(keyword, *outcomes[project].get(keyword, (None, None))) for keyword, _, _ in keywords_data]
+        for project, keywords_data in projects
+    }
+
+
+# Функція для пакетного відстеження позицій ключових слів одного проекту.
+# keywords_data — список (keyword, tag, url); повертає список (keyword, позиція або None, помилка або None).
+def track_positions_batch(connection, project, keywords_data, api_key, cx, region, api_limit=API_DAILY_LIMIT,
+                          depth=DEFAULT_TRACKING_DEPTH):
+    return track_projects_batch(connection, [(project, keywords_data)], api_key, cx, region,
+                                api_limit=api_limit, depths={project: depth})[project]
+
+
+# Функція для планового запуску відстеження кількох проектів одного регіону.
+# Перевіряються лише ключові слова, час яких настав, у порядку пріоритету (спільний запит кількох проектів
+# отримує найвищий із їхніх пріоритетів) і в межах частки денної квоти для автоматичного відстеження.
+# Те, що не вмістилося в квоту, переноситься на наступні дні.
+# depths — необов'язковий словник {project: глибина відстеження}.
+# Повертає {project: (результати, кількість ключових слів, які ще не час перевіряти)}.
+def run_scheduled_tracking_for_projects(connection, projects, api_key, cx, region, depths=None):
+    query_priorities = {}
+    due_projects = []
+    not_due = {}
+    for project, keywords_data in projects:
+        prioritized = prioritize_keywords(connection, project, keywords_data)
+        due = [(keyword, tag, url) for keyword, tag, url, priority in prioritized if priority >= 1]
+        for keyword, _, _, priority in prioritized:
+            if priority >= 1:
+                query = normalize_query(keyword)
+                query_priorities[query] = max(query_priorities.get(query, 0), priority)
+        due_projects.append((project, due))
+        not_due[project] = len(prioritized) - len(due)
+
+    # Квота розподіляється за пріоритетом запиту, а не за порядком проектів
+    queries = sorted(query_priorities, key=query_priorities.get, reverse=True)
+    results = {}
+    if queries:
+        api_limit = int(API_DAILY_LIMIT * TRACKING_QUOTA_SHARE)
+        results = track_projects_batch(connection, [item for item in due_projects if item[1]],
+                                       api_key, cx, region, api_limit=api_limit, queries=queries, depths=depths)
+    return {project: (results.get(project, []), not_due[project]) for project, _ in projects}
+
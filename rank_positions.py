@@ -0,0 +1,206 @@
+import argparse
+from datetime import date
+
+import pandas as pd
+from psycopg2.extras import execute_values
+
+from db_pool import db_connection
+
+# Скільки рядків історії показується на одній сторінці
+HISTORY_PAGE_SIZE = 50
+
+# Префікс старих таблиць проектів (Postgres зберігає імена без лапок у нижньому регістрі)
+LEGACY_TABLE_PREFIX = 'rank_tracker_'
+
+
+# Функція для отримання ключа проекту, під яким зберігаються його позиції
+def get_project_key(domain, region):
+    return f"{domain}_{region}".lower()
+
+
+# Функція для створення спільної таблиці позицій, секціонованої за місяцями дати перевірки
+def create_rank_positions_table_if_not_exists(connection):
+    cursor = connection.cursor()
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS rank_positions (
+            project TEXT NOT NULL,
+            keyword TEXT NOT NULL,
+            tag TEXT NOT NULL,
+            url TEXT NOT NULL,
+            region TEXT NOT NULL,
+            date DATE NOT NULL,
+            position INTEGER NOT NULL,
+            PRIMARY KEY (project, keyword, date)
+        ) PARTITION BY RANGE (date);
+        CREATE INDEX IF NOT EXISTS idx_rank_positions_project_date ON rank_positions (project, date);
+    ''')
+    connection.commit()
+    cursor.close()
+
+
+# Функція для створення місячних секцій rank_positions, яких ще немає, для переданих дат
+def ensure_rank_positions_partitions(connection, dates):
+    months = sorted({date(day.year, day.month, 1) for day in dates})
+    if not months:
+        return
+    cursor = connection.cursor()
+    for month_start in months:
+        if month_start.month == 12:
+            month_end = date(month_start.year + 1, 1, 1)
+        else:
+            month_end = date(month_start.year, month_start.month + 1, 1)
+        cursor.execute(f'''
+            CREATE TABLE IF NOT EXISTS rank_positions_{month_start:%Y_%m}
+            PARTITION OF rank_positions FOR VALUES FROM (%s) TO (%s)
+        ''', (month_start, month_end))
+    connection.commit()
+    cursor.close()
+
+
+# Функція для запису позицій проекту одним багаторядковим INSERT.
+# rows — список (keyword, tag, url, region, date, position); для ключового слова проекту зберігається одна позиція
+# на день, тож повторна перевірка в той самий день оновлює її замість додавання дубліката.
+def save_positions(connection, project, rows):
+    if not rows:
+        return
+    ensure_rank_positions_partitions(connection, [row[4] for row in rows])
+    cursor = connection.cursor()
+    execute_values(cursor, '''
+        INSERT INTO rank_positions (project, keyword, tag, url, region, date, position)
+        VALUES %s
+        ON CONFLICT (project, keyword, date) DO UPDATE
+        SET tag = EXCLUDED.tag, url = EXCLUDED.url, region = EXCLUDED.region, position = EXCLUDED.position
+    ''', [(project,) + tuple(row) for row in rows])
+    connection.commit()
+    cursor.close()
+
+
+# Функція для отримання підсумку історії проекту по кожному ключовому слову і URL (одна сторінка).
+# Остання позиція, зміна за 7 і 30 днів (додатна — позиція покращилась), найкраща та найгірша позиції
+# рахуються в SQL віконними функціями. Повертає (DataFrame сторінки, загальна кількість рядків підсумку).
+def get_rank_history_summary(connection, project, page=1, page_size=HISTORY_PAGE_SIZE):
+    query = """
+        WITH ranked AS (
+            SELECT keyword, url, date, position,
+                   ROW_NUMBER() OVER (PARTITION BY keyword, url ORDER BY date DESC) AS recency,
+                   MIN(position) OVER (PARTITION BY keyword, url) AS best_position,
+                   MAX(position) OVER (PARTITION BY keyword, url) AS worst_position,
+                   COUNT(*) OVER (PARTITION BY keyword, url) AS checks
+            FROM rank_positions
+            WHERE project = %(project)s
+        ),
+        latest AS (
+            SELECT *, COUNT(*) OVER () AS total_rows
+            FROM ranked
+            WHERE recency = 1
+            ORDER BY keyword, url
+            LIMIT %(limit)s OFFSET %(offset)s
+        )
+        SELECT latest.keyword, latest.url, latest.date AS last_date, latest.position AS latest_position,
+               week.position - latest.position AS delta_7d,
+               month.position - latest.position AS delta_30d,
+               latest.best_position, latest.worst_position, latest.checks, latest.total_rows
+        FROM latest
+        LEFT JOIN LATERAL (
+            SELECT position FROM rank_positions p
+            WHERE p.project = %(project)s AND p.keyword = latest.keyword AND p.url = latest.url
+              AND p.date <= latest.date - 7
+            ORDER BY p.date DESC
+            LIMIT 1
+        ) week ON TRUE
+        LEFT JOIN LATERAL (
+            SELECT position FROM rank_positions p
+            WHERE p.project = %(project)s AND p.keyword = latest.keyword AND p.url = latest.url
+              AND p.date <= latest.date - 30
+            ORDER BY p.date DESC
+            LIMIT 1
+        ) month ON TRUE
+        ORDER BY latest.keyword, latest.url
+    """
+    params = {'project': project, 'limit': page_size, 'offset': (page - 1) * page_size}
+    df = pd.read_sql(query, connection, params=params)
+    total_rows = int(df['total_rows'].iloc[0]) if not df.empty else 0
+    return df.drop(columns=['total_rows']), total_rows
+
+
+# Функція для отримання однієї сторінки повної історії перевірок проекту (нові записи першими).
+# Повертає (DataFrame сторінки, загальна кількість записів).
+def get_rank_history_page(connection, project, page=1, page_size=HISTORY_PAGE_SIZE):
+    query = """
+        SELECT keyword, tag, url, date, position
+        FROM rank_positions
+        WHERE project = %s
+        ORDER BY date DESC, keyword, url
+        LIMIT %s OFFSET %s
+    """
+    df = pd.read_sql(query, connection, params=[project, page_size, (page - 1) * page_size])
+    cursor = connection.cursor()
+    cursor.execute('SELECT COUNT(*) FROM rank_positions WHERE project = %s', (project,))
+    total_rows = cursor.fetchone()[0]
+    cursor.close()
+    return df, total_rows
+
+
+# Функція для отримання списку старих таблиць Rank_tracker_{domain}_{region}
+def get_legacy_project_tables(connection):
+    cursor = connection.cursor()
+    cursor.execute(r'''
+        SELECT table_name
+        FROM information_schema.tables
+        WHERE table_schema = current_schema() AND table_name LIKE 'rank\_tracker\_%'
+        ORDER BY table_name
+    ''')
+    tables = [row[0] for row in cursor.fetchall()]
+    cursor.close()
+    return tables
+
+
+# Функція для перенесення однієї старої таблиці проекту в rank_positions.
+# Перенесення ідемпотентне: рядки, що вже є в rank_positions, пропускаються. Якщо за день є кілька перевірок
+# ключового слова, переноситься найкраща позиція (за рівності — перший URL). Повертає кількість доданих рядків.
+def migrate_legacy_project_table(connection, table_name, drop=False):
+    project = table_name[len(LEGACY_TABLE_PREFIX):]
+    cursor = connection.cursor()
+    cursor.execute(f'SELECT DISTINCT date FROM "{table_name}"')
+    ensure_rank_positions_partitions(connection, [row[0] for row in cursor.fetchall()])
+
+    cursor.execute(f'''
+        INSERT INTO rank_positions (project, keyword, tag, url, region, date, position)
+        SELECT DISTINCT ON (keyword, date) %s, keyword, tag, url, region, date, position
+        FROM "{table_name}"
+        ORDER BY keyword, date, position, url
+        ON CONFLICT (project, keyword, date) DO NOTHING
+    ''', (project,))
+    inserted = cursor.rowcount
+
+    if drop:
+        cursor.execute(f'DROP TABLE "{table_name}"')
+    connection.commit()
+    cursor.close()
+    return inserted
+
+
+# Функція для перенесення всіх старих таблиць проектів у rank_positions
+def migrate_legacy_project_tables(connection, drop=False):
+    create_rank_positions_table_if_not_exists(connection)
+    migrated = {}
+    for table_name in get_legacy_project_tables(connection):
+        migrated[table_name] = migrate_legacy_project_table(connection, table_name, drop=drop)
+    return migrated
+
+
+# Перенесення старих таблиць з командного рядка: python rank_positions.py [--drop]
+def main():
+    parser = argparse.ArgumentParser(description="Перенесення таблиць Rank_tracker_* у rank_positions")
+    parser.add_argument('--drop', action='store_true', help="видалити старі таблиці після перенесення")
+    args = parser.parse_args()
+
+    with db_connection() as conn:
+        if conn is None:
+            raise SystemExit(1)
+        for table_name, inserted in migrate_legacy_project_tables(conn, drop=args.drop).items():
+            print(f"{table_name}: перенесено {inserted} рядків")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,32 @@
 import streamlit as st
-import requests
-import psycopg2
-from datetime import datetime
 import pandas as pd
 from bs4 import BeautifulSoup
 import re
 from dotenv import load_dotenv
 import os
-import schedule
-import time
-import threading
+from db_pool import db_connection
+from rank_engine import (
+    DEFAULT_TRACKING_DEPTH,
+    QUOTA_EXHAUSTED,
+    TRACKING_DEPTH_OPTIONS,
+    get_tracked_keywords,
+    prioritize_keywords,
+    track_positions_batch,
+)
+from rank_positions import (
+    HISTORY_PAGE_SIZE,
+    create_rank_positions_table_if_not_exists,
+    get_project_key,
+    get_rank_history_page,
+    get_rank_history_summary,
+)
+from rank_worker import (
+    disable_tracking_job,
+    enqueue_tracking_job,
+    get_tracking_jobs,
+    try_lock_project,
+    unlock_project,
+)
 
 # Завантаження змінних середовища з файлу .env
 load_dotenv()
@@ -17,30 +34,11 @@ load_dotenv()
 # Отримання змінних середовища
 API_KEY = os.getenv('GOOGLE_API_KEY')
 CX = os.getenv('GOOGLE_CX')
-DB_HOST = os.getenv('DB_HOST')
-DB_NAME = os.getenv('DB_NAME')
-DB_USER = os.getenv('DB_USER')
-DB_PASSWORD = os.getenv('DB_PASSWORD')
 
 # Налаштування сторінки
 st.set_page_config(page_title="Rank Tracker", layout="wide")
 
 
-# Функція для підключення до бази даних PostgreSQL
-def connect_to_db():
-    try:
-        connection = psycopg2.connect(
-            host=DB_HOST,
-            database=DB_NAME,
-            user=DB_USER,
-            password=DB_PASSWORD
-        )
-        return connection
-    except Exception as e:
-        st.error(f"Помилка при підключенні до бази даних: {e}")
-        return None
-
-
 # Функція для додавання нового ключового слова до бази даних
 def add_keyword_to_db(keyword, tag, url, connection):
     try:
@@ -60,59 +58,13 @@ def add_keyword_to_db(keyword, tag, url, connection):
         st.error(f"Помилка при додаванні ключового слова: {e}")
 
 
-# Функція для створення таблиці для нового проекту
+# Функція для створення нового проекту: позиції всіх проектів зберігаються в спільній таблиці rank_positions
 def create_project_table(domain, region, connection):
-    table_name = f"Rank_tracker_{domain}_{region}"
     try:
-        cursor = connection.cursor()
-        cursor.execute(f'''
-            CREATE TABLE IF NOT EXISTS {table_name} (
-                keyword TEXT NOT NULL,
-                tag TEXT NOT NULL,
-                url TEXT NOT NULL,
-                region TEXT NOT NULL,
-                date DATE NOT NULL,
-                position INTEGER NOT NULL
-            );
-        ''')
-        connection.commit()
-        cursor.close()
-        st.success(f"Таблиця '{table_name}' створена або вже існує.")
+        create_rank_positions_table_if_not_exists(connection)
+        st.success(f"Проект '{get_project_key(domain, region)}' готовий до відстеження.")
     except Exception as e:
-        st.error(f"Помилка при створенні таблиці: {e}")
-
-
-# Функція для виконання пошуку та визначення позиції URL
-def get_position(query, url, api_key, cx, region):
-    search_results = perform_search(query, api_key, cx, region)
-    position = None
-    for idx, item in enumerate(search_results, 1):
-        if item.get('link') == url:
-            position = idx
-            break
-    return position
-
-
-# Функція для виконання пошуку за допомогою Google Custom Search API
-def perform_search(query, api_key, cx, region=None):
-    url = "https://www.googleapis.com/customsearch/v1"
-    params = {
-        'q': query,
-        'key': api_key,
-        'cx': cx,
-        'num': 10  # Максимум 10 результатів
-    }
-    if region:
-        params['gl'] = region  # Додавання параметра регіону
-
-    try:
-        response = requests.get(url, params=params)
-        response.raise_for_status()
-        results = response.json()
-        return results.get('items', [])
-    except requests.exceptions.RequestException as e:
-        st.error(f"Помилка при отриманні результатів пошуку: {e}")
-        return []
+        st.error(f"Помилка при створенні проекту: {e}")
 
 
 # Функція для отримання ключових слів з таблиці "keywords"
@@ -144,48 +96,49 @@ def get_tag_and_url(connection, keyword):
         return None, None
 
 
-# Функція для додавання позиції до таблиці проекту
-def add_position_to_project(domain, region, keyword, tag, url, date, position, connection):
-    table_name = f"Rank_tracker_{domain}_{region}"
+# Функція для відстеження позицій ключових слів.
+# Проект блокується тим самим advisory-блокуванням, що й у воркері, щоб ручний і автоматичний запуски
+# не шукали ті самі ключові слова і не витрачали на них квоту одночасно.
+def track_positions(domain, region, connection, depth=DEFAULT_TRACKING_DEPTH):
+    project = get_project_key(domain, region)
     try:
-        cursor = connection.cursor()
-        cursor.execute(f'''
-            INSERT INTO {table_name} (keyword, tag, url, region, date, position)
-            VALUES (%s, %s, %s, %s, %s, %s);
-        ''', (keyword, tag, url, region, date, position))
-        connection.commit()
-        cursor.close()
+        if not try_lock_project(connection, project):
+            st.warning("Позиції цього проекту вже відстежуються (воркером або в іншій сесії). Спробуйте пізніше.")
+            return
     except Exception as e:
-        st.error(f"Помилка при додаванні позиції до таблиці: {e}")
-
+        connection.rollback()
+        st.error(f"Помилка при відстеженні позицій: {e}")
+        return
 
-# Функція для відстеження позицій ключових слів
-def track_positions(domain, region, connection):
-    table_name = f"Rank_tracker_{domain}_{region}"
     try:
-        cursor = connection.cursor()
-        cursor.execute(f'''
-            SELECT keyword, tag, url FROM keywords;
-        ''')
-        keywords_data = cursor.fetchall()
-        cursor.close()
+        keywords_data = get_tracked_keywords(connection)
 
         if not keywords_data:
             st.info("Таблиця 'keywords' порожня. Додайте ключові слова до бази даних.")
             return
 
-        today_str = datetime.now().strftime("%Y-%m-%d")
-        date_obj = datetime.strptime(today_str, "%Y-%m-%d").date()
+        # Найважливіші ключові слова йдуть першими: якщо квоти не вистачить, відкладуться найменш пріоритетні
+        prioritized = prioritize_keywords(connection, project, keywords_data)
+        keywords_data = [(keyword, tag, url) for keyword, tag, url, _ in prioritized]
+
+        # Пошук виконується паралельно, а позиції записуються одним INSERT на весь запуск
+        with st.spinner(f"Відстеження позицій для {len(keywords_data)} ключових слів..."):
+            results = track_positions_batch(connection, project, keywords_data, API_KEY, CX, region, depth=depth)
 
-        for keyword, tag, url in keywords_data:
-            position = get_position(keyword, url, API_KEY, CX, region)
-            if position:
-                add_position_to_project(domain, region, keyword, tag, url, date_obj, position, connection)
+        for keyword, position, error in results:
+            if error == QUOTA_EXHAUSTED:
+                st.warning(f"Ключове слово '{keyword}' відкладено: {error}.")
+            elif error:
+                st.error(f"Не вдалося перевірити ключове слово '{keyword}': {error}")
+            elif position:
                 st.success(f"Ключове слово '{keyword}' має позицію {position} за запитом '{keyword}'.")
             else:
                 st.warning(f"Ключове слово '{keyword}' не знайдено у видачі.")
     except Exception as e:
+        connection.rollback()
         st.error(f"Помилка при відстеженні позицій: {e}")
+    finally:
+        unlock_project(connection, project)
 
 
 # Функція для створення нового проекту
@@ -193,17 +146,47 @@ def create_new_project(domain, region, connection):
     create_project_table(domain, region, connection)
 
 
-# Функція для планування автоматичного відстеження
-def schedule_tracking(domain, region, connection):
-    def job():
-        st.write(f"Автоматичний запуск відстеження для домену {domain} у регіоні {region}.")
-        track_positions(domain, region, connection)
-
-    schedule.every().monday.do(job)
+# Функція для відображення завдань автоматичного відстеження (їх виконує окремий процес rank_worker.py)
+def render_tracking_jobs(connection):
+    try:
+        jobs = get_tracking_jobs(connection)
+    except Exception as e:
+        st.error(f"Помилка при отриманні завдань відстеження: {e}")
+        return
+    if jobs:
+        df_jobs = pd.DataFrame(jobs, columns=['Домен', 'Регіон', 'Увімкнено', 'Інтервал (днів)', 'Глибина',
+                                              'Наступний запуск', 'Останній запуск', 'Результат', 'Помилка'])
+        st.dataframe(df_jobs)
+    else:
+        st.info("Завдань автоматичного відстеження ще немає.")
+
+
+# Функція для відображення однієї сторінки історії проекту: підсумок по ключових словах або всі перевірки
+def render_rank_history(connection, project):
+    view = st.radio("Вигляд", ["Підсумок по ключових словах", "Усі перевірки"], horizontal=True,
+                    key="rank_history_view")
+    page = st.number_input("Сторінка", min_value=1, value=1, step=1, key="rank_history_page")
+    try:
+        if view == "Підсумок по ключових словах":
+            df_history, total_rows = get_rank_history_summary(connection, project, page=page)
+            df_history.columns = ['Ключове слово', 'URL', 'Остання перевірка', 'Позиція', 'Зміна за 7 днів',
+                                  'Зміна за 30 днів', 'Найкраща', 'Найгірша', 'Перевірок']
+        else:
+            df_history, total_rows = get_rank_history_page(connection, project, page=page)
+            df_history.columns = ['Ключове слово', 'Тег', 'URL', 'Дата', 'Позиція']
+    except Exception as e:
+        st.error(f"Помилка при отриманні історії: {e}")
+        return
 
-    while True:
-        schedule.run_pending()
-        time.sleep(1)
+    if df_history.empty:
+        if total_rows:
+            st.info("На цій сторінці немає записів.")
+        else:
+            st.info("Історія відстеження порожня.")
+        return
+    total_pages = (total_rows + HISTORY_PAGE_SIZE - 1) // HISTORY_PAGE_SIZE
+    st.dataframe(df_history)
+    st.caption(f"Сторінка {page} з {total_pages} (усього записів: {total_rows})")
 
 
 # Основна функція Streamlit
@@ -232,13 +215,16 @@ def main():
         selected_region = st.selectbox("Оберіть регіон пошуку", options=list(regions.keys()), index=0)
         region_code = regions[selected_region]
 
+        # Глибина відстеження: наступні сторінки видачі запитуються лише для ключових слів,
+        # яких немає на першій сторінці, і кожна сторінка коштує окремий запит до API
+        tracking_depth = st.selectbox("Глибина відстеження (позицій)", options=TRACKING_DEPTH_OPTIONS, index=0)
+
         # Створення нового проекту
         if st.button("Створити/Оновити проект"):
             if domain and selected_region:
-                conn = connect_to_db()
-                if conn:
-                    create_new_project(domain, region_code, conn)
-                    conn.close()
+                with db_connection() as conn:
+                    if conn:
+                        create_new_project(domain, region_code, conn)
             else:
                 st.error("Будь ласка, введіть домен та оберіть регіон.")
 
@@ -254,57 +240,64 @@ def main():
 
         if submit_button:
             if new_keyword and new_tag and new_url:
-                conn = connect_to_db()
-                if conn:
-                    add_keyword_to_db(new_keyword, new_tag, new_url, conn)
-                    conn.close()
+                with db_connection() as conn:
+                    if conn:
+                        add_keyword_to_db(new_keyword, new_tag, new_url, conn)
             else:
                 st.error("Будь ласка, заповніть всі поля форми.")
 
         st.markdown("---")
 
-        # Можливість автоматичного відстеження
+        # Автоматичне відстеження виконує окремий процес: python rank_worker.py
+        # Інтерфейс лише додає, вимикає та показує завдання
         st.header("Автоматичне відстеження")
-        auto_track = st.checkbox("Ввімкнути автоматичне відстеження раз на тиждень")
-        if auto_track:
+        col_enable, col_disable = st.columns(2)
+        with col_enable:
+            enable_tracking = st.button("Відстежувати автоматично")
+        with col_disable:
+            disable_tracking = st.button("Вимкнути")
+        if enable_tracking or disable_tracking:
             if domain and selected_region:
-                conn = connect_to_db()
-                if conn:
-                    # Запуск планувальника у окремому потоці
-                    threading.Thread(target=schedule_tracking, args=(domain, region_code, conn), daemon=True).start()
-                    st.success("Автоматичне відстеження запущено.")
+                with db_connection() as conn:
+                    if conn:
+                        try:
+                            if enable_tracking:
+                                enqueue_tracking_job(conn, domain, region_code, depth=tracking_depth)
+                                st.success("Завдання додано: воркер щодня перевірятиме ключові слова в межах квоти API, "
+                                           "кожне — щонайменше раз на тиждень.")
+                            else:
+                                disable_tracking_job(conn, domain, region_code)
+                                st.success("Автоматичне відстеження вимкнено.")
+                        except Exception as e:
+                            st.error(f"Помилка при оновленні завдання відстеження: {e}")
             else:
                 st.error("Будь ласка, створіть проект перед увімкненням автоматичного відстеження.")
 
     # Основний контент
     if st.sidebar.button("Відстежити позиції зараз"):
-        conn = connect_to_db()
-        if conn:
-            track_positions(domain, region_code, conn)
-            conn.close()
+        with db_connection() as conn:
+            if conn:
+                track_positions(domain, region_code, conn, depth=tracking_depth)
+
+    # Відображення завдань автоматичного відстеження
+    st.markdown("---")
+    st.subheader("Завдання автоматичного відстеження")
+    with st.expander("Переглянути завдання"):
+        # Завдання читаються з бази лише на запит, а не при кожному перезапуску сторінки
+        if st.checkbox("Завантажити завдання", key="load_tracking_jobs"):
+            with db_connection() as conn:
+                if conn:
+                    render_tracking_jobs(conn)
 
     # Відображення історії відстеження
     st.markdown("---")
     st.subheader("Історія відстеження позицій")
     with st.expander("Переглянути історію"):
-        conn = connect_to_db()
-        if conn:
-            table_name = f"Rank_tracker_{domain}_{region_code}"
-            try:
-                cursor = conn.cursor()
-                cursor.execute(f'''
-                    SELECT keyword, tag, url, date, position FROM {table_name} ORDER BY date DESC;
-                ''')
-                data = cursor.fetchall()
-                cursor.close()
-                if data:
-                    df_history = pd.DataFrame(data, columns=['Ключове слово', 'Тег', 'URL', 'Дата', 'Позиція'])
-                    st.dataframe(df_history)
-                else:
-                    st.info("Історія відстеження порожня.")
-            except Exception as e:
-                st.error(f"Помилка при отриманні історії: {e}")
-            conn.close()
+        # Історія читається з бази лише на запит і посторінково
+        if st.checkbox("Завантажити історію", key="load_rank_history"):
+            with db_connection() as conn:
+                if conn:
+                    render_rank_history(conn, get_project_key(domain, region_code))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,323 @@
+import argparse
+import logging
+import os
+import time
+from datetime import datetime
+from functools import partial
+
+import streamlit as st
+from dotenv import load_dotenv
+
+from content_changes import create_change_date_index
+from db_pool import db_connection
+from keyword_store import backfill_keyword_occurrences, get_competitor_tables
+from rank_engine import (
+    DEFAULT_TRACKING_DEPTH,
+    QUOTA_EXHAUSTED,
+    get_tracked_keywords,
+    run_scheduled_tracking_for_projects,
+)
+from rank_positions import get_project_key
+from snapshot_diffs import store_content_diffs
+from snapshot_store import dedup_snapshot_contents
+
+# Завантаження змінних середовища з файлу .env
+load_dotenv()
+
+API_KEY = os.getenv('GOOGLE_API_KEY')
+CX = os.getenv('GOOGLE_CX')
+
+# Як часто (у секундах) воркер перевіряє, чи настав час якогось завдання
+POLL_INTERVAL = 60
+# Як часто запускається завдання проекту; які саме ключові слова перевіряти, вирішує планувальник rank_engine
+DEFAULT_INTERVAL_DAYS = 1
+# Як часто (у секундах) воркер дораховує похідні таблиці знімків конкурентів
+MAINTENANCE_INTERVAL = 300
+# Скільки порцій знімків одного конкурента обробляється за один прохід, щоб не відкладати завдання відстеження
+MAINTENANCE_MAX_BATCHES = 20
+# Простір ключів advisory-блокувань Postgres для відстеження проектів
+ADVISORY_LOCK_NAMESPACE = 7301
+
+logger = logging.getLogger("rank_worker")
+
+
+# Функція для створення таблиці завдань автоматичного відстеження
+def create_tracking_jobs_table_if_not_exists(connection):
+    cursor = connection.cursor()
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS rank_tracking_jobs (
+            id SERIAL PRIMARY KEY,
+            domain TEXT NOT NULL,
+            region TEXT NOT NULL,
+            interval_days INTEGER NOT NULL DEFAULT 1,
+            depth INTEGER NOT NULL DEFAULT 10,
+            enabled BOOLEAN NOT NULL DEFAULT TRUE,
+            next_run_at TIMESTAMP NOT NULL,
+            last_run_at TIMESTAMP,
+            last_status TEXT,
+            last_error TEXT,
+            UNIQUE (domain, region)
+        );
+        CREATE INDEX IF NOT EXISTS idx_rank_tracking_jobs_due ON rank_tracking_jobs (next_run_at) WHERE enabled;
+    ''')
+    connection.commit()
+    cursor.close()
+
+
+# Підготовка таблиці завдань один раз за час роботи процесу
+@st.cache_resource(show_spinner=False)
+def create_tracking_jobs_table_once(_connection):
+    create_tracking_jobs_table_if_not_exists(_connection)
+    return True
+
+
+# Функція для додавання (або ввімкнення) завдання відстеження проекту; перший запуск — одразу
+def enqueue_tracking_job(connection, domain, region, interval_days=DEFAULT_INTERVAL_DAYS,
+                         depth=DEFAULT_TRACKING_DEPTH):
+    create_tracking_jobs_table_once(connection)
+    cursor = connection.cursor()
+    cursor.execute('''
+        INSERT INTO rank_tracking_jobs (domain, region, interval_days, depth, enabled, next_run_at)
+        VALUES (%s, %s, %s, %s, TRUE, %s)
+        ON CONFLICT (domain, region) DO UPDATE
+        SET interval_days = EXCLUDED.interval_days, depth = EXCLUDED.depth, enabled = TRUE,
+            next_run_at = EXCLUDED.next_run_at
+    ''', (domain, region, interval_days, depth, datetime.now()))
+    connection.commit()
+    cursor.close()
+
+
+# Функція для вимкнення завдання відстеження проекту
+def disable_tracking_job(connection, domain, region):
+    create_tracking_jobs_table_once(connection)
+    cursor = connection.cursor()
+    cursor.execute('UPDATE rank_tracking_jobs SET enabled = FALSE WHERE domain = %s AND region = %s',
+                   (domain, region))
+    connection.commit()
+    cursor.close()
+
+
+# Функція для отримання списку завдань для відображення в інтерфейсі
+def get_tracking_jobs(connection):
+    create_tracking_jobs_table_once(connection)
+    cursor = connection.cursor()
+    cursor.execute('''
+        SELECT domain, region, enabled, interval_days, depth, next_run_at, last_run_at, last_status, last_error
+        FROM rank_tracking_jobs
+        ORDER BY domain, region
+    ''')
+    data = cursor.fetchall()
+    cursor.close()
+    return data
+
+
+# Функція для отримання завдань, час яких настав
+def get_due_jobs(connection):
+    cursor = connection.cursor()
+    cursor.execute('''
+        SELECT id, domain, region, depth
+        FROM rank_tracking_jobs
+        WHERE enabled AND next_run_at <= %s
+        ORDER BY next_run_at
+    ''', (datetime.now(),))
+    jobs = cursor.fetchall()
+    connection.commit()
+    cursor.close()
+    return jobs
+
+
+# Функція для спроби захопити advisory-блокування проекту: проект одночасно відстежує лише один воркер
+# або ручний запуск з інтерфейсу. project — ключ проекту (rank_positions.get_project_key).
+def try_lock_project(connection, project):
+    cursor = connection.cursor()
+    cursor.execute('SELECT pg_try_advisory_lock(%s, hashtext(%s))', (ADVISORY_LOCK_NAMESPACE, project))
+    locked = cursor.fetchone()[0]
+    connection.commit()
+    cursor.close()
+    return locked
+
+
+# Функція для звільнення advisory-блокування проекту
+def unlock_project(connection, project):
+    cursor = connection.cursor()
+    cursor.execute('SELECT pg_advisory_unlock(%s, hashtext(%s))', (ADVISORY_LOCK_NAMESPACE, project))
+    connection.commit()
+    cursor.close()
+
+
+# Функція для запису результату запуску і планування наступного
+def finish_job(connection, job_id, status, error=None):
+    now = datetime.now()
+    cursor = connection.cursor()
+    cursor.execute('''
+        UPDATE rank_tracking_jobs
+        SET last_run_at = %s,
+            last_status = %s,
+            last_error = %s,
+            next_run_at = %s + interval_days * INTERVAL '1 day'
+        WHERE id = %s
+    ''', (now, status, error, now, job_id))
+    connection.commit()
+    cursor.close()
+
+
+# Функція для перевірки, чи завдання досі потрібно виконувати
+# (воно могло бути щойно виконане іншим воркером, поки ми чекали на блокування)
+def is_job_still_due(connection, job_id):
+    cursor = connection.cursor()
+    cursor.execute('SELECT 1 FROM rank_tracking_jobs WHERE id = %s AND enabled AND next_run_at <= %s',
+                   (job_id, datetime.now()))
+    still_due = cursor.fetchone() is not None
+    connection.commit()
+    cursor.close()
+    return still_due
+
+
+# Функція для формування короткого звіту про запуск проекту
+def format_job_status(results, not_due):
+    deferred = sum(1 for _, _, error in results if error == QUOTA_EXHAUSTED)
+    failed = sum(1 for _, _, error in results if error and error != QUOTA_EXHAUSTED)
+    found = sum(1 for _, position, error in results if position and not error)
+    status = f"перевірено {len(results) - deferred - failed}, знайдено {found}"
+    if deferred:
+        status += f", відкладено через квоту {deferred}"
+    if failed:
+        status += f", помилок {failed}"
+    if not_due:
+        status += f", ще не час перевіряти {not_due}"
+    return status
+
+
+# Функція для виконання завдань одного регіону: кожен запит шукається один раз для всіх проектів регіону
+def run_region_jobs(connection, region, jobs):
+    logger.info("Відстеження позицій у регіоні %s для: %s", region, ", ".join(domain for _, domain, _ in jobs))
+    try:
+        keywords_data = get_tracked_keywords(connection)
+        projects = []
+        depths = {}
+        for _, domain, depth in jobs:
+            project = get_project_key(domain, region)
+            projects.append((project, keywords_data))
+            depths[project] = depth
+        results = run_scheduled_tracking_for_projects(connection, projects, API_KEY, CX, region, depths=depths)
+    except Exception as e:
+        connection.rollback()
+        logger.exception("Помилка при відстеженні регіону %s", region)
+        for job_id, _, _ in jobs:
+            try:
+                finish_job(connection, job_id, "помилка", str(e))
+            except Exception:
+                connection.rollback()
+                logger.exception("Не вдалося записати помилку завдання %s", job_id)
+        return
+
+    for job_id, domain, _ in jobs:
+        status = format_job_status(*results[get_project_key(domain, region)])
+        finish_job(connection, job_id, status)
+        logger.info("%s (%s): %s", domain, region, status)
+
+
+# Функція для одного проходу планувальника: виконує всі завдання, час яких настав.
+# Завдання групуються за регіоном, щоб проекти з однаковими ключовими словами ділили одну видачу.
+def run_due_jobs():
+    with db_connection() as connection:
+        if connection is None:
+            logger.error("Не вдалося підключитися до бази даних")
+            return
+        create_tracking_jobs_table_once(connection)
+
+        locked_projects = []
+        jobs_by_region = {}
+        try:
+            for job_id, domain, region, depth in get_due_jobs(connection):
+                project = get_project_key(domain, region)
+                if not try_lock_project(connection, project):
+                    logger.info("%s (%s) вже відстежується іншим воркером або вручну", domain, region)
+                    continue
+                locked_projects.append(project)
+                if is_job_still_due(connection, job_id):
+                    jobs_by_region.setdefault(region, []).append((job_id, domain, depth))
+
+            for region, jobs in jobs_by_region.items():
+                run_region_jobs(connection, region, jobs)
+        finally:
+            for project in locked_projects:
+                try:
+                    unlock_project(connection, project)
+                except Exception:
+                    # Якщо з'єднання обірвалося, Postgres сам звільняє його advisory-блокування
+                    logger.exception("Не вдалося звільнити блокування проекту %s", project)
+
+
+# Похідні таблиці знімків, які дораховує воркер: (назва для логу, функція (з'єднання, конкурент, max_batches))
+MAINTENANCE_TASKS = [
+    ('keyword_occurrences', backfill_keyword_occurrences),
+    ('content_diffs', store_content_diffs),
+]
+
+
+# Функція для обслуговування похідних таблиць знімків конкурентів (входження ключових слів, дифи контенту,
+# тіла сторінок за хешем). Довгий backfill і побудова індексів на таблицях краулера виконуються тут, а не під час
+# рендерингу сторінок. Нові знімки краулера переводяться на snapshot_bodies при кожному проході, а їхній контент
+# прибирається з таблиці краулера після перевірки збереженого тіла; з keep_snapshot_content цей крок пропускається
+# (без очищення content перенесення лише збільшує обсяг даних).
+def run_snapshot_maintenance(keep_snapshot_content=False):
+    tasks = list(MAINTENANCE_TASKS)
+    if not keep_snapshot_content:
+        tasks.append(('snapshot_bodies', partial(dedup_snapshot_contents, drop_content=True)))
+    with db_connection() as connection:
+        if connection is None:
+            logger.error("Не вдалося підключитися до бази даних")
+            return
+        try:
+            create_change_date_index(connection)
+        except Exception:
+            connection.rollback()
+            logger.exception("Помилка при створенні індексу content_changes")
+        for competitor_name in get_competitor_tables(connection):
+            for task_name, task in tasks:
+                try:
+                    processed = task(connection, competitor_name, max_batches=MAINTENANCE_MAX_BATCHES)
+                except Exception:
+                    connection.rollback()
+                    logger.exception("Помилка при оновленні %s для %s", task_name, competitor_name)
+                    continue
+                if processed:
+                    logger.info("%s: у %s оброблено %s знімків", competitor_name, task_name, processed)
+
+
+# Запуск воркера з командного рядка:
+# python rank_worker.py [--once] [--poll-interval N] [--no-maintenance] [--keep-snapshot-content]
+def main():
+    parser = argparse.ArgumentParser(description="Воркер автоматичного відстеження позицій")
+    parser.add_argument('--once', action='store_true', help="виконати завдання, час яких настав, і завершитися")
+    parser.add_argument('--poll-interval', type=int, default=POLL_INTERVAL,
+                        help="інтервал перевірки завдань у секундах")
+    parser.add_argument('--no-maintenance', action='store_true',
+                        help="не оновлювати похідні таблиці знімків конкурентів")
+    parser.add_argument('--keep-snapshot-content', action='store_true',
+                        help="не переносити контент нових знімків у snapshot_bodies і не очищати колонку content")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    last_maintenance = None
+    while True:
+        # Помилка одного проходу (перезапуск БД, обрив мережі) не зупиняє воркер: наступний прохід — за розкладом
+        try:
+            run_due_jobs()
+        except Exception:
+            logger.exception("Помилка під час виконання завдань відстеження")
+        if not args.no_maintenance and (
+                last_maintenance is None or time.monotonic() - last_maintenance >= MAINTENANCE_INTERVAL):
+            try:
+                run_snapshot_maintenance(keep_snapshot_content=args.keep_snapshot_content)
+            except Exception:
+                logger.exception("Помилка під час оновлення похідних таблиць знімків")
+            last_maintenance = time.monotonic()
+        if args.once:
+            break
+        time.sleep(args.poll_interval)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,333 @@
+import json
+import logging
+import os
+from datetime import datetime, timedelta
+
+import requests
+import streamlit as st
+from psycopg2.extras import execute_values
+
+SEARCH_API_URL = "https://www.googleapis.com/customsearch/v1"
+# Денний ліміт безкоштовних запитів до Google Custom Search API
+API_DAILY_LIMIT = 100
+# Скільки годин збережена видача вважається актуальною (можна змінити через змінну середовища)
+SERP_CACHE_MAX_AGE_HOURS = float(os.environ.get("SERP_CACHE_MAX_AGE_HOURS", 24))
+# Результатів на одній сторінці видачі і максимальна глибина, яку дозволяє API (start + num <= 100)
+RESULTS_PER_PAGE = 10
+MAX_SEARCH_DEPTH = 100
+# Скільки хвилин діє резерв квоти: резерв процесу, що впав між резервуванням і списанням, звільняється сам
+QUOTA_RESERVATION_TTL_MINUTES = 15
+
+# Ті самі помилки пишуться в лог для воркера rank_worker.py, у якого немає сторінки для st.error
+logger = logging.getLogger(__name__)
+
+
+# Функція для створення (і міграції старої) таблиці використання API і таблиці резервів квоти.
+# api_quota_reservations — запити, зарезервовані пакетними запусками, але ще не витрачені; разом з count
+# вони не перевищують ліміт, а прострочені резерви не враховуються.
+# Старі таблиці могли бути створені без ключа на date, а колишнє читання-потім-запис могло продублювати дні:
+# дублікати зливаються в один рядок (з сумою count) до створення унікального індексу, потрібного для ON CONFLICT.
+def create_api_usage_table_if_not_exists(connection):
+    cursor = connection.cursor()
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS api_usage (
+            date DATE PRIMARY KEY,
+            count INTEGER NOT NULL DEFAULT 0
+        );
+        CREATE TABLE IF NOT EXISTS api_quota_reservations (
+            id SERIAL PRIMARY KEY,
+            date DATE NOT NULL,
+            amount INTEGER NOT NULL,
+            expires_at TIMESTAMP NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_api_quota_reservations_date ON api_quota_reservations (date, expires_at);
+    ''')
+    # Чи є вже унікальний ключ на date (первинний ключ нової таблиці або індекс, створений міграцією)
+    cursor.execute('''
+        SELECT EXISTS (
+            SELECT 1
+            FROM pg_index i
+            JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = i.indkey[0]
+            WHERE i.indrelid = 'api_usage'::regclass AND i.indisunique AND i.indnatts = 1 AND a.attname = 'date'
+        )
+    ''')
+    if not cursor.fetchone()[0]:
+        # Таблиця маленька (рядок на день), тож її можна заблокувати на час злиття
+        cursor.execute('''
+            LOCK TABLE api_usage IN SHARE ROW EXCLUSIVE MODE;
+            CREATE TEMP TABLE api_usage_merged ON COMMIT DROP AS
+                SELECT date, SUM(count) AS count
+                FROM api_usage
+                GROUP BY date
+                HAVING COUNT(*) > 1;
+            DELETE FROM api_usage WHERE date IN (SELECT date FROM api_usage_merged);
+            INSERT INTO api_usage (date, count) SELECT date, count FROM api_usage_merged;
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_api_usage_date ON api_usage (date);
+        ''')
+    connection.commit()
+    cursor.close()
+
+
+# Підготовка таблиці використання API один раз за час роботи процесу
+@st.cache_resource(show_spinner=False)
+def create_api_usage_table_once(_connection):
+    create_api_usage_table_if_not_exists(_connection)
+    return True
+
+
+# Функція для отримання використання API
+def get_api_usage(connection, today_str):
+    try:
+        create_api_usage_table_once(connection)
+        cursor = connection.cursor()
+        cursor.execute('SELECT count FROM api_usage WHERE date = %s', (today_str,))
+        result = cursor.fetchone()
+        connection.commit()
+        cursor.close()
+        return result[0] if result else 0
+    except Exception as e:
+        connection.rollback()
+        logger.exception("Помилка при отриманні використання API")
+        st.error(f"Помилка при отриманні використання API: {e}")
+        return 0
+
+
+# Функція для резервування до amount запитів денної квоти.
+# Рядок дня в api_usage блокується (SELECT ... FOR UPDATE), тож паралельні сесії та воркери рахують вільну квоту
+# по черзі і не можуть разом витратити більше за api_limit. Якщо весь обсяг не вміщується, резервується залишок.
+# Резерв діє QUOTA_RESERVATION_TTL_MINUTES хвилин. Помилка бази даних записується в лог і передається далі,
+# щоб її не сплутали з вичерпаною квотою.
+# Повертає (id резерву або None, кількість зарезервованих запитів; 0 — квоту вичерпано).
+# Зарезервоване потрібно закрити через consume_api_quota, навіть якщо частину запитів не виконано.
+def reserve_api_quota(connection, amount, api_limit=API_DAILY_LIMIT, today_str=None):
+    today_str = today_str or datetime.now().strftime("%Y-%m-%d")
+    now = datetime.now()
+    try:
+        create_api_usage_table_once(connection)
+        cursor = connection.cursor()
+        cursor.execute('INSERT INTO api_usage (date, count) VALUES (%s, 0) ON CONFLICT (date) DO NOTHING',
+                       (today_str,))
+        cursor.execute('SELECT count FROM api_usage WHERE date = %s FOR UPDATE', (today_str,))
+        used = cursor.fetchone()[0]
+        cursor.execute(
+            'SELECT COALESCE(SUM(amount), 0) FROM api_quota_reservations WHERE date = %s AND expires_at > %s',
+            (today_str, now)
+        )
+        reserved = max(min(amount, api_limit - used - cursor.fetchone()[0]), 0)
+
+        reservation_id = None
+        if reserved:
+            cursor.execute('''
+                INSERT INTO api_quota_reservations (date, amount, expires_at)
+                VALUES (%s, %s, %s)
+                RETURNING id
+            ''', (today_str, reserved, now + timedelta(minutes=QUOTA_RESERVATION_TTL_MINUTES)))
+            reservation_id = cursor.fetchone()[0]
+        # Прострочені резерви (процес упав до списання) вже не враховуються і просто прибираються
+        cursor.execute('DELETE FROM api_quota_reservations WHERE expires_at <= %s', (now,))
+        connection.commit()
+        cursor.close()
+        return reservation_id, reserved
+    except Exception:
+        connection.rollback()
+        logger.exception("Помилка при резервуванні квоти API")
+        raise
+
+
+# Функція для списання використаних запитів і звільнення резерву.
+# used — скільки запитів реально виконано, reservation_id — резерв, виданий reserve_api_quota (або None).
+def consume_api_quota(connection, used, reservation_id=None, today_str=None):
+    today_str = today_str or datetime.now().strftime("%Y-%m-%d")
+    try:
+        cursor = connection.cursor()
+        if used:
+            cursor.execute('''
+                INSERT INTO api_usage (date, count)
+                VALUES (%s, %s)
+                ON CONFLICT (date) DO UPDATE
+                SET count = api_usage.count + EXCLUDED.count
+            ''', (today_str, used))
+        if reservation_id is not None:
+            cursor.execute('DELETE FROM api_quota_reservations WHERE id = %s', (reservation_id,))
+        connection.commit()
+        cursor.close()
+    except Exception as e:
+        connection.rollback()
+        logger.exception("Помилка при оновленні використання API")
+        st.error(f"Помилка при оновленні використання API: {e}")
+
+
+# Функція для отримання історії використання API
+def get_api_usage_history(connection):
+    try:
+        cursor = connection.cursor()
+        cursor.execute('SELECT date, count FROM api_usage ORDER BY date ASC')
+        data = cursor.fetchall()
+        cursor.close()
+        return data
+    except Exception as e:
+        logger.exception("Помилка при отриманні історії використання API")
+        st.error(f"Помилка при отриманні історії використання API: {e}")
+        return []
+
+
+# Функція для запиту до Google Custom Search API (без обробки помилок).
+# start — позиція першого результату сторінки (1, 11, 21, ...).
+def request_search_results(query, api_key, cx, region=None, start=1):
+    params = {
+        'q': query,
+        'key': api_key,
+        'cx': cx,
+        'num': RESULTS_PER_PAGE  # Максимум 10 результатів
+    }
+    if region:
+        params['gl'] = region  # Додавання параметра регіону
+    if start > 1:
+        params['start'] = start
+
+    response = requests.get(SEARCH_API_URL, params=params, timeout=30)
+    response.raise_for_status()
+    return response.json().get('items', [])
+
+
+# Функція для виконання пошуку (без кешу)
+def perform_search(query, api_key, cx, region=None):
+    try:
+        return request_search_results(query, api_key, cx, region)
+    except requests.exceptions.RequestException as e:
+        logger.exception("Помилка при отриманні результатів пошуку")
+        st.error(f"Помилка при отриманні результатів пошуку: {e}")
+        return []
+
+
+# Функція для нормалізації запиту, щоб однакові пошуки мали один ключ у кеші
+def normalize_query(query):
+    return ' '.join(query.lower().split())
+
+
+# Функція для створення таблиці збереженої видачі
+def create_serp_cache_table_if_not_exists(connection):
+    cursor = connection.cursor()
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS serp_cache (
+            query TEXT NOT NULL,
+            region TEXT NOT NULL,
+            day DATE NOT NULL,
+            items JSONB NOT NULL,
+            fetched_at TIMESTAMP NOT NULL,
+            -- Скільки позицій видачі збережено в items (завантажені сторінки або MAX_SEARCH_DEPTH, якщо видача закінчилась)
+            depth INTEGER NOT NULL DEFAULT 10,
+            PRIMARY KEY (query, region, day)
+        );
+    ''')
+    connection.commit()
+    cursor.close()
+
+
+# Підготовка таблиці збереженої видачі один раз за час роботи процесу
+@st.cache_resource(show_spinner=False)
+def create_serp_cache_table_once(_connection):
+    create_serp_cache_table_if_not_exists(_connection)
+    return True
+
+
+# Функція для отримання збереженої видачі, не старшої за max_age_hours, разом з її глибиною.
+# Повертає (результати, глибина) або None, якщо актуальної видачі немає.
+def get_cached_serp_entry(connection, query, region=None, max_age_hours=SERP_CACHE_MAX_AGE_HOURS):
+    cursor = connection.cursor()
+    cursor.execute('''
+        SELECT items, depth
+        FROM serp_cache
+        WHERE query = %s AND region = %s AND fetched_at >= %s
+        ORDER BY fetched_at DESC
+        LIMIT 1
+    ''', (normalize_query(query), region or '', datetime.now() - timedelta(hours=max_age_hours)))
+    result = cursor.fetchone()
+    cursor.close()
+    return (result[0], result[1]) if result else None
+
+
+# Функція для отримання збереженої видачі, не старшої за max_age_hours; повертає None, якщо її немає
+def get_cached_serp(connection, query, region=None, max_age_hours=SERP_CACHE_MAX_AGE_HOURS):
+    entry = get_cached_serp_entry(connection, query, region, max_age_hours)
+    return entry[0] if entry else None
+
+
+# Функція для визначення глибини видачі після завантаження сторінки:
+# неповна сторінка означає, що далі результатів немає
+def get_serp_depth(items, pages_loaded=1):
+    if len(items) < pages_loaded * RESULTS_PER_PAGE:
+        return MAX_SEARCH_DEPTH
+    return min(pages_loaded * RESULTS_PER_PAGE, MAX_SEARCH_DEPTH)
+
+
+# Функція для збереження видачі кількох запитів одного регіону за (запит, регіон, день) одним INSERT.
+# depths — необов'язковий словник {запит: глибина}; за замовчуванням глибина визначається за першою сторінкою.
+def save_serps(connection, region, items_by_query, depths=None):
+    if not items_by_query:
+        return
+    depths = depths or {}
+    fetched_at = datetime.now()
+    rows = {}
+    for query, items in items_by_query.items():
+        depth = depths.get(query, get_serp_depth(items))
+        rows[normalize_query(query)] = (normalize_query(query), region or '', fetched_at.date(), json.dumps(items),
+                                        fetched_at, depth)
+    cursor = connection.cursor()
+    execute_values(cursor, '''
+        INSERT INTO serp_cache (query, region, day, items, fetched_at, depth)
+        VALUES %s
+        ON CONFLICT (query, region, day) DO UPDATE
+        SET items = EXCLUDED.items, fetched_at = EXCLUDED.fetched_at, depth = EXCLUDED.depth
+    ''', list(rows.values()))
+    connection.commit()
+    cursor.close()
+
+
+# Функція для збереження видачі одного запиту
+def save_serp(connection, query, region, items):
+    save_serps(connection, region, {query: items})
+
+
+# Функція для виконання пошуку з кешем видачі в Postgres.
+# Квоту API витрачає лише промах кешу; повертає (результати, чи взято з кешу).
+def perform_cached_search(connection, query, api_key, cx, region=None,
+                          api_limit=API_DAILY_LIMIT, max_age_hours=SERP_CACHE_MAX_AGE_HOURS):
+    try:
+        create_serp_cache_table_once(connection)
+        cached_items = get_cached_serp(connection, query, region, max_age_hours)
+        if cached_items is not None:
+            # Для відстеження позицій видача могла бути збережена глибше першої сторінки
+            return cached_items[:RESULTS_PER_PAGE], True
+    except Exception as e:
+        connection.rollback()
+        logger.exception("Помилка при читанні збереженої видачі")
+        st.error(f"Помилка при читанні збереженої видачі: {e}")
+
+    today_str = datetime.now().strftime("%Y-%m-%d")
+    try:
+        reservation_id, reserved = reserve_api_quota(connection, 1, api_limit, today_str)
+    except Exception as e:
+        st.error(f"Помилка при резервуванні квоти API: {e}")
+        return [], False
+    if not reserved:
+        st.error("Ви досягли ліміту використання API на сьогодні. Спробуйте завтра.")
+        return [], False
+
+    try:
+        items = request_search_results(query, api_key, cx, region)
+    except requests.exceptions.RequestException as e:
+        # Надісланий запит враховується в квоті, навіть якщо він завершився помилкою (як у rank_engine)
+        consume_api_quota(connection, 1, reservation_id, today_str)
+        logger.exception("Помилка при отриманні результатів пошуку")
+        st.error(f"Помилка при отриманні результатів пошуку: {e}")
+        return [], False
+
+    consume_api_quota(connection, 1, reservation_id, today_str)
+    try:
+        save_serp(connection, query, region, items)
+    except Exception as e:
+        connection.rollback()
+        logger.exception("Помилка при збереженні видачі")
+        st.error(f"Помилка при збереженні видачі: {e}")
+    return items, False
@@ -0,0 +1,255 @@
+import json
+import sys
+
+import pandas as pd
+import streamlit as st
+from psycopg2.extras import execute_values
+
+from content_diff import build_content_diff
+from db_pool import create_index_concurrently, db_connection
+from keyword_parser import extract_keywords
+from keyword_store import get_competitor_tables
+from snapshot_store import ensure_content_hash_column, get_snapshot_bodies, resolve_snapshot_contents
+
+# Скільки знімків конкурента обробляється і комітиться за один крок (знімки містять повний контент сторінки)
+DIFF_BATCH_SIZE = 100
+
+
+# Функція для створення таблиці збережених дифів між сусідніми знімками сторінки і таблиці прогресу
+def create_content_diffs_table_if_not_exists(conn):
+    cursor = conn.cursor()
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS content_diffs (
+            competitor TEXT NOT NULL,
+            url TEXT NOT NULL,
+            date_before TIMESTAMP NOT NULL,
+            date_after TIMESTAMP NOT NULL,
+            added INTEGER NOT NULL,
+            removed INTEGER NOT NULL,
+            coarse BOOLEAN NOT NULL,
+            hunks JSONB NOT NULL,
+            keywords_delta JSONB NOT NULL,
+            PRIMARY KEY (competitor, url, date_after)
+        );
+        CREATE TABLE IF NOT EXISTS content_diff_progress (
+            competitor TEXT PRIMARY KEY,
+            last_date_checked TIMESTAMP NOT NULL,
+            last_url TEXT NOT NULL
+        );
+    ''')
+    conn.commit()
+    cursor.close()
+
+
+# Функція для обчислення зміни кількості ключових слів між двома знімками: {ключове слово: стало - було}
+def get_keywords_delta(keywords_before, keywords_after):
+    before = extract_keywords(keywords_before)
+    after = extract_keywords(keywords_after)
+    delta = {keyword: after.get(keyword, 0) - before.get(keyword, 0) for keyword in before.keys() | after.keys()}
+    return {keyword: change for keyword, change in delta.items() if change}
+
+
+# Підготовка таблиць дифів один раз за час роботи процесу
+@st.cache_resource(show_spinner=False)
+def create_content_diffs_table_once(_conn):
+    create_content_diffs_table_if_not_exists(_conn)
+    return True
+
+
+# Функція для отримання останнього знімка кожної сторінки перед заданою датою одним запитом.
+# first_snapshots — словник {url: date_checked}; повертає {url: (date_checked, content, keywords_found)}.
+def _get_previous_snapshots(conn, competitor_name, first_snapshots):
+    if not first_snapshots:
+        return {}
+    cursor = conn.cursor()
+    cursor.execute(f'''
+        SELECT s.url, p.date_checked, p.content, p.content_hash, p.keywords_found
+        FROM unnest(%s::text[], %s::timestamp[]) AS s(url, date_checked)
+        CROSS JOIN LATERAL (
+            SELECT date_checked, content, content_hash, keywords_found
+            FROM {competitor_name}
+            WHERE url = s.url AND date_checked < s.date_checked
+            ORDER BY date_checked DESC
+            LIMIT 1
+        ) p
+    ''', (list(first_snapshots), list(first_snapshots.values())))
+    rows = cursor.fetchall()
+    cursor.close()
+    # Контент, винесений у snapshot_bodies, читається одним запитом за хешами
+    bodies = get_snapshot_bodies(conn, [content_hash for _, _, content, content_hash, _ in rows if content is None])
+    return {
+        url: (date_checked, content if content is not None else bodies.get(content_hash), keywords_found)
+        for url, date_checked, content, content_hash, keywords_found in rows
+    }
+
+
+# Функція для обробки однієї порції знімків конкурента: для кожного знімка рахується диф з попереднім знімком
+# тієї самої сторінки. Порція береться після збереженої позиції (date_checked, url), тож обробка продовжується
+# з місця зупинки. Повертає кількість оброблених знімків (0 — якщо нових знімків немає).
+def store_content_diffs_batch(conn, competitor_name, batch_size=DIFF_BATCH_SIZE):
+    cursor = conn.cursor()
+    cursor.execute(
+        'SELECT last_date_checked, last_url FROM content_diff_progress WHERE competitor = %s',
+        (competitor_name,)
+    )
+    progress = cursor.fetchone()
+
+    if progress:
+        query = f"""
+            SELECT url, date_checked, content, content_hash, keywords_found
+            FROM {competitor_name}
+            WHERE (date_checked, url) > (%s, %s)
+            ORDER BY date_checked, url
+            LIMIT %s
+        """
+        params = [progress[0], progress[1], batch_size]
+    else:
+        query = f"""
+            SELECT url, date_checked, content, content_hash, keywords_found
+            FROM {competitor_name}
+            ORDER BY date_checked, url
+            LIMIT %s
+        """
+        params = [batch_size]
+    snapshots = pd.read_sql(query, conn, params=params)
+
+    if snapshots.empty:
+        cursor.close()
+        return 0
+
+    snapshots = resolve_snapshot_contents(conn, snapshots)
+    snapshots['date_checked'] = pd.to_datetime(snapshots['date_checked'])
+    first_snapshots = snapshots.drop_duplicates('url')
+    previous = _get_previous_snapshots(conn, competitor_name, {
+        url: date_checked.to_pydatetime() for url, date_checked in zip(first_snapshots['url'], first_snapshots['date_checked'])
+    })
+
+    rows = []
+    for url, date_checked, content, keywords_found in snapshots.itertuples(index=False):
+        date_checked = date_checked.to_pydatetime()
+        if url in previous:
+            date_before, content_before, keywords_before = previous[url]
+            diff = build_content_diff(content_before, content)
+            rows.append((competitor_name, url, date_before, date_checked, diff['added'], diff['removed'],
+                         diff['coarse'], json.dumps(diff['hunks']),
+                         json.dumps(get_keywords_delta(keywords_before, keywords_found))))
+        previous[url] = (date_checked, content, keywords_found)
+
+    if rows:
+        execute_values(cursor, '''
+            INSERT INTO content_diffs (competitor, url, date_before, date_after, added, removed, coarse, hunks,
+                                       keywords_delta)
+            VALUES %s
+            ON CONFLICT (competitor, url, date_after) DO UPDATE
+            SET date_before = EXCLUDED.date_before, added = EXCLUDED.added, removed = EXCLUDED.removed,
+                coarse = EXCLUDED.coarse, hunks = EXCLUDED.hunks, keywords_delta = EXCLUDED.keywords_delta
+        ''', rows)
+
+    last_snapshot = snapshots.iloc[-1]
+    cursor.execute('''
+        INSERT INTO content_diff_progress (competitor, last_date_checked, last_url)
+        VALUES (%s, %s, %s)
+        ON CONFLICT (competitor) DO UPDATE
+        SET last_date_checked = EXCLUDED.last_date_checked, last_url = EXCLUDED.last_url
+    ''', (competitor_name, last_snapshot['date_checked'].to_pydatetime(), last_snapshot['url']))
+
+    # Кожна порція комітиться разом зі своєю позицією
+    conn.commit()
+    cursor.close()
+    return len(snapshots)
+
+
+# Функція для повного (або інкрементального) розрахунку дифів одного конкурента — лише для CLI та воркера:
+# вона змінює таблицю краулера (колонка content_hash, індекси CONCURRENTLY) і читає весь контент знімків.
+# max_batches обмежує кількість порцій за один виклик (None — до кінця). Повертає кількість оброблених знімків.
+def store_content_diffs(conn, competitor_name, batch_size=DIFF_BATCH_SIZE, max_batches=None):
+    create_content_diffs_table_once(conn)
+    ensure_content_hash_column(conn, competitor_name)
+    # Індекси для посторінкового читання знімків і пошуку попереднього знімка сторінки
+    create_index_concurrently(conn, f'idx_{competitor_name}_date_url', competitor_name, 'date_checked, url')
+    create_index_concurrently(conn, f'idx_{competitor_name}_url_date', competitor_name, 'url, date_checked')
+
+    total = 0
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        processed = store_content_diffs_batch(conn, competitor_name, batch_size)
+        if not processed:
+            break
+        total += processed
+        batches += 1
+    return total
+
+
+# Функція для обернення дифу (порівняння "стало" -> "було")
+def invert_diff(diff):
+    swap = {'-': '+', '+': '-', ' ': ' '}
+    hunks = []
+    for hunk in diff['hunks']:
+        # Після обернення видалені рядки кожного блоку змін мають іти перед доданими
+        lines = []
+        block = []
+        for mark, text in hunk['lines']:
+            if mark == ' ':
+                lines.extend(sorted(block, key=lambda line: line[0] != '-'))
+                block = []
+                lines.append([mark, text])
+            else:
+                block.append([swap[mark], text])
+        lines.extend(sorted(block, key=lambda line: line[0] != '-'))
+        hunks.append({
+            'before_start': hunk['after_start'],
+            'before_count': hunk['after_count'],
+            'after_start': hunk['before_start'],
+            'after_count': hunk['before_count'],
+            'lines': lines,
+        })
+    return {'added': diff['removed'], 'removed': diff['added'], 'coarse': diff['coarse'], 'hunks': hunks}
+
+
+# Функція для отримання дифу між двома знімками сторінки зі збережених дифів сусідніх знімків.
+# Сторінка лише читає content_diffs: дифи рахують CLI та воркер (store_content_diffs).
+# Пару вдається скласти, якщо між датами контент змінювався не більше одного разу (інші кроки — лише зміни
+# метаданих чи ключових слів; грубе зведення вважається зміною контенту). Якщо дати переставлені, диф обертається.
+# Повертає словник як у content_diff.build_content_diff або None, якщо пару не можна скласти зі збережених дифів
+# (зокрема, якщо дифи для нових знімків ще не пораховано) і її потрібно порахувати з контенту.
+def get_stored_diff(conn, competitor_name, url, date_first, date_second):
+    create_content_diffs_table_once(conn)
+    date_before, date_after = sorted([pd.to_datetime(date_first), pd.to_datetime(date_second)])
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT date_before, date_after, added, removed, coarse, hunks
+        FROM content_diffs
+        WHERE competitor = %s AND url = %s AND date_after > %s AND date_after <= %s
+        ORDER BY date_after
+    ''', (competitor_name, url, date_before.to_pydatetime(), date_after.to_pydatetime()))
+    steps = cursor.fetchall()
+    cursor.close()
+
+    # Ланцюжок має покривати весь проміжок
+    if not steps or steps[0][0] != date_before or steps[-1][1] != date_after:
+        return None
+    content_steps = [step for step in steps if step[2] or step[3] or step[4]]
+    if len(content_steps) > 1:
+        return None
+
+    if content_steps:
+        _, _, added, removed, coarse, hunks = content_steps[0]
+        diff = {'added': added, 'removed': removed, 'coarse': coarse, 'hunks': hunks}
+    else:
+        diff = {'added': 0, 'removed': 0, 'coarse': False, 'hunks': []}
+    return diff if pd.to_datetime(date_first) <= pd.to_datetime(date_second) else invert_diff(diff)
+
+
+# Розрахунок дифів з командного рядка: python snapshot_diffs.py [таблиця_конкурента ...]
+def main():
+    with db_connection() as conn:
+        if conn is None:
+            sys.exit(1)
+        competitors = sys.argv[1:] or get_competitor_tables(conn)
+        for competitor_name in competitors:
+            processed = store_content_diffs(conn, competitor_name)
+            print(f"{competitor_name}: оброблено {processed} знімків")
+
+
+if __name__ == "__main__":
+    main()
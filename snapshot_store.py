@@ -0,0 +1,262 @@
+import argparse
+import hashlib
+import zlib
+
+import pandas as pd
+from psycopg2.extras import execute_values
+
+from db_pool import create_index_concurrently, db_connection
+from keyword_store import get_competitor_tables
+
+try:
+    import zstandard
+except ImportError:
+    # zstd необов'язковий: без пакета zstandard тіла сторінок стискаються zlib
+    zstandard = None
+
+# Скільки знімків конкурента переводиться на збережені за хешем тіла за один крок міграції
+DEDUP_BATCH_SIZE = 500
+# Знімки, які ще не переведено на тіла за хешем (на цю умову будується частковий індекс)
+PENDING_SNAPSHOT_FILTER = 'content IS NOT NULL AND content_hash IS NULL'
+ZSTD_LEVEL = 10
+ZLIB_LEVEL = 9
+
+
+# Функція для створення таблиці тіл сторінок, що зберігаються один раз для кожного хешу контенту
+def create_snapshot_bodies_table_if_not_exists(conn):
+    cursor = conn.cursor()
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS snapshot_bodies (
+            hash TEXT PRIMARY KEY,
+            encoding TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            body BYTEA NOT NULL
+        );
+    ''')
+    conn.commit()
+    cursor.close()
+
+
+# Функція для перевірки, чи таблиця конкурента вже має колонку content_hash (схема не змінюється)
+def has_content_hash_column(conn, competitor_name):
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT EXISTS (
+            SELECT 1 FROM information_schema.columns
+            WHERE table_schema = current_schema() AND table_name = %s AND column_name = 'content_hash'
+        )
+    ''', (competitor_name,))
+    exists = cursor.fetchone()[0]
+    cursor.close()
+    return exists
+
+
+# Функція для підготовки таблиці конкурента до зберігання контенту за хешем (колонка content_hash) —
+# лише для CLI та воркера: ALTER TABLE блокує таблицю краулера, тому виконується, тільки якщо колонки ще немає.
+# Частковий індекс на ще не переведені знімки дозволяє воркеру знаходити нові знімки без повного сканування.
+def ensure_content_hash_column(conn, competitor_name):
+    create_snapshot_bodies_table_if_not_exists(conn)
+    if not has_content_hash_column(conn, competitor_name):
+        cursor = conn.cursor()
+        cursor.execute(f'ALTER TABLE {competitor_name} ADD COLUMN IF NOT EXISTS content_hash TEXT')
+        conn.commit()
+        cursor.close()
+    create_index_concurrently(conn, f'idx_{competitor_name}_pending_bodies', competitor_name, 'date_checked, url',
+                              where=PENDING_SNAPSHOT_FILTER)
+
+
+# Функція для обчислення хешу контенту сторінки
+def get_content_hash(content):
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+
+# Функція для стиснення тіла сторінки: zstd, якщо встановлено, інакше zlib. Повертає (кодування, байти).
+def compress_body(content):
+    data = content.encode('utf-8')
+    if zstandard is not None:
+        return 'zstd', zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    return 'zlib', zlib.compress(data, ZLIB_LEVEL)
+
+
+# Функція для розпакування тіла сторінки
+def decompress_body(encoding, body):
+    body = bytes(body)
+    if encoding == 'zstd':
+        if zstandard is None:
+            raise RuntimeError("Для читання тіл сторінок, стиснених zstd, потрібен пакет zstandard")
+        return zstandard.ZstdDecompressor().decompress(body).decode('utf-8')
+    return zlib.decompress(body).decode('utf-8')
+
+
+# Функція для збереження тіл сторінок (кожне унікальне тіло — один раз). Повертає {контент: хеш}.
+def save_snapshot_bodies(cursor, contents):
+    hashes = {}
+    rows = []
+    for content in contents:
+        if content in hashes:
+            continue
+        hashes[content] = get_content_hash(content)
+        encoding, body = compress_body(content)
+        rows.append((hashes[content], encoding, len(content), body))
+    if rows:
+        execute_values(cursor, '''
+            INSERT INTO snapshot_bodies (hash, encoding, size, body)
+            VALUES %s
+            ON CONFLICT (hash) DO NOTHING
+        ''', rows)
+    return hashes
+
+
+# Функція для отримання тіл сторінок за хешами одним запитом; повертає {хеш: контент}
+def get_snapshot_bodies(conn, hashes):
+    hashes = list(dict.fromkeys(hashes))
+    if not hashes:
+        return {}
+    cursor = conn.cursor()
+    cursor.execute('SELECT hash, encoding, body FROM snapshot_bodies WHERE hash = ANY(%s)', (hashes,))
+    bodies = {content_hash: decompress_body(encoding, body) for content_hash, encoding, body in cursor.fetchall()}
+    cursor.close()
+    return bodies
+
+
+# Функція для заповнення колонки content знімків, контент яких винесено в snapshot_bodies.
+# snapshots — DataFrame з колонками content і content_hash; колонка content_hash прибирається з результату.
+def resolve_snapshot_contents(conn, snapshots):
+    missing = snapshots['content'].isna() & snapshots['content_hash'].notna()
+    if missing.any():
+        bodies = get_snapshot_bodies(conn, snapshots.loc[missing, 'content_hash'].tolist())
+        snapshots.loc[missing, 'content'] = snapshots.loc[missing, 'content_hash'].map(bodies)
+    return snapshots.drop(columns=['content_hash'])
+
+
+# Функція для отримання контенту одного знімка сторінки на вимогу; повертає None, якщо знімка немає.
+# Сторінка схему не змінює: якщо міграцію для таблиці ще не запускали, контент читається з колонки content.
+def get_snapshot_content(conn, competitor_name, url, date_checked):
+    hash_column = 'content_hash' if has_content_hash_column(conn, competitor_name) else 'NULL'
+    cursor = conn.cursor()
+    cursor.execute(f'SELECT content, {hash_column} FROM {competitor_name} WHERE url = %s AND date_checked = %s',
+                   (url, date_checked))
+    snapshot = cursor.fetchone()
+    cursor.close()
+    if snapshot is None:
+        return None
+    content, content_hash = snapshot
+    if content is None and content_hash:
+        content = get_snapshot_bodies(conn, [content_hash]).get(content_hash)
+    return content
+
+
+# Функція для переведення однієї порції знімків конкурента на тіла, збережені за хешем.
+# after — позиція (date_checked, url), після якої береться порція; drop_content очищає колонку content.
+# include_kept — обробити також знімки, уже переведені на хеш без очищення content (повний прохід без індексу).
+# Таблиці краулера можуть містити кілька рядків з однаковими (url, date_checked), тому порція складається
+# з цілих груп таких рядків, а кожен рядок оновлюється за своїм ctid хешем власного контенту.
+# Повертає (кількість оброблених знімків, позиція останнього знімка).
+def dedup_snapshot_contents_batch(conn, competitor_name, after=None, batch_size=DEDUP_BATCH_SIZE,
+                                  drop_content=False, include_kept=False):
+    pending = 'content IS NOT NULL' if include_kept else PENDING_SNAPSHOT_FILTER
+    row_pending = 't.content IS NOT NULL' if include_kept else 't.content IS NOT NULL AND t.content_hash IS NULL'
+    params = []
+    keyset = ''
+    if after is not None:
+        keyset = " AND (date_checked, url) > (%s, %s)"
+        params.extend(after)
+    params.append(batch_size)
+    query = f"""
+        WITH batch AS (
+            SELECT DISTINCT date_checked, url
+            FROM {competitor_name}
+            WHERE {pending}{keyset}
+            ORDER BY date_checked, url
+            LIMIT %s
+        )
+        SELECT t.ctid::text, t.url, t.date_checked, t.content
+        FROM {competitor_name} AS t
+        JOIN batch USING (date_checked, url)
+        WHERE {row_pending}
+        ORDER BY t.date_checked, t.url
+    """
+
+    cursor = conn.cursor()
+    cursor.execute(query, params)
+    snapshots = cursor.fetchall()
+    if not snapshots:
+        cursor.close()
+        return 0, after
+
+    hashes = save_snapshot_bodies(cursor, [content for _, _, _, content in snapshots])
+    verified = set()
+    if drop_content:
+        # Контент очищається лише там, де збережене тіло читається назад без розбіжностей
+        bodies = get_snapshot_bodies(conn, hashes.values())
+        verified = {content for content, content_hash in hashes.items() if bodies.get(content_hash) == content}
+    content_update = ', content = CASE WHEN v.verified THEN NULL ELSE t.content END' if drop_content else ''
+    # Порція читається й оновлюється в одній транзакції, тож ctid вказують саме на прочитані рядки;
+    # рядок, який краулер встиг змінити, просто залишиться для наступного запуску
+    execute_values(cursor, f'''
+        UPDATE {competitor_name} AS t
+        SET content_hash = v.content_hash{content_update}
+        FROM (VALUES %s) AS v(row_id, url, date_checked, content_hash, verified)
+        WHERE t.url = v.url AND t.date_checked = v.date_checked AND t.ctid = v.row_id::tid
+    ''', [(row_id, url, date_checked, hashes[content], content in verified)
+          for row_id, url, date_checked, content in snapshots])
+
+    # Кожна порція комітиться окремо, тож перервану міграцію можна просто запустити знову
+    conn.commit()
+    cursor.close()
+    return len(snapshots), (snapshots[-1][2], snapshots[-1][1])
+
+
+# Функція для переведення знімків конкурента на тіла, збережені за хешем (повторний запуск обробляє лише нові
+# знімки, знайдені за частковим індексом) — для CLI та воркера. Місце звільняється лише з drop_content:
+# без нього контент лишається і в таблиці краулера. Воркер запускає міграцію з drop_content при кожному проході.
+# max_batches обмежує кількість порцій за один виклик (None — до кінця). Повертає кількість оброблених знімків.
+def dedup_snapshot_contents(conn, competitor_name, batch_size=DEDUP_BATCH_SIZE, drop_content=False,
+                            max_batches=None, include_kept=False):
+    ensure_content_hash_column(conn, competitor_name)
+    create_index_concurrently(conn, f'idx_{competitor_name}_date_url', competitor_name, 'date_checked, url')
+    total = 0
+    batches = 0
+    after = None
+    while max_batches is None or batches < max_batches:
+        processed, after = dedup_snapshot_contents_batch(conn, competitor_name, after, batch_size, drop_content,
+                                                         include_kept)
+        if not processed:
+            break
+        total += processed
+        batches += 1
+    return total
+
+
+# Функція для отримання статистики зберігання: скільки знімків і скільки унікальних тіл у конкурента
+def get_dedup_stats(conn, competitor_name):
+    query = f"""
+        SELECT COUNT(*) AS snapshots, COUNT(DISTINCT content_hash) AS unique_bodies
+        FROM {competitor_name}
+    """
+    return pd.read_sql(query, conn).iloc[0].to_dict()
+
+
+# Міграція з командного рядка: python snapshot_store.py [--drop-content] [таблиця_конкурента ...]
+# З --drop-content повний прохід очищає content і в знімках, раніше переведених на хеш без очищення.
+def main():
+    parser = argparse.ArgumentParser(description="Перенесення контенту знімків конкурентів у snapshot_bodies")
+    parser.add_argument('competitors', nargs='*', help="таблиці конкурентів (за замовчуванням усі *_com)")
+    parser.add_argument('--drop-content', action='store_true',
+                        help="очистити колонку content після перенесення; без цього прапорця міграція лише "
+                             "додає хеші й тіла і місця не звільняє (місце повторно використовується після VACUUM)")
+    args = parser.parse_args()
+
+    with db_connection() as conn:
+        if conn is None:
+            raise SystemExit(1)
+        for competitor_name in args.competitors or get_competitor_tables(conn):
+            processed = dedup_snapshot_contents(conn, competitor_name, drop_content=args.drop_content,
+                                                include_kept=args.drop_content)
+            stats = get_dedup_stats(conn, competitor_name)
+            print(f"{competitor_name}: оброблено {processed} знімків, "
+                  f"унікальних тіл {stats['unique_bodies']} із {stats['snapshots']} знімків")
+
+
+if __name__ == "__main__":
+    main()
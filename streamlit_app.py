@@ -1,28 +1,15 @@
 import streamlit as st
 import altair as alt
-import psycopg2
 import pandas as pd
 import re
 from datetime import datetime
+from db_pool import db_connection
+from snapshot_store import get_snapshot_content
 
-# Функція для підключення до бази даних PostgreSQL
-def connect_to_db():
-    try:
-        connection = psycopg2.connect(
-            host="localhost",
-            database="competitor_content",
-            user="kostia.s920",
-            password="1502"
-        )
-        return connection
-    except Exception as e:
-        st.error(f"Error connecting to database: {e}")
-        return None
-
-# Функція для отримання даних по ключовим словам із бази даних
+# Функція для отримання даних по ключовим словам із бази даних (контент — через get_snapshot_content)
 def get_keyword_data(conn, competitor_name):
     query = f"""
-        SELECT url, keywords_count, keywords_found, content, date_checked 
+        SELECT url, keywords_count, keywords_found, date_checked 
         FROM {competitor_name}_temp
         ORDER BY date_checked ASC
     """
@@ -194,151 +181,153 @@ def render_contribution_chart_by_months(change_dates, selected_year):
 
 # Основна функція для відображення даних у Streamlit
 def main():
-    # Підключаємося до бази даних
-    conn = connect_to_db()
-
-    if conn:
-        st.title("Аналіз Конкурентів")
-
-        # Візуалізація змін контенту
-        with st.expander("Візуалізація змін контенту", expanded=False):
-            st.subheader('Візуалізація змін контенту для конкурентів')
-            competitor = st.selectbox("Виберіть конкурента",
-                                      ['docebo_com', 'ispringsolutions_com', 'talentlms_com', 'paradisosolutions_com',
-                                       'academyocean_com'],
-                                      key="content_competitor_selectbox")
-
-            # Перевіряємо, чи вибраний чекбокс
-            view_all = st.checkbox("Показати всі зміни конкурента", key="content_view_all_checkbox")
-
-            # Якщо вибрано чекбокс, показуємо всі зміни конкурента
-            if view_all:
-                query = f"SELECT change_date FROM content_changes WHERE competitor_name = '{competitor}'"
-                df = pd.read_sql(query, conn)
-
-                if not df.empty:
-                    # Додаємо selectbox для вибору року
-                    selected_year = st.selectbox("Оберіть рік", [2024, 2025], key="year_selectbox")
-                    st.subheader(f"Загальні зміни для {competitor} у {selected_year} році")
-                    render_contribution_chart_by_months(df, selected_year)
-                else:
-                    st.write("Немає змін для цього конкурента.")
-            else:
-                # Якщо чекбокс не вибраний, показуємо лише список сторінок
-                page_query = f"SELECT DISTINCT url FROM content_changes WHERE competitor_name = '{competitor}'"
-                pages = pd.read_sql(page_query, conn)['url'].tolist()
-
-                if not pages:
-                    st.write("Немає доступних сторінок для цього конкурента.")
-                else:
-                    page = st.selectbox("Виберіть сторінку", pages, key="content_page_selectbox")
-
-                    query = f"SELECT change_date FROM content_changes WHERE competitor_name = '{competitor}' AND url = '{page}'"
+    # Підключаємося до бази даних (з'єднання береться з пулу і повертається після рендерингу)
+    with db_connection() as conn:
+        if conn:
+            st.title("Аналіз Конкурентів")
+
+            # Візуалізація змін контенту
+            with st.expander("Візуалізація змін контенту", expanded=False):
+                st.subheader('Візуалізація змін контенту для конкурентів')
+                competitor = st.selectbox("Виберіть конкурента",
+                                          ['docebo_com', 'ispringsolutions_com', 'talentlms_com', 'paradisosolutions_com',
+                                           'academyocean_com'],
+                                          key="content_competitor_selectbox")
+
+                # Перевіряємо, чи вибраний чекбокс
+                view_all = st.checkbox("Показати всі зміни конкурента", key="content_view_all_checkbox")
+
+                # Якщо вибрано чекбокс, показуємо всі зміни конкурента
+                if view_all:
+                    query = f"SELECT change_date FROM content_changes WHERE competitor_name = '{competitor}'"
                     df = pd.read_sql(query, conn)
 
                     if not df.empty:
-                        # Додаємо selectbox для вибору року після вибору сторінки
+                        # Додаємо selectbox для вибору року
                         selected_year = st.selectbox("Оберіть рік", [2024, 2025], key="year_selectbox")
-                        st.markdown(
-                            f"<p style='font-size:12px;color:gray;'>Зміни для сторінки: {page} у {selected_year} році</p>",
-                            unsafe_allow_html=True)
+                        st.subheader(f"Загальні зміни для {competitor} у {selected_year} році")
                         render_contribution_chart_by_months(df, selected_year)
                     else:
-                        st.markdown("<p style='font-size:10px;color:gray;'>Немає змін для цієї сторінки.</p>",
-                                    unsafe_allow_html=True)
+                        st.write("Немає змін для цього конкурента.")
+                else:
+                    # Якщо чекбокс не вибраний, показуємо лише список сторінок
+                    page_query = f"SELECT DISTINCT url FROM content_changes WHERE competitor_name = '{competitor}'"
+                    pages = pd.read_sql(page_query, conn)['url'].tolist()
 
-        # Keyword Count and Historical Analysis
-        st.subheader('Аналіз Загальної кількості ключових слів конкурента')
-
-        competitors = ['docebo_com', 'ispringsolutions_com', 'talentlms_com', 'paradisosolutions_com',
-                       'academyocean_com']
-        competitor_name = st.selectbox("Виберіть конкурента", competitors, key="keyword_competitor_selectbox")
-        df = get_keyword_data(conn, competitor_name)
-
-        if not df.empty:
-            selected_urls = st.multiselect('Виберіть URL', df['url'].unique(), max_selections=5,
-                                           key="keyword_url_multiselect")
-
-            # Фільтр по датах
-            start_date = pd.to_datetime(
-                st.date_input('Початкова дата', df['date_checked'].min(), key="keyword_start_date")).date()
-            end_date = pd.to_datetime(
-                st.date_input('Кінцева дата', df['date_checked'].max(), key="keyword_end_date")).date()
-            df['date_checked'] = pd.to_datetime(df['date_checked']).dt.date
-            df = df[(df['date_checked'] >= start_date) & (df['date_checked'] <= end_date)]
-
-            if selected_urls:
-                df = df[df['url'].isin(selected_urls)]
-
-                st.subheader(f'Тренд кількості ключових слів для {competitor_name}')
-                plot_keyword_trend(df, competitor_name)
-
-                selected_url_for_keywords = st.selectbox('Виберіть URL для перегляду знайдених ключових слів',
-                                                         df['url'].unique(), key="keyword_url_selectbox")
-
-                if selected_url_for_keywords:
-                    selected_page_data = df[df['url'] == selected_url_for_keywords].iloc[0]
-                    if selected_page_data['keywords_found'] and isinstance(selected_page_data['keywords_found'], str):
-                        keywords_dict = extract_keywords(selected_page_data['keywords_found'])
-
-                        st.write(f"Знайдені ключові слова на {selected_url_for_keywords}:")
-                        st.write(keywords_dict)
-
-                        selected_keywords = st.multiselect('Виберіть ключові слова для аналізу історії',
-                                                           list(keywords_dict.keys()), key="keyword_select_multiselect")
-
-                        if selected_keywords:
-                            for keyword in selected_keywords:
-                                st.subheader(f'Історія для ключового слова: {keyword}')
-                                keyword_history_df = get_keyword_history(conn, competitor_name, keyword)
-                                if not keyword_history_df.empty:
-                                    plot_keyword_history(keyword_history_df, keyword, selected_url_for_keywords)
-                                else:
-                                    st.write(f"Немає даних для ключового слова: {keyword}")
-
-        # Порівняння конкурентів
-        with st.expander("Порівняння ключових слів між конкурентами", expanded=False):
-            st.subheader('Порівняння ключових слів між конкурентами')
-            selected_competitors = st.multiselect("Виберіть конкурентів для порівняння", competitors,
-                                                  default=competitors[:2], key="comparison_competitors_multiselect")
-            df_list = [get_keyword_data(conn, competitor) for competitor in selected_competitors]
-
-            selected_urls_for_comparison = []
-            for competitor, df in zip(selected_competitors, df_list):
-                selected_url = st.selectbox(f'Виберіть URL для {competitor}', df['url'].unique(),
-                                            key=f"comparison_url_selectbox_{competitor}")
-                selected_urls_for_comparison.append(selected_url)
-
-            if len(selected_urls_for_comparison) == len(selected_competitors):
-                plot_comparison(df_list, selected_competitors, selected_urls_for_comparison)
-
-        st.markdown("<hr>", unsafe_allow_html=True)
-
-        # Контент сторінки
-        with st.expander("Контент сторінки з підсвіченими ключовими словами", expanded=False):
-            st.subheader('Контент сторінки з підсвіченими ключовими словами')
-            competitor_name_content = st.selectbox("Виберіть конкурента для перегляду контенту", competitors,
-                                                   key="content_competitor_selectbox_2")
-            df_content = get_keyword_data(conn, competitor_name_content)
-
-            if not df_content.empty:
-                selected_url_for_content = st.selectbox('Виберіть URL для перегляду контенту',
-                                                        df_content['url'].unique(), key="content_url_selectbox_2")
-                selected_date_for_content = st.selectbox('Виберіть дату',
-                                                         df_content[df_content['url'] == selected_url_for_content][
-                                                             'date_checked'].dt.date.unique(),
-                                                         key="content_date_selectbox")
-
-                if selected_date_for_content:
-                    page_content_data = df_content[(df_content['url'] == selected_url_for_content) & (
-                                df_content['date_checked'].dt.date == selected_date_for_content)]
-                    page_content = page_content_data['content'].values[0]
-                    keywords_found = page_content_data['keywords_found'].values[0]
-                    keywords_dict = extract_keywords(keywords_found)
-                    highlighted_content = highlight_keywords(page_content, list(keywords_dict.keys()))
-
-                    st.markdown(f"<div style='white-space: pre-wrap; padding: 15px;'>{highlighted_content}</div>",
+                    if not pages:
+                        st.write("Немає доступних сторінок для цього конкурента.")
+                    else:
+                        page = st.selectbox("Виберіть сторінку", pages, key="content_page_selectbox")
+
+                        query = f"SELECT change_date FROM content_changes WHERE competitor_name = '{competitor}' AND url = '{page}'"
+                        df = pd.read_sql(query, conn)
+
+                        if not df.empty:
+                            # Додаємо selectbox для вибору року після вибору сторінки
+                            selected_year = st.selectbox("Оберіть рік", [2024, 2025], key="year_selectbox")
+                            st.markdown(
+                                f"<p style='font-size:12px;color:gray;'>Зміни для сторінки: {page} у {selected_year} році</p>",
                                 unsafe_allow_html=True)
+                            render_contribution_chart_by_months(df, selected_year)
+                        else:
+                            st.markdown("<p style='font-size:10px;color:gray;'>Немає змін для цієї сторінки.</p>",
+                                        unsafe_allow_html=True)
+
+            # Keyword Count and Historical Analysis
+            st.subheader('Аналіз Загальної кількості ключових слів конкурента')
+
+            competitors = ['docebo_com', 'ispringsolutions_com', 'talentlms_com', 'paradisosolutions_com',
+                           'academyocean_com']
+            competitor_name = st.selectbox("Виберіть конкурента", competitors, key="keyword_competitor_selectbox")
+            df = get_keyword_data(conn, competitor_name)
+
+            if not df.empty:
+                selected_urls = st.multiselect('Виберіть URL', df['url'].unique(), max_selections=5,
+                                               key="keyword_url_multiselect")
+
+                # Фільтр по датах
+                start_date = pd.to_datetime(
+                    st.date_input('Початкова дата', df['date_checked'].min(), key="keyword_start_date")).date()
+                end_date = pd.to_datetime(
+                    st.date_input('Кінцева дата', df['date_checked'].max(), key="keyword_end_date")).date()
+                df['date_checked'] = pd.to_datetime(df['date_checked']).dt.date
+                df = df[(df['date_checked'] >= start_date) & (df['date_checked'] <= end_date)]
+
+                if selected_urls:
+                    df = df[df['url'].isin(selected_urls)]
+
+                    st.subheader(f'Тренд кількості ключових слів для {competitor_name}')
+                    plot_keyword_trend(df, competitor_name)
+
+                    selected_url_for_keywords = st.selectbox('Виберіть URL для перегляду знайдених ключових слів',
+                                                             df['url'].unique(), key="keyword_url_selectbox")
+
+                    if selected_url_for_keywords:
+                        selected_page_data = df[df['url'] == selected_url_for_keywords].iloc[0]
+                        if selected_page_data['keywords_found'] and isinstance(selected_page_data['keywords_found'], str):
+                            keywords_dict = extract_keywords(selected_page_data['keywords_found'])
+
+                            st.write(f"Знайдені ключові слова на {selected_url_for_keywords}:")
+                            st.write(keywords_dict)
+
+                            selected_keywords = st.multiselect('Виберіть ключові слова для аналізу історії',
+                                                               list(keywords_dict.keys()), key="keyword_select_multiselect")
+
+                            if selected_keywords:
+                                for keyword in selected_keywords:
+                                    st.subheader(f'Історія для ключового слова: {keyword}')
+                                    keyword_history_df = get_keyword_history(conn, competitor_name, keyword)
+                                    if not keyword_history_df.empty:
+                                        plot_keyword_history(keyword_history_df, keyword, selected_url_for_keywords)
+                                    else:
+                                        st.write(f"Немає даних для ключового слова: {keyword}")
+
+            # Порівняння конкурентів
+            with st.expander("Порівняння ключових слів між конкурентами", expanded=False):
+                st.subheader('Порівняння ключових слів між конкурентами')
+                selected_competitors = st.multiselect("Виберіть конкурентів для порівняння", competitors,
+                                                      default=competitors[:2], key="comparison_competitors_multiselect")
+                df_list = [get_keyword_data(conn, competitor) for competitor in selected_competitors]
+
+                selected_urls_for_comparison = []
+                for competitor, df in zip(selected_competitors, df_list):
+                    selected_url = st.selectbox(f'Виберіть URL для {competitor}', df['url'].unique(),
+                                                key=f"comparison_url_selectbox_{competitor}")
+                    selected_urls_for_comparison.append(selected_url)
+
+                if len(selected_urls_for_comparison) == len(selected_competitors):
+                    plot_comparison(df_list, selected_competitors, selected_urls_for_comparison)
+
+            st.markdown("<hr>", unsafe_allow_html=True)
+
+            # Контент сторінки
+            with st.expander("Контент сторінки з підсвіченими ключовими словами", expanded=False):
+                st.subheader('Контент сторінки з підсвіченими ключовими словами')
+                competitor_name_content = st.selectbox("Виберіть конкурента для перегляду контенту", competitors,
+                                                       key="content_competitor_selectbox_2")
+                df_content = get_keyword_data(conn, competitor_name_content)
+
+                if not df_content.empty:
+                    selected_url_for_content = st.selectbox('Виберіть URL для перегляду контенту',
+                                                            df_content['url'].unique(), key="content_url_selectbox_2")
+                    selected_date_for_content = st.selectbox('Виберіть дату',
+                                                             df_content[df_content['url'] == selected_url_for_content][
+                                                                 'date_checked'].dt.date.unique(),
+                                                             key="content_date_selectbox")
+
+                    if selected_date_for_content:
+                        page_content_data = df_content[(df_content['url'] == selected_url_for_content) & (
+                                    df_content['date_checked'].dt.date == selected_date_for_content)]
+                        # Контент одного знімка читається на вимогу: після міграції він може бути в snapshot_bodies
+                        page_content = get_snapshot_content(conn, f"{competitor_name_content}_temp",
+                                                            selected_url_for_content,
+                                                            page_content_data['date_checked'].iloc[0].to_pydatetime())
+                        keywords_found = page_content_data['keywords_found'].values[0]
+                        keywords_dict = extract_keywords(keywords_found)
+                        highlighted_content = highlight_keywords(page_content, list(keywords_dict.keys()))
+
+                        st.markdown(f"<div style='white-space: pre-wrap; padding: 15px;'>{highlighted_content}</div>",
+                                    unsafe_allow_html=True)
 
 
 
@@ -1,53 +1,39 @@
-import tempfile
-import base64
 import plotly.graph_objects as go
 import re
 import streamlit as st
-import psycopg2
 import pandas as pd
 from datetime import datetime
-import difflib
 import streamlit.components.v1 as components
 import requests
 from bs4 import BeautifulSoup
 import json
 import logging
-
-# Функція для підключення до бази даних PostgreSQL
-def connect_to_db():
-    try:
-        # Декодуємо сертифікат із Base64
-        ssl_cert_decoded = base64.b64decode(st.secrets["db_ssl_root_cert"])
-
-        # Створюємо тимчасовий файл для зберігання сертифіката
-        with tempfile.NamedTemporaryFile(delete=False) as cert_file:
-            cert_file.write(ssl_cert_decoded)
-            cert_file_path = cert_file.name
-
-        # Підключаємося до бази даних за допомогою секретів
-        connection = psycopg2.connect(
-            host=st.secrets["db_host"],
-            database=st.secrets["db_name"],
-            user=st.secrets["db_username"],
-            password=st.secrets["db_password"],
-            port=st.secrets["db_port"],
-            sslmode=st.secrets["ssl_mode"],
-            sslrootcert=cert_file_path  # Передаємо шлях до тимчасового файлу з сертифікатом
-        )
-        return connection
-    except Exception as e:
-        st.error(f"Error connecting to database: {e}")
-        return None
-
-#Функція для отримання списку конкурентів
-def get_competitors_from_content_changes(conn):
-    query = "SELECT DISTINCT competitor_name FROM content_changes"
-    return pd.read_sql(query, conn)['competitor_name'].tolist()
-
+from db_pool import db_connection
+from search_api import API_DAILY_LIMIT, get_api_usage, perform_cached_search
+from page_fetcher import fetch_page_content, fetch_pages_with_progress, get_page_analysis
+from keyword_matcher import build_keyword_matcher, count_keywords
+from keyword_parser import compare_keywords, extract_keywords
+from snapshot_store import get_snapshot_content
+from keyword_store import (
+    get_first_keywords_found,
+    get_keyword_counts,
+    get_keywords_history,
+    get_snapshot_date_range,
+    get_snapshot_urls,
+)
+from competitors import get_change_competitors, get_snapshot_competitors
+from content_changes import (
+    get_change_years,
+    get_changed_pages,
+    refresh_change_rollup_if_stale,
+    render_contribution_chart_by_months,
+)
+from content_diff import build_content_diff, render_diff_html
+from snapshot_diffs import get_stored_diff
 
 # Функція для отримання списку URL для обраного конкурента
 def get_pages_for_competitor(conn, competitor_name):
-    query = f"SELECT DISTINCT url FROM {competitor_name}"
+    query = f"SELECT DISTINCT url FROM {competitor_name} ORDER BY url"
     return pd.read_sql(query, conn)['url'].tolist()
 
 
@@ -56,16 +42,16 @@ def get_dates_for_page(conn, competitor_name, page_url):
     query = f"""
         SELECT DISTINCT date_checked
         FROM {competitor_name}
-        WHERE url = '{page_url}'
+        WHERE url = %s
         ORDER BY date_checked ASC
     """
-    return pd.read_sql(query, conn)['date_checked'].tolist()
+    return pd.read_sql(query, conn, params=[page_url])['date_checked'].tolist()
 
 
-# Функція для отримання даних для конкретної сторінки на обрану дату
+# Функція для отримання метаданих конкретної сторінки на обрану дату (контент — через get_snapshot_content)
 def get_page_data(conn, competitor_name, page_url, date):
     query = f"""
-        SELECT title, h1, description, content, keywords_found, keywords_count
+        SELECT title, h1, description, keywords_found, keywords_count
         FROM {competitor_name}
         WHERE url = %s AND date_checked = %s
     """
@@ -117,84 +103,25 @@ def visualize_keywords_changes(keywords_changes):
     st.plotly_chart(fig)
 
 
-# Функція для порівняння контенту і візуалізації змін за допомогою Plotly
-def visualize_content_changes(content_before, content_after):
-
-    # Розбиваємо контент на рядки
-    before_lines = content_before.splitlines()
-    after_lines = content_after.splitlines()
+# Функція для візуалізації змін контенту (компактний HTML зі зміненими фрагментами)
+def visualize_content_diff(content_diff):
 
-    # Створюємо об'єкт HtmlDiff
-    differ = difflib.HtmlDiff(wrapcolumn=50)
-
-    # Генеруємо HTML з підсвіченими змінами
-    diff_html = differ.make_file(before_lines, after_lines, fromdesc='Було', todesc='Стало')
+    # Показуємо лише змінені фрагменти з контекстом
+    diff_html = render_diff_html(content_diff)
 
     # Відображаємо HTML у Streamlit
     st.subheader("Порівняння контенту:")
     components.html(diff_html, height=600,scrolling=True)
 
 
-# Оновлена функція для вилучення ключових слів і кількості їх повторень
-def extract_keywords(row):
-    if pd.isna(row) or not row.strip():
-        return {}
-    entries = row.split(',')
-    keywords_dict = {}
-    for entry in entries:
-        entry = entry.strip()
-        match = re.match(r'^\s*(?P<keyword>.*?)\s*-\s*(?P<count>\d+)\s*разів', entry)
-        if match:
-            keyword = match.group('keyword').strip().lower()
-            count = int(match.group('count'))
-            if keyword in keywords_dict:
-                keywords_dict[keyword] += count
-            else:
-                keywords_dict[keyword] = count
-    return keywords_dict
-
-
-# Функція для порівняння keywords_found
-def compare_keywords(old_keywords, new_keywords):
-    old_dict = extract_keywords(old_keywords)
-    new_dict = extract_keywords(new_keywords)
-
-    # Визначаємо додані, видалені і змінені ключові слова
-    added = {k: new_dict[k] for k in new_dict if k not in old_dict}
-    removed = {k: old_dict[k] for k in old_dict if k not in new_dict}
-    changed = {k: (old_dict[k], new_dict[k]) for k in old_dict if k in new_dict and old_dict[k] != new_dict[k]}
-
-    result = []
-    for k, v in added.items():
-        result.append((k, 'Додано', '-', f"{v} разів"))
-    for k, v in removed.items():
-        result.append((k, 'Видалено', f"{v} разів", '-'))
-    for k, (old_v, new_v) in changed.items():
-        result.append((k, 'Змінено', f"{old_v} разів", f"{new_v} разів"))
-
-    return pd.DataFrame(result, columns=['Ключове слово', 'Зміна', 'Було', 'Стало'])
-
-
-# Функція для отримання даних по ключовим словам із бази даних
+# Функція для отримання тренду кількості ключових слів конкурента (без важких колонок content і keywords_found)
 def get_keyword_data(conn, competitor_name):
     query = f"""
-        SELECT url, keywords_count, keywords_found, content, date_checked 
-        FROM {competitor_name}
-        ORDER BY date_checked ASC
-    """
-    df = pd.read_sql(query, conn)
-    return df
-
-# Функція для отримання історичних даних по вибраному ключовому слову
-def get_keyword_history(conn, competitor_name, keyword):
-    query = f"""
-        SELECT url, date_checked, keywords_found
+        SELECT url, keywords_count, date_checked
         FROM {competitor_name}
-        WHERE keywords_found ILIKE %s
         ORDER BY date_checked ASC
     """
-    df = pd.read_sql(query, conn, params=[f'%{keyword}%'])
-    return df
+    return pd.read_sql(query, conn)
 
 # Функція для побудови графіка ключових слів
 def plot_keyword_trend(df, competitor_name):
@@ -267,10 +194,8 @@ def plot_keyword_history(df, keyword, selected_url, chart_type):
     # Перетворення дат на datetime
     url_data['date_checked'] = pd.to_datetime(url_data['date_checked'], errors='coerce')
 
-    # Створюємо колонку з кількістю повторень ключового слова
-    url_data['keyword_count'] = url_data['keywords_found'].apply(
-        lambda row: extract_keywords(row).get(keyword.lower(), 0) if pd.notna(row) else 0
-    )
+    # Кількість повторень ключового слова вже нормалізована в keyword_occurrences
+    url_data['keyword_count'] = url_data['count']
 
     # Фільтруємо дані, залишаючи лише ті рядки, де ключове слово присутнє
     url_data = url_data[url_data['keyword_count'] > 0]
@@ -363,132 +288,10 @@ def highlight_keywords(text, keywords):
         text = re.sub(f'({escaped_keyword})', r'<span style="color:red; font-weight:bold;">\1</span>', text, flags=re.IGNORECASE)
     return text
 
-# Функція для рендерингу сітки змін за місяцями
-def render_contribution_chart_by_months(change_dates, selected_year, conn, competitor, selected_page=None):
-    st.markdown(
-        """
-        <style>
-        .contribution-box {
-            width: 12px;
-            height: 12px;
-            margin: 2px;
-            display: inline-block;
-            background-color: #ebedf0;
-        }
-        .contribution-level-1 { background-color: #c6e48b; }
-        .contribution-level-2 { background-color: #7bc96f; }
-        .contribution-level-3 { background-color: #239a3b; }
-        .contribution-level-4 { background-color: #196127; }
-        .contribution-box-container {
-            display: flex;
-            justify-content: space-around;
-            flex-wrap: wrap;
-            max-width: 900px;  /* Обмежуємо ширину */
-        }
-        .month-column {
-            display: grid;
-            grid-template-rows: repeat(7, 14px);  /* 7 днів на рядок */
-            grid-auto-flow: column;  /* Заповнення по колонках */
-            gap: 4px;
-            margin-right: 20px;
-            text-align: center;
-        }
-        .month-title {
-            text-align: center;
-            margin-bottom: 10px;
-            font-weight: bold;
-            font-size: 12px;
-        }
-        </style>
-        """,
-        unsafe_allow_html=True
-    )
-
-    # Фільтруємо дати за обраним роком
-    change_dates['change_date'] = pd.to_datetime(change_dates['change_date']).dt.date
-    change_dates = change_dates[change_dates['change_date'].apply(lambda x: x.year) == selected_year]
-
-    def render_month_labels():
-        months = {
-            'Jan': 31, 'Feb': 28, 'Mar': 31, 'Apr': 30, 'May': 31, 'Jun': 30,
-            'Jul': 31, 'Aug': 31, 'Sep': 30, 'Oct': 31, 'Nov': 30, 'Dec': 31
-        }
-
-        months_html = '<div style="display: flex; flex-wrap: wrap; gap: 20px;">'
-
-        for month, days in months.items():
-            month_html = f'<div style="text-align: center;"><div style="margin-bottom: 5px;">{month}</div>'
-            month_html += f'<div style="display: grid; grid-template-columns: repeat(7, 14px); grid-gap: 2px;">'
-
-            for day in range(1, days + 1):
-                date = datetime(selected_year, list(months.keys()).index(month) + 1, day).date()
-
-                # Змінюємо запит в залежності від того, вибрано конкретну сторінку чи всі зміни конкурента
-                if selected_page:
-                    query = f"""
-                    SELECT change_date 
-                    FROM content_changes 
-                    WHERE competitor_name = '{competitor}'
-                    AND url = '{selected_page}'
-                    AND change_date::date = '{date}'
-                    """
-                    result = pd.read_sql(query, conn)
-                    pages = result['change_date'].tolist() if not result.empty else []
-                else:
-                    query = f"""
-                    SELECT url 
-                    FROM content_changes 
-                    WHERE competitor_name = '{competitor}'
-                    AND change_date::date = '{date}'
-                    """
-                    pages = pd.read_sql(query, conn)['url'].tolist()
-
-                # Визначаємо рівень для відображення кольору
-                if not pages:
-                    level = 'contribution-box'
-                    tooltip = f"{date} - немає змін"
-                else:
-                    if len(pages) <= 1:
-                        level = 'contribution-box contribution-level-1'
-                    elif len(pages) <= 3:
-                        level = 'contribution-box contribution-level-2'
-                    elif len(pages) <= 5:
-                        level = 'contribution-box contribution-level-3'
-                    else:
-                        level = 'contribution-box contribution-level-4'
-
-                    # Формуємо список сторінок для відображення в спливаючому вікні
-                    if selected_page:
-                        tooltip = f"{date} - зміни на цій сторінці"
-                    else:
-                        tooltip = f"{date} - зміни:\n" + "\n".join(pages)
-
-                month_html += f'<div class="{level}" title="{tooltip}"></div>'
-
-            month_html += '</div>'
-            months_html += f'{month_html}</div>'
-
-        months_html += '</div>'
-        return months_html
-
-    # Викликаємо рендеринг місяців
-    st.markdown(render_month_labels(), unsafe_allow_html=True)
-
 # Налаштування сторінки
 st.set_page_config(page_title="Change Tracker", page_icon="🔍")
 
 
-def get_competitors_from_db(conn):
-    query = """
-    SELECT table_name
-    FROM information_schema.tables
-    WHERE table_name LIKE '%_com';
-    """
-
-    # Виконуємо запит і отримуємо список таблиць-конкурентів
-    competitor_tables = pd.read_sql(query, conn)['table_name'].tolist()
-    return competitor_tables
-
 # Новий функціонал пошук в гугл та додавання АРІ ChatGPT
 #
 # Логування для відстеження запитів і відповідей
@@ -534,87 +337,6 @@ def get_keywords_by_tag(connection, tag):
         st.error(f"Помилка при отриманні ключових слів за тегом '{tag}': {e}")
         return []
 
-# Функція для отримання використання API
-def get_api_usage(connection, today_str):
-    try:
-        cursor = connection.cursor()
-        cursor.execute('SELECT count FROM api_usage WHERE date = %s', (today_str,))
-        result = cursor.fetchone()
-        if result:
-            cursor.close()
-            return result[0]
-        else:
-            # Якщо запису немає, створити його з count=0
-            cursor.execute('INSERT INTO api_usage (date, count) VALUES (%s, %s)', (today_str, 0))
-            connection.commit()
-            cursor.close()
-            return 0
-    except Exception as e:
-        st.error(f"Помилка при отриманні використання API: {e}")
-        return 0
-
-# Функція для оновлення використання API
-def update_api_usage(connection, today_str, increment=1):
-    try:
-        cursor = connection.cursor()
-        cursor.execute('SELECT count FROM api_usage WHERE date = %s', (today_str,))
-        result = cursor.fetchone()
-        if result:
-            new_count = result[0] + increment
-            cursor.execute('UPDATE api_usage SET count = %s WHERE date = %s', (new_count, today_str))
-        else:
-            cursor.execute('INSERT INTO api_usage (date, count) VALUES (%s, %s)', (today_str, increment))
-        connection.commit()
-        cursor.close()
-    except Exception as e:
-        st.error(f"Помилка при оновленні використання API: {e}")
-
-# Функція для отримання історії використання API
-def get_api_usage_history(connection):
-    try:
-        cursor = connection.cursor()
-        cursor.execute('SELECT date, count FROM api_usage ORDER BY date ASC')
-        data = cursor.fetchall()
-        cursor.close()
-        return data
-    except Exception as e:
-        st.error(f"Помилка при отриманні історії використання API: {e}")
-        return []
-
-# Функція для виконання пошуку
-def perform_search(query, api_key, cx, region=None):
-    url = "https://www.googleapis.com/customsearch/v1"
-    params = {
-        'q': query,
-        'key': api_key,
-        'cx': cx,
-        'num': 10  # Максимум 10 результатів
-    }
-    if region:
-        params['gl'] = region  # Додавання параметра регіону
-
-    try:
-        response = requests.get(url, params=params)
-        response.raise_for_status()
-        results = response.json()
-        return results.get('items', [])
-    except requests.exceptions.RequestException as e:
-        st.error(f"Помилка при отриманні результатів пошуку: {e}")
-        return []
-
-# Функція для отримання контенту сторінки
-def fetch_page_content(url):
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64)"
-    }
-    try:
-        response = requests.get(url, headers=headers, timeout=10)
-        response.raise_for_status()
-        return response.text
-    except requests.exceptions.RequestException as e:
-        st.warning(f"Не вдалося завантажити сторінку {url}: {e}")
-        return ""
-
 # Функція для аналізу контенту сторінки
 def analyze_page_content(html_content, related_keywords):
     soup = BeautifulSoup(html_content, 'html.parser')
@@ -637,17 +359,14 @@ def analyze_page_content(html_content, related_keywords):
     # Отримання основного тексту сторінки
     body_text = soup.get_text(separator=' ', strip=True)
 
-    # Функція для підрахунку кількості входжень ключових слів
-    def count_occurrences(text, keyword):
-        if not text:
-            return 0
-        return len(re.findall(r'\b' + re.escape(keyword.lower()) + r'\b', text.lower()))
+    # Автомат для групи ключових слів будується один раз і кешується
+    matcher = build_keyword_matcher(tuple(related_keywords))
 
-    # Підрахунок кількості ключових слів у різних секціях
-    counts_title = {kw: count_occurrences(title, kw) for kw in related_keywords if count_occurrences(title, kw) > 0}
-    counts_description = {kw: count_occurrences(meta_description, kw) for kw in related_keywords if count_occurrences(meta_description, kw) > 0}
-    counts_headers = {kw: count_occurrences(headers_text, kw) for kw in related_keywords if count_occurrences(headers_text, kw) > 0}
-    counts_content = {kw: count_occurrences(body_text, kw) for kw in related_keywords if count_occurrences(body_text, kw) > 0}
+    # Підрахунок кількості ключових слів у різних секціях (один прохід по кожній секції)
+    counts_title = count_keywords(matcher, title)
+    counts_description = count_keywords(matcher, meta_description)
+    counts_headers = count_keywords(matcher, headers_text)
+    counts_content = count_keywords(matcher, body_text)
 
     # Підсумкова кількість ключових слів
     total_keyword_count = sum(counts_title.values()) + sum(counts_description.values()) + sum(counts_headers.values()) + sum(counts_content.values())
@@ -854,44 +573,47 @@ def main():
     # Логування для відстеження запитів і відповідей
     logging.basicConfig(filename='api_usage.log', level=logging.INFO)
 
-    # Підключення до бази даних
-    conn = connect_to_db()
-    if conn is None:
-        st.stop()
+    # Підключення до бази даних (з'єднання береться з пулу і повертається після рендерингу)
+    with db_connection() as conn:
+        if conn is None:
+            st.stop()
 
-    # Бічна панель для навігації
-    st.sidebar.title("Навігація")
-    pages = [
-        "Візуалізація змін контенту",
-        "Загальна кількість ключових слів",
-        "Порівняння ключових слів між конкурентами",
-        "Контент сторінки з підсвіченими ключовими словами",
-        "Порівняння контенту",
-        "Google Custom Search Аналізатор"
-    ]
-    page_selection = st.sidebar.radio("Оберіть сторінку", pages)
-
-    # Відображення контенту залежно від вибору сторінки
-    if page_selection == "Візуалізація змін контенту":
-        render_content_change_visualization(conn)
-    elif page_selection == "Загальна кількість ключових слів":
-        render_keyword_count(conn)
-    elif page_selection == "Порівняння ключових слів між конкурентами":
-        render_keyword_comparison(conn)
-    elif page_selection == "Контент сторінки з підсвіченими ключовими словами":
-        render_page_content_with_keywords(conn)
-    elif page_selection == "Порівняння контенту":
-        render_content_comparison(conn)
-    elif page_selection == "Google Custom Search Аналізатор":
-        render_google_custom_search_analyzer(conn)
+        # Бічна панель для навігації
+        st.sidebar.title("Навігація")
+        pages = [
+            "Візуалізація змін контенту",
+            "Загальна кількість ключових слів",
+            "Порівняння ключових слів між конкурентами",
+            "Контент сторінки з підсвіченими ключовими словами",
+            "Порівняння контенту",
+            "Google Custom Search Аналізатор"
+        ]
+        page_selection = st.sidebar.radio("Оберіть сторінку", pages)
+
+        # Відображення контенту залежно від вибору сторінки
+        if page_selection == "Візуалізація змін контенту":
+            render_content_change_visualization(conn)
+        elif page_selection == "Загальна кількість ключових слів":
+            render_keyword_count(conn)
+        elif page_selection == "Порівняння ключових слів між конкурентами":
+            render_keyword_comparison(conn)
+        elif page_selection == "Контент сторінки з підсвіченими ключовими словами":
+            render_page_content_with_keywords(conn)
+        elif page_selection == "Порівняння контенту":
+            render_content_comparison(conn)
+        elif page_selection == "Google Custom Search Аналізатор":
+            render_google_custom_search_analyzer(conn)
 
 # Функції для кожної сторінки
 def render_content_change_visualization(conn):
     st.title("Візуалізація змін контенту")
 
+    # Доповнюємо щоденні агрегати змінами, що з'явилися після останнього оновлення
+    refresh_change_rollup_if_stale(conn)
+
     # Отримуємо список конкурентів
     with st.spinner('Завантаження списку конкурентів...'):
-        competitors = get_competitors_from_content_changes(conn)
+        competitors = get_change_competitors(conn)
 
     competitor = st.selectbox("Виберіть конкурента", competitors, key="content_competitor_selectbox")
 
@@ -901,21 +623,18 @@ def render_content_change_visualization(conn):
     if view_all:
         # Показуємо всі зміни конкурента
         with st.spinner('Завантаження даних про зміни...'):
-            query = "SELECT change_date FROM content_changes WHERE competitor_name = %s"
-            df = pd.read_sql(query, conn, params=[competitor])
+            years = get_change_years(conn, competitor)
 
-        if not df.empty:
-            years = sorted(pd.to_datetime(df['change_date']).dt.year.unique())
+        if years:
             selected_year = st.selectbox("Оберіть рік", years, key="year_selectbox")
             st.subheader(f"Загальні зміни для {competitor} у {selected_year} році")
-            render_contribution_chart_by_months(df, selected_year, conn, competitor)
+            render_contribution_chart_by_months(selected_year, conn, competitor)
         else:
             st.info("Немає змін для цього конкурента.")
     else:
         # Якщо не вибрано "Показати всі зміни конкурента", вибираємо сторінку
         with st.spinner('Завантаження списку сторінок...'):
-            page_query = "SELECT DISTINCT url FROM content_changes WHERE competitor_name = %s"
-            pages = pd.read_sql(page_query, conn, params=[competitor])['url'].tolist()
+            pages = get_changed_pages(conn, competitor)
 
         if not pages:
             st.info("Немає доступних сторінок для цього конкурента.")
@@ -924,34 +643,29 @@ def render_content_change_visualization(conn):
 
             # Показуємо зміни для вибраної сторінки
             with st.spinner('Завантаження даних про зміни...'):
-                query = "SELECT change_date FROM content_changes WHERE competitor_name = %s AND url = %s"
-                df = pd.read_sql(query, conn, params=[competitor, selected_page])
+                years = get_change_years(conn, competitor, selected_page)
 
-            if not df.empty:
-                years = sorted(pd.to_datetime(df['change_date']).dt.year.unique())
+            if years:
                 selected_year = st.selectbox("Оберіть рік", years, key="year_selectbox")
                 st.subheader(f"Зміни для {competitor} на сторінці {selected_page} у {selected_year} році")
-                render_contribution_chart_by_months(df, selected_year, conn, competitor, selected_page)
+                render_contribution_chart_by_months(selected_year, conn, competitor, selected_page)
             else:
                 st.info("Немає змін для цієї сторінки.")
 
 
 def render_keyword_count(conn):
     st.title("Загальна кількість ключових слів")
-    # Отримуємо список конкурентів через функцію get_competitors_from_db
-    competitors = get_competitors_from_db(conn)
+    # Отримуємо список конкурентів з реєстру
+    competitors = get_snapshot_competitors(conn)
 
     competitor_name = st.selectbox("Виберіть конкурента", competitors, key="keyword_competitor_selectbox")
 
+    # Фільтри по датах і URL виконуються в SQL: завантажуються лише рядки та колонки для графіка
     with st.spinner('Завантаження даних...'):
-        df = get_keyword_data(conn, competitor_name)
-
-    if not df.empty:
-        df['date_checked'] = pd.to_datetime(df['date_checked'])
+        min_date, max_date = get_snapshot_date_range(conn, competitor_name)
 
+    if min_date is not None:
         # Фільтр по датах
-        min_date = df['date_checked'].min().date()
-        max_date = df['date_checked'].max().date()
         start_date = st.date_input('Початкова дата', min_date, min_value=min_date, max_value=max_date, key="keyword_start_date")
         end_date = st.date_input('Кінцева дата', max_date, min_value=min_date, max_value=max_date, key="keyword_end_date")
 
@@ -959,12 +673,11 @@ def render_keyword_count(conn):
             st.error('Початкова дата не може бути пізніше кінцевої дати.')
             return
 
-        df = df[(df['date_checked'].dt.date >= start_date) & (df['date_checked'].dt.date <= end_date)]
-
-        selected_urls = st.multiselect('Виберіть URL', df['url'].unique(), key="keyword_url_multiselect")
+        urls = get_snapshot_urls(conn, competitor_name, start_date, end_date)
+        selected_urls = st.multiselect('Виберіть URL', urls, key="keyword_url_multiselect")
 
         if selected_urls:
-            df = df[df['url'].isin(selected_urls)]
+            df = get_keyword_counts(conn, competitor_name, selected_urls, start_date, end_date)
 
             if df.empty:
                 st.warning("Немає даних для вибраних URL та дат.")
@@ -977,9 +690,10 @@ def render_keyword_count(conn):
                                                      df['url'].unique(), key="keyword_url_selectbox")
 
             if selected_url_for_keywords:
-                selected_page_data = df[df['url'] == selected_url_for_keywords].iloc[0]
-                if selected_page_data['keywords_found'] and isinstance(selected_page_data['keywords_found'], str):
-                    keywords_dict = extract_keywords(selected_page_data['keywords_found'])
+                keywords_found = get_first_keywords_found(conn, competitor_name, selected_url_for_keywords,
+                                                          start_date, end_date)
+                if keywords_found and isinstance(keywords_found, str):
+                    keywords_dict = extract_keywords(keywords_found)
 
                     st.write(f"**Знайдені ключові слова на {selected_url_for_keywords}:**")
                     st.write(keywords_dict)
@@ -992,9 +706,12 @@ def render_keyword_count(conn):
                     if selected_keywords:
                         chart_type = st.selectbox("Тип графіка",
                                                   ['Line Chart', 'Bar Chart'], key="keyword_chart_type_selectbox")
+                        # Історія всіх вибраних ключових слів завантажується одним запитом
+                        history_df = get_keywords_history(conn, competitor_name, selected_keywords,
+                                                          selected_url_for_keywords)
                         for keyword in selected_keywords:
                             st.subheader(f'Історія для ключового слова: {keyword}')
-                            keyword_history_df = get_keyword_history(conn, competitor_name, keyword)
+                            keyword_history_df = history_df[history_df['keyword'] == keyword.lower()]
                             if not keyword_history_df.empty:
                                 plot_keyword_history(keyword_history_df, keyword, selected_url_for_keywords,
                                                      chart_type)
@@ -1010,8 +727,8 @@ def render_keyword_count(conn):
 
 def render_keyword_comparison(conn):
     st.title("Порівняння ключових слів між конкурентами")
-    # Отримуємо список конкурентів через функцію get_competitors_from_db
-    competitors = get_competitors_from_db(conn)
+    # Отримуємо список конкурентів з реєстру
+    competitors = get_snapshot_competitors(conn)
 
     selected_competitors = st.multiselect("Виберіть конкурентів для порівняння", competitors,
                                           default=competitors[:2], key="comparison_competitors_multiselect")
@@ -1029,33 +746,35 @@ def render_keyword_comparison(conn):
 
 def render_page_content_with_keywords(conn):
     st.title("Контент сторінки з підсвіченими ключовими словами")
-    # Отримуємо список конкурентів через функцію get_competitors_from_db
-    competitors = get_competitors_from_db(conn)
+    # Отримуємо список конкурентів з реєстру
+    competitors = get_snapshot_competitors(conn)
 
     competitor_name_content = st.selectbox("Виберіть конкурента для перегляду контенту", competitors,
                                            key="content_competitor_selectbox_2")
 
-    df_content = get_keyword_data(conn, competitor_name_content)
+    # Сторінки і дати беруться легкими запитами, контент завантажується лише для обраного знімка
+    pages = get_pages_for_competitor(conn, competitor_name_content)
 
-    if not df_content.empty:
+    if pages:
         # Вибір URL для перегляду контенту
         selected_url_for_content = st.selectbox('Виберіть URL для перегляду контенту',
-                                                df_content['url'].unique(), key="content_url_selectbox_2")
+                                                pages, key="content_url_selectbox_2")
 
-        # Вибір дати
-        selected_date_for_content = st.selectbox('Виберіть дату',
-                                                 df_content[df_content['url'] == selected_url_for_content][
-                                                     'date_checked'].dt.date.unique(),
+        # Вибір дати (для кожного дня — перший знімок)
+        snapshot_dates = {}
+        for date in get_dates_for_page(conn, competitor_name_content, selected_url_for_content):
+            snapshot_dates.setdefault(pd.to_datetime(date).date(), date)
+        selected_date_for_content = st.selectbox('Виберіть дату', list(snapshot_dates),
                                                  key="content_date_selectbox")
 
         if selected_date_for_content:
-            # Фільтрація даних за URL та датою
-            page_content_data = df_content[(df_content['url'] == selected_url_for_content) & (
-                    df_content['date_checked'].dt.date == selected_date_for_content)]
+            date_checked = snapshot_dates[selected_date_for_content]
 
             # Отримання контенту сторінки
-            page_content = page_content_data['content'].values[0]
-            keywords_found = page_content_data['keywords_found'].values[0]
+            page_content = get_snapshot_content(conn, competitor_name_content, selected_url_for_content,
+                                                date_checked)
+            page_data = get_page_data(conn, competitor_name_content, selected_url_for_content, date_checked)
+            keywords_found = page_data['keywords_found'].values[0]
 
             # Обробка знайдених ключових слів
             keywords_dict = extract_keywords(keywords_found)
@@ -1068,8 +787,8 @@ def render_page_content_with_keywords(conn):
 
 def render_content_comparison(conn):
     st.title("Порівняння контенту")
-    # Отримуємо список конкурентів через функцію get_competitors_from_db
-    competitors = get_competitors_from_db(conn)
+    # Отримуємо список конкурентів з реєстру
+    competitors = get_snapshot_competitors(conn)
 
     selected_competitor = st.selectbox('Виберіть конкурента', competitors)
 
@@ -1123,10 +842,17 @@ def render_content_comparison(conn):
                         else:
                             st.info("Змін у метаданих не знайдено.")
 
-                        # Перевірка на наявність змін у контенті
-                        if data1['content'].values[0] != data2['content'].values[0]:
+                        # Зміни в контенті беруться зі збережених дифів сусідніх знімків; якщо пару не вдається
+                        # скласти з них, диф рахується з контенту
+                        content_diff = get_stored_diff(conn, selected_competitor, selected_page, date1_str, date2_str)
+                        if content_diff is None:
+                            content_diff = build_content_diff(
+                                get_snapshot_content(conn, selected_competitor, selected_page, date1_str),
+                                get_snapshot_content(conn, selected_competitor, selected_page, date2_str))
+                        # Грубе зведення з 0/0 означає перестановку рядків, а не відсутність змін
+                        if content_diff['added'] or content_diff['removed'] or content_diff['coarse']:
                             st.subheader("Зміни в контенті:")
-                            visualize_content_changes(data1['content'].values[0], data2['content'].values[0])
+                            visualize_content_diff(content_diff)
                         else:
                             st.info("Змін у контенті не знайдено.")
 
@@ -1201,7 +927,7 @@ def render_google_custom_search_analyzer(conn):
 
     # Отримання використання API
     current_usage = get_api_usage(conn, today_str)
-    api_limit = 100
+    api_limit = API_DAILY_LIMIT
 
     # Відображення використання API
     col1, col2 = st.columns([1, 2])
@@ -1220,27 +946,24 @@ def render_google_custom_search_analyzer(conn):
 
     if st.button("Виконати пошук за введеним ключовим словом"):
         manual_search = True  # Виконаний ручний пошук
-        if current_usage >= api_limit:
-            st.error("Ви досягли ліміту використання API на сьогодні. Спробуйте завтра.")
-            st.stop()
-
         if not user_keyword:
             st.warning("Введіть ключове слово для пошуку.")
             st.stop()
 
-        # Виконання пошуку за введеним ключовим словом
-        search_results = perform_search(user_keyword, api_key, cx, region=region_code)
+        # Виконання пошуку за введеним ключовим словом (повторний пошук береться зі збереженої видачі)
+        search_results, from_cache = perform_cached_search(conn, user_keyword, api_key, cx,
+                                                           region=region_code, api_limit=api_limit)
         if not search_results:
             st.info("Не вдалося знайти результати за цим ключовим словом.")
             st.stop()
+        if from_cache:
+            st.caption("Результати взято зі збереженої видачі, API-запит не витрачено.")
+        else:
+            current_usage += 1
 
         # Збереження результатів у session_state
         st.session_state['search_results'] = search_results
 
-        # Оновлення використання API
-        update_api_usage(conn, today_str, increment=1)
-        current_usage += 1
-
         # Відображення результатів пошуку
         results_data = []
         for idx, item in enumerate(search_results, 1):
@@ -1259,7 +982,6 @@ def render_google_custom_search_analyzer(conn):
 
     if not keywords:
         st.info("Таблиця 'keywords' порожня. Додайте ключові слова до бази даних.")
-        conn.close()
         st.stop()
 
     # Вибір ключового слова
@@ -1267,10 +989,6 @@ def render_google_custom_search_analyzer(conn):
 
     # Кнопка для запуску пошуку за вибраним ключовим словом
     if st.button("Виконати пошук"):
-        if current_usage >= api_limit:
-            st.error("Ви досягли ліміту використання API на сьогодні. Спробуйте завтра.")
-            st.stop()
-
         # Отримання тегу для обраного ключового слова
         tag = get_tag_for_keyword(conn, selected_keyword)
         if not tag:
@@ -1287,15 +1005,32 @@ def render_google_custom_search_analyzer(conn):
         st.session_state['related_keywords'] = related_keywords
 
         with st.spinner('Виконується пошук...'):
-            # Виконання пошуку
-            search_results = perform_search(selected_keyword, api_key, cx, region=region_code)
+            # Виконання пошуку (квоту API витрачає лише промах кешу видачі)
+            search_results, from_cache = perform_cached_search(conn, selected_keyword, api_key, cx,
+                                                               region=region_code, api_limit=api_limit)
             if not search_results:
                 st.info("Не вдалося знайти результати за цим ключовим словом.")
                 st.stop()
+            if from_cache:
+                st.caption("Результати взято зі збереженої видачі, API-запит не витрачено.")
+            else:
+                current_usage += 1
 
-            # Оновлення використання API
-            update_api_usage(conn, today_str, increment=1)
-            current_usage += 1
+        # Функція для аналізу сторінки одразу після її завантаження
+        def analyze_fetched_page(url, html_content):
+            if not html_content:
+                return {
+                    'counts_title': {},
+                    'counts_description': {},
+                    'counts_headers': {},
+                    'counts_content': {},
+                    'total_keywords': 0
+                }
+            return get_page_analysis(url, related_keywords, analyze_page_content, html_content)
+
+        # Сторінки результатів завантажуються паралельно і аналізуються в міру надходження
+        analysis_by_url = fetch_pages_with_progress([item.get('link') for item in search_results],
+                                                    analyze_fetched_page)
 
         # Аналіз результатів пошуку
         results_data = []
@@ -1305,19 +1040,8 @@ def render_google_custom_search_analyzer(conn):
             title = item.get('title') if item.get('title') else ''
             snippet = item.get('snippet') if item.get('snippet') else ''
 
-            # Отримання контенту сторінки
-            html_content = fetch_page_content(url)
-            if not html_content:
-                analysis_results = {
-                    'counts_title': {},
-                    'counts_description': {},
-                    'counts_headers': {},
-                    'counts_content': {},
-                    'total_keywords': 0
-                }
-            else:
-                analysis_results = analyze_page_content(html_content, related_keywords)
-
+            # Результат аналізу сторінки
+            analysis_results = analysis_by_url.get(url) or analyze_fetched_page(url, "")
             all_analysis_results.append(analysis_results)
 
             counts_title = analysis_results['counts_title']
@@ -1384,7 +1108,7 @@ def render_google_custom_search_analyzer(conn):
                         # Перевірка наявності related_keywords у session_state
                         if 'related_keywords' in st.session_state and st.session_state['related_keywords']:
                             related_keywords = st.session_state['related_keywords']
-                            analysis_results = analyze_page_content(html_content, related_keywords)
+                            analysis_results = get_page_analysis(selected_result, related_keywords, analyze_page_content, html_content)
 
                             counts_title = analysis_results['counts_title']
                             counts_description = analysis_results['counts_description']
@@ -1442,15 +1166,18 @@ def render_google_custom_search_analyzer(conn):
                     else:
                         # Аналіз контенту основної сторінки
                         related_keywords = st.session_state.get('related_keywords', [])
-                        main_analysis_results = analyze_page_content(main_html_content, related_keywords)
-
-                        # Порівняння з конкурентами
+                        main_analysis_results = get_page_analysis(main_url, related_keywords, analyze_page_content, main_html_content)
+
+                        # Порівняння з конкурентами (сторінки конкурентів завантажуються паралельно)
+                        competitor_urls = [result.get('Посилання') for result in search_results]
+                        competitor_analysis = fetch_pages_with_progress(
+                            competitor_urls,
+                            lambda url, html_content: get_page_analysis(url, related_keywords, analyze_page_content, html_content) if html_content else None
+                        )
                         competitor_pages = []
-                        for result in search_results:
-                            url = result.get('Посилання')
-                            html_content = fetch_page_content(url)
-                            if html_content:
-                                analysis_results = analyze_page_content(html_content, related_keywords)
+                        for url in competitor_urls:
+                            analysis_results = competitor_analysis.get(url)
+                            if analysis_results:
                                 competitor_pages.append(analysis_results)
 
                         # Генерація промпту для OpenAI API
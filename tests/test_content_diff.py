@@ -0,0 +1,137 @@
+import random
+
+import pytest
+
+import content_diff
+from content_diff import DIFF_ENGINES, build_content_diff, patience_opcodes
+
+
+# Функція для застосування операцій до рядків "до": результат має збігатися з рядками "після"
+def apply_opcodes(before, after, opcodes):
+    result = []
+    i = j = 0
+    for tag, i1, i2, j1, j2 in opcodes:
+        assert (i1, j1) == (i, j)
+        if tag == 'equal':
+            assert before[i1:i2] == after[j1:j2]
+            result.extend(before[i1:i2])
+        else:
+            result.extend(after[j1:j2])
+        i, j = i2, j2
+    assert (i, j) == (len(before), len(after))
+    return result
+
+
+def changed_lines(opcodes):
+    added = sum(j2 - j1 for tag, _, _, j1, j2 in opcodes if tag in ('replace', 'insert'))
+    removed = sum(i2 - i1 for tag, i1, i2, _, _ in opcodes if tag in ('replace', 'delete'))
+    return added, removed
+
+
+def test_identical_input():
+    lines = ['<h1>LMS</h1>', 'Learn more', 'Read more', 'Learn more']
+    assert patience_opcodes(lines, lines) == [('equal', 0, 4, 0, 4)]
+    diff = build_content_diff('\n'.join(lines), '\n'.join(lines))
+    assert diff == {'added': 0, 'removed': 0, 'coarse': False, 'hunks': []}
+
+
+def test_empty_input():
+    assert patience_opcodes([], []) == []
+    assert patience_opcodes([], ['a']) == [('insert', 0, 0, 0, 1)]
+    assert patience_opcodes(['a'], []) == [('delete', 0, 1, 0, 0)]
+
+
+def test_pure_insert():
+    before = ['a', 'b', 'c']
+    after = ['a', 'x', 'y', 'b', 'c']
+    assert patience_opcodes(before, after) == [
+        ('equal', 0, 1, 0, 1),
+        ('insert', 1, 1, 1, 3),
+        ('equal', 1, 3, 3, 5),
+    ]
+
+
+def test_pure_delete():
+    before = ['a', 'x', 'y', 'b', 'c']
+    after = ['a', 'b', 'c']
+    assert patience_opcodes(before, after) == [
+        ('equal', 0, 1, 0, 1),
+        ('delete', 1, 3, 1, 1),
+        ('equal', 3, 5, 1, 3),
+    ]
+
+
+@pytest.mark.parametrize('engine', sorted(DIFF_ENGINES))
+def test_hunks_mark_added_and_removed_lines(engine):
+    diff = build_content_diff('a\nb\nc\nd', 'a\nB\nc\nd\ne', engine=engine)
+    assert (diff['added'], diff['removed'], diff['coarse']) == (2, 1, False)
+    assert diff['hunks'][0]['lines'] == [[' ', 'a'], ['-', 'b'], ['+', 'B'], [' ', 'c'], [' ', 'd'], ['+', 'e']]
+
+
+def test_repeated_boilerplate_lines_small_region():
+    before = ['Learn more', 'Read more'] * 20
+    after = list(before)
+    after[0] = 'Start here'
+    after[21] = 'Read less'
+    assert changed_lines(patience_opcodes(before, after)) == (2, 2)
+
+
+def test_repeated_boilerplate_lines_large_region():
+    # Ділянка без жодного унікального рядка, більша за DIFF_SMALL_REGION
+    before = ['Learn more', 'Read more'] * 400
+    after = list(before)
+    after[0] = 'Start here'
+    after[-1] = 'Read less'
+    after[401] = 'Learn less'
+    assert len(before) * len(after) > content_diff.DIFF_SMALL_REGION
+
+    opcodes = patience_opcodes(before, after)
+    assert apply_opcodes(before, after, opcodes) == after
+    assert changed_lines(opcodes) == (3, 3)
+
+    diff = build_content_diff('\n'.join(before), '\n'.join(after))
+    assert (diff['added'], diff['removed'], diff['coarse']) == (3, 3, False)
+
+
+def test_expired_budget_gives_coarse_summary():
+    diff = build_content_diff('a\nb\nc', 'a\nc\nd', time_budget=-1)
+    assert diff['coarse'] is True
+    assert (diff['added'], diff['removed']) == (1, 1)
+    assert sorted(diff['hunks'][0]['lines']) == [['+', 'd'], ['-', 'b']]
+
+
+def test_too_many_edits_in_large_region_gives_coarse_summary(monkeypatch):
+    monkeypatch.setattr(content_diff, 'DIFF_SMALL_REGION', 0)
+    monkeypatch.setattr(content_diff, 'DIFF_MAX_EDITS', 4)
+    before = ['x'] * 10 + ['y'] * 10
+    after = ['y'] * 10 + ['x'] * 10
+    diff = build_content_diff('\n'.join(before), '\n'.join(after))
+    # Той самий набір рядків в іншому порядку: зведення без порядку не бачить змін, але позначене як грубе
+    assert diff['coarse'] is True
+
+
+def test_too_many_lines_gives_coarse_summary():
+    diff = build_content_diff('a\nb', 'a\nc', max_lines=3)
+    assert diff['coarse'] is True
+    assert (diff['added'], diff['removed']) == (1, 1)
+
+
+@pytest.mark.parametrize('small_region', [content_diff.DIFF_SMALL_REGION, 0])
+@pytest.mark.parametrize('seed', range(10))
+def test_opcodes_rebuild_after(monkeypatch, small_region, seed):
+    # small_region=0 змушує всі ділянки без унікальних рядків проходити через алгоритм Маєрса
+    monkeypatch.setattr(content_diff, 'DIFF_SMALL_REGION', small_region)
+    rng = random.Random(seed)
+    for _ in range(200):
+        before = [rng.choice('abcde') for _ in range(rng.randint(0, 40))]
+        after = list(before)
+        for _ in range(rng.randint(0, 8)):
+            action = rng.random()
+            if action < 0.3 and after:
+                del after[rng.randrange(len(after))]
+            elif action < 0.6:
+                after.insert(rng.randint(0, len(after)), rng.choice('abcdef'))
+            elif after:
+                after[rng.randrange(len(after))] = rng.choice('abcdef')
+        for engine in DIFF_ENGINES.values():
+            assert apply_opcodes(before, after, engine(before, after)) == after
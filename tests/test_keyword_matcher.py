@@ -0,0 +1,90 @@
+import random
+import re
+
+import pytest
+
+from keyword_matcher import build_keyword_matcher, count_keywords
+
+
+# Еталонний підрахунок, який замінив автомат: окремий регулярний вираз для кожного ключового слова
+def regex_counts(keywords, text):
+    counts = {}
+    for keyword in keywords:
+        if not keyword:
+            continue
+        count = len(re.findall(r'\b' + re.escape(keyword.lower()) + r'\b', text.lower()))
+        if count:
+            counts[keyword] = count
+    return counts
+
+
+def matcher_counts(keywords, text):
+    return count_keywords(build_keyword_matcher(tuple(keywords)), text)
+
+
+def test_overlapping_keywords_are_counted_independently():
+    keywords = ['machine learning', 'learning', 'learning management system', 'management']
+    text = 'Machine learning for a learning management system. Learning management matters.'
+    assert matcher_counts(keywords, text) == {
+        'machine learning': 1,
+        'learning': 3,
+        'learning management system': 1,
+        'management': 2,
+    }
+
+
+def test_repeated_keyword_does_not_overlap_itself():
+    assert matcher_counts(['ab ab'], 'ab ab ab') == {'ab ab': 1}
+    assert matcher_counts(['aa'], 'aa aa aaaa') == {'aa': 2}
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('lms', 1),
+    ('LMS, lms; (lms)', 3),
+    ('lmss lms_ x_lms lms2', 0),
+    ('lms-platform', 1),
+    ('', 0),
+])
+def test_word_boundaries(text, expected):
+    assert matcher_counts(['lms'], text).get('lms', 0) == expected
+
+
+def test_keywords_with_punctuation_at_the_edges():
+    # \b перед або після не-літерного символу ключового слова вимагає літеру з іншого боку
+    keywords = ['c++', '.net', 'e-learning']
+    text = 'c++ and .net, e-learning; xc++ a.net'
+    assert matcher_counts(keywords, text) == regex_counts(keywords, text)
+
+
+def test_case_insensitive_and_original_spelling_kept():
+    keywords = ['LMS', 'lms', 'Onboarding']
+    assert matcher_counts(keywords, 'lms Lms ONBOARDING') == {'LMS': 2, 'lms': 2, 'Onboarding': 1}
+
+
+def test_unicode_text():
+    keywords = ['навчання', 'корпоративне навчання', 'Straße', 'ÉCOLE']
+    text = 'Корпоративне НАВЧАННЯ та навчання_онлайн; STRASSE straße, école École'
+    assert matcher_counts(keywords, text) == regex_counts(keywords, text)
+    assert matcher_counts(keywords, text) == {
+        'навчання': 1, 'корпоративне навчання': 1, 'Straße': 1, 'ÉCOLE': 2,
+    }
+
+
+def test_result_follows_keyword_order_and_skips_empty_keywords():
+    keywords = ['b', '', 'a', 'missing']
+    assert list(matcher_counts(keywords, 'a b a')) == ['b', 'a']
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_matches_regex_counting_on_random_texts(seed):
+    rng = random.Random(seed)
+    alphabet = ['a', 'b', 'ab', 'ба', 'É', 'é', '_', '1']
+    separators = [' ', ' ', '-', '.', ', ', '\n', '']
+
+    def word():
+        return ''.join(rng.choice(alphabet) for _ in range(rng.randint(1, 3)))
+
+    for _ in range(50):
+        keywords = [' '.join(word() for _ in range(rng.randint(1, 2))) for _ in range(rng.randint(1, 8))]
+        text = ''.join(word() + rng.choice(separators) for _ in range(rng.randint(0, 60)))
+        assert matcher_counts(keywords, text) == regex_counts(keywords, text)
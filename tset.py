@@ -1,39 +1,35 @@
 import plotly.graph_objects as go
 import re
 import streamlit as st
-import psycopg2
 import pandas as pd
-from datetime import datetime
-import difflib
 import streamlit.components.v1 as components
+from db_pool import db_connection
+from keyword_parser import compare_keywords, extract_keywords
+from snapshot_store import get_snapshot_content
+from keyword_store import (
+    get_first_keywords_found,
+    get_keyword_counts,
+    get_keywords_history,
+    get_snapshot_date_range,
+    get_snapshot_urls,
+)
+from competitors import get_change_competitors, get_snapshot_competitors
+from content_changes import (
+    get_change_date_range,
+    get_change_years,
+    get_changed_pages,
+    refresh_change_rollup_if_stale,
+    render_contribution_chart_by_months,
+)
+from content_diff import build_content_diff, render_diff_html
+from snapshot_diffs import get_stored_diff
 
 
 
 
-# Функція для підключення до бази даних PostgreSQL
-def connect_to_db():
-    try:
-        connection = psycopg2.connect(
-            host="localhost",
-            database="competitor_content",
-            user="kostia.s920",
-            password="1502"
-        )
-        return connection
-    except Exception as e:
-        st.error(f"Error connecting to database: {e}")
-        return None
-
-
-#Функція для отримання списку конкурентів
-def get_competitors_from_content_changes(conn):
-    query = "SELECT DISTINCT competitor_name FROM content_changes"
-    return pd.read_sql(query, conn)['competitor_name'].tolist()
-
-
 # Функція для отримання списку URL для обраного конкурента
 def get_pages_for_competitor(conn, competitor_name):
-    query = f"SELECT DISTINCT url FROM {competitor_name}"
+    query = f"SELECT DISTINCT url FROM {competitor_name} ORDER BY url"
     return pd.read_sql(query, conn)['url'].tolist()
 
 
@@ -42,16 +38,16 @@ def get_dates_for_page(conn, competitor_name, page_url):
     query = f"""
         SELECT DISTINCT date_checked
         FROM {competitor_name}
-        WHERE url = '{page_url}'
+        WHERE url = %s
         ORDER BY date_checked ASC
     """
-    return pd.read_sql(query, conn)['date_checked'].tolist()
+    return pd.read_sql(query, conn, params=[page_url])['date_checked'].tolist()
 
 
-# Функція для отримання даних для конкретної сторінки на обрану дату
+# Функція для отримання метаданих конкретної сторінки на обрану дату (контент — через get_snapshot_content)
 def get_page_data(conn, competitor_name, page_url, date):
     query = f"""
-        SELECT title, h1, description, content, keywords_found, keywords_count
+        SELECT title, h1, description, keywords_found, keywords_count
         FROM {competitor_name}
         WHERE url = %s AND date_checked = %s
     """
@@ -103,84 +99,25 @@ def visualize_keywords_changes(keywords_changes):
     st.plotly_chart(fig)
 
 
-# Функція для порівняння контенту і візуалізації змін за допомогою Plotly
-def visualize_content_changes(content_before, content_after):
-
-    # Розбиваємо контент на рядки
-    before_lines = content_before.splitlines()
-    after_lines = content_after.splitlines()
-
-    # Створюємо об'єкт HtmlDiff
-    differ = difflib.HtmlDiff(wrapcolumn=50)
+# Функція для візуалізації змін контенту (компактний HTML зі зміненими фрагментами)
+def visualize_content_diff(content_diff):
 
-    # Генеруємо HTML з підсвіченими змінами
-    diff_html = differ.make_file(before_lines, after_lines, fromdesc='Було', todesc='Стало')
+    # Показуємо лише змінені фрагменти з контекстом
+    diff_html = render_diff_html(content_diff)
 
     # Відображаємо HTML у Streamlit
     st.subheader("Порівняння контенту:")
     components.html(diff_html, height=600,scrolling=True)
 
 
-# Оновлена функція для вилучення ключових слів і кількості їх повторень
-def extract_keywords(row):
-    if pd.isna(row) or not row.strip():
-        return {}
-    entries = row.split(',')
-    keywords_dict = {}
-    for entry in entries:
-        entry = entry.strip()
-        match = re.match(r'^\s*(?P<keyword>.*?)\s*-\s*(?P<count>\d+)\s*разів', entry)
-        if match:
-            keyword = match.group('keyword').strip().lower()
-            count = int(match.group('count'))
-            if keyword in keywords_dict:
-                keywords_dict[keyword] += count
-            else:
-                keywords_dict[keyword] = count
-    return keywords_dict
-
-
-# Функція для порівняння keywords_found
-def compare_keywords(old_keywords, new_keywords):
-    old_dict = extract_keywords(old_keywords)
-    new_dict = extract_keywords(new_keywords)
-
-    # Визначаємо додані, видалені і змінені ключові слова
-    added = {k: new_dict[k] for k in new_dict if k not in old_dict}
-    removed = {k: old_dict[k] for k in old_dict if k not in new_dict}
-    changed = {k: (old_dict[k], new_dict[k]) for k in old_dict if k in new_dict and old_dict[k] != new_dict[k]}
-
-    result = []
-    for k, v in added.items():
-        result.append((k, 'Додано', '-', f"{v} разів"))
-    for k, v in removed.items():
-        result.append((k, 'Видалено', f"{v} разів", '-'))
-    for k, (old_v, new_v) in changed.items():
-        result.append((k, 'Змінено', f"{old_v} разів", f"{new_v} разів"))
-
-    return pd.DataFrame(result, columns=['Ключове слово', 'Зміна', 'Було', 'Стало'])
-
-
-# Функція для отримання даних по ключовим словам із бази даних
+# Функція для отримання тренду кількості ключових слів конкурента (без важких колонок content і keywords_found)
 def get_keyword_data(conn, competitor_name):
     query = f"""
-        SELECT url, keywords_count, keywords_found, content, date_checked 
+        SELECT url, keywords_count, date_checked
         FROM {competitor_name}
         ORDER BY date_checked ASC
     """
-    df = pd.read_sql(query, conn)
-    return df
-
-# Функція для отримання історичних даних по вибраному ключовому слову
-def get_keyword_history(conn, competitor_name, keyword):
-    query = f"""
-        SELECT url, date_checked, keywords_found
-        FROM {competitor_name}
-        WHERE keywords_found ILIKE %s
-        ORDER BY date_checked ASC
-    """
-    df = pd.read_sql(query, conn, params=[f'%{keyword}%'])
-    return df
+    return pd.read_sql(query, conn)
 
 # Функція для побудови графіка ключових слів
 def plot_keyword_trend(df, competitor_name):
@@ -252,10 +189,8 @@ def plot_keyword_history(df, keyword, selected_url, chart_type):
     # Перетворення дат на datetime
     url_data['date_checked'] = pd.to_datetime(url_data['date_checked'], errors='coerce')
 
-    # Створюємо колонку з кількістю повторень ключового слова
-    url_data['keyword_count'] = url_data['keywords_found'].apply(
-        lambda row: extract_keywords(row).get(keyword.lower(), 0) if pd.notna(row) else 0
-    )
+    # Кількість повторень ключового слова вже нормалізована в keyword_occurrences
+    url_data['keyword_count'] = url_data['count']
 
     # Фільтруємо дані, залишаючи лише ті рядки, де ключове слово присутнє
     url_data = url_data[url_data['keyword_count'] > 0]
@@ -347,132 +282,10 @@ def highlight_keywords(text, keywords):
         text = re.sub(f'({escaped_keyword})', r'<span style="color:red; font-weight:bold;">\1</span>', text, flags=re.IGNORECASE)
     return text
 
-# Функція для рендерингу сітки змін за місяцями
-def render_contribution_chart_by_months(change_dates, selected_year, conn, competitor, selected_page=None):
-    st.markdown(
-        """
-        <style>
-        .contribution-box {
-            width: 12px;
-            height: 12px;
-            margin: 2px;
-            display: inline-block;
-            background-color: #ebedf0;
-        }
-        .contribution-level-1 { background-color: #c6e48b; }
-        .contribution-level-2 { background-color: #7bc96f; }
-        .contribution-level-3 { background-color: #239a3b; }
-        .contribution-level-4 { background-color: #196127; }
-        .contribution-box-container {
-            display: flex;
-            justify-content: space-around;
-            flex-wrap: wrap;
-            max-width: 900px;  /* Обмежуємо ширину */
-        }
-        .month-column {
-            display: grid;
-            grid-template-rows: repeat(7, 14px);  /* 7 днів на рядок */
-            grid-auto-flow: column;  /* Заповнення по колонках */
-            gap: 4px;
-            margin-right: 20px;
-            text-align: center;
-        }
-        .month-title {
-            text-align: center;
-            margin-bottom: 10px;
-            font-weight: bold;
-            font-size: 12px;
-        }
-        </style>
-        """,
-        unsafe_allow_html=True
-    )
-
-    # Фільтруємо дати за обраним роком
-    change_dates['change_date'] = pd.to_datetime(change_dates['change_date']).dt.date
-    change_dates = change_dates[change_dates['change_date'].apply(lambda x: x.year) == selected_year]
-
-    def render_month_labels():
-        months = {
-            'Jan': 31, 'Feb': 28, 'Mar': 31, 'Apr': 30, 'May': 31, 'Jun': 30,
-            'Jul': 31, 'Aug': 31, 'Sep': 30, 'Oct': 31, 'Nov': 30, 'Dec': 31
-        }
-
-        months_html = '<div style="display: flex; flex-wrap: wrap; gap: 20px;">'
-
-        for month, days in months.items():
-            month_html = f'<div style="text-align: center;"><div style="margin-bottom: 5px;">{month}</div>'
-            month_html += f'<div style="display: grid; grid-template-columns: repeat(7, 14px); grid-gap: 2px;">'
-
-            for day in range(1, days + 1):
-                date = datetime(selected_year, list(months.keys()).index(month) + 1, day).date()
-
-                # Змінюємо запит в залежності від того, вибрано конкретну сторінку чи всі зміни конкурента
-                if selected_page:
-                    query = f"""
-                    SELECT change_date 
-                    FROM content_changes 
-                    WHERE competitor_name = '{competitor}'
-                    AND url = '{selected_page}'
-                    AND change_date::date = '{date}'
-                    """
-                    result = pd.read_sql(query, conn)
-                    pages = result['change_date'].tolist() if not result.empty else []
-                else:
-                    query = f"""
-                    SELECT url 
-                    FROM content_changes 
-                    WHERE competitor_name = '{competitor}'
-                    AND change_date::date = '{date}'
-                    """
-                    pages = pd.read_sql(query, conn)['url'].tolist()
-
-                # Визначаємо рівень для відображення кольору
-                if not pages:
-                    level = 'contribution-box'
-                    tooltip = f"{date} - немає змін"
-                else:
-                    if len(pages) <= 1:
-                        level = 'contribution-box contribution-level-1'
-                    elif len(pages) <= 3:
-                        level = 'contribution-box contribution-level-2'
-                    elif len(pages) <= 5:
-                        level = 'contribution-box contribution-level-3'
-                    else:
-                        level = 'contribution-box contribution-level-4'
-
-                    # Формуємо список сторінок для відображення в спливаючому вікні
-                    if selected_page:
-                        tooltip = f"{date} - зміни на цій сторінці"
-                    else:
-                        tooltip = f"{date} - зміни:\n" + "\n".join(pages)
-
-                month_html += f'<div class="{level}" title="{tooltip}"></div>'
-
-            month_html += '</div>'
-            months_html += f'{month_html}</div>'
-
-        months_html += '</div>'
-        return months_html
-
-    # Викликаємо рендеринг місяців
-    st.markdown(render_month_labels(), unsafe_allow_html=True)
-
 # Налаштування сторінки
 st.set_page_config(page_title="Change Tracker", page_icon="🔍")
 
 
-def get_competitors_from_db(conn):
-    query = """
-    SELECT table_name
-    FROM information_schema.tables
-    WHERE table_name LIKE '%_com';
-    """
-
-    # Виконуємо запит і отримуємо список таблиць-конкурентів
-    competitor_tables = pd.read_sql(query, conn)['table_name'].tolist()
-    return competitor_tables
-
 
 # Функція для отримання даних з таблиці content_changes з можливістю сортування і фільтрації
 def get_content_changes(conn, selected_competitor=None, start_date=None, end_date=None):
@@ -497,15 +310,17 @@ def get_content_changes(conn, selected_competitor=None, start_date=None, end_dat
 def render_content_changes_table(conn):
     st.title("Таблиця змін контенту")
 
-    # Отримуємо список конкурентів для фільтрації
-    competitors = pd.read_sql("SELECT DISTINCT competitor_name FROM content_changes", conn)['competitor_name'].tolist()
+    # Список конкурентів береться з реєстру, а діапазон дат — з щоденних агрегатів, без сканування журналу змін
+    competitors = get_change_competitors(conn)
 
     # Вибір конкурента для фільтрації
     selected_competitor = st.selectbox("Виберіть конкурента", ["Всі конкуренти"] + competitors)
 
     # Фільтр по датах
-    date_range = pd.read_sql("SELECT MIN(change_date) as min_date, MAX(change_date) as max_date FROM content_changes", conn).iloc[0]
-    min_date, max_date = date_range['min_date'], date_range['max_date']
+    min_date, max_date = get_change_date_range(conn)
+    if min_date is None:
+        st.warning("Немає змін для відображення.")
+        return
 
     start_date = st.date_input('Початкова дата', min_date, min_value=min_date, max_value=max_date)
     end_date = st.date_input('Кінцева дата', max_date, min_value=min_date, max_value=max_date)
@@ -532,37 +347,36 @@ def render_content_changes_table(conn):
 
 # Основна функція для відображення даних у Streamlit
 def main():
-    # Підключаємося до бази даних
-    conn = connect_to_db()
-
-    if conn:
-        # Додаємо бічну панель для навігації між сторінками
-        st.sidebar.title("Навігація")
-
-        # Список сторінок
-        pages = ["Візуалізація змін контенту",
-                 "Загальна кількість ключових слів",
-                 "Порівняння ключових слів між конкурентами",
-                 "Контент сторінки з підсвіченими ключовими словами",
-                 "Порівняння контенту",
-                 "Таблиця змін"]
-
-        # Вибір сторінки через кнопки на бічній панелі
-        page_selection = st.sidebar.radio("Оберіть сторінку", pages)
-
-        # Відображення контенту в залежності від вибору сторінки
-        if page_selection == "Візуалізація змін контенту":
-            render_content_change_visualization(conn)
-        elif page_selection == "Загальна кількість ключових слів":
-            render_keyword_count(conn)
-        elif page_selection == "Порівняння ключових слів між конкурентами":
-            render_keyword_comparison(conn)
-        elif page_selection == "Контент сторінки з підсвіченими ключовими словами":
-            render_page_content_with_keywords(conn)
-        elif page_selection == "Порівняння контенту":
-            render_content_comparison(conn)
-        elif page_selection == "Таблиця змін":  # Відображаємо таблицю змін з фільтрами
-            render_content_changes_table(conn)
+    # Підключаємося до бази даних (з'єднання береться з пулу і повертається після рендерингу)
+    with db_connection() as conn:
+        if conn:
+            # Додаємо бічну панель для навігації між сторінками
+            st.sidebar.title("Навігація")
+
+            # Список сторінок
+            pages = ["Візуалізація змін контенту",
+                     "Загальна кількість ключових слів",
+                     "Порівняння ключових слів між конкурентами",
+                     "Контент сторінки з підсвіченими ключовими словами",
+                     "Порівняння контенту",
+                     "Таблиця змін"]
+
+            # Вибір сторінки через кнопки на бічній панелі
+            page_selection = st.sidebar.radio("Оберіть сторінку", pages)
+
+            # Відображення контенту в залежності від вибору сторінки
+            if page_selection == "Візуалізація змін контенту":
+                render_content_change_visualization(conn)
+            elif page_selection == "Загальна кількість ключових слів":
+                render_keyword_count(conn)
+            elif page_selection == "Порівняння ключових слів між конкурентами":
+                render_keyword_comparison(conn)
+            elif page_selection == "Контент сторінки з підсвіченими ключовими словами":
+                render_page_content_with_keywords(conn)
+            elif page_selection == "Порівняння контенту":
+                render_content_comparison(conn)
+            elif page_selection == "Таблиця змін":  # Відображаємо таблицю змін з фільтрами
+                render_content_changes_table(conn)
 
 
 # Функції для кожної сторінки
@@ -571,10 +385,13 @@ import time
 def render_content_change_visualization(conn):
     st.title("Візуалізація змін контенту")
 
+    # Доповнюємо щоденні агрегати змінами, що з'явилися після останнього оновлення
+    refresh_change_rollup_if_stale(conn)
+
     # Отримуємо список конкурентів
     with st.spinner('Завантаження списку конкурентів...'):
         time.sleep(2)  # Затримка для тестування
-        competitors = get_competitors_from_content_changes(conn)
+        competitors = get_change_competitors(conn)
 
     competitor = st.selectbox("Виберіть конкурента", competitors, key="content_competitor_selectbox")
 
@@ -585,22 +402,19 @@ def render_content_change_visualization(conn):
         # Показуємо всі зміни конкурента
         with st.spinner('Завантаження даних про зміни...'):
             time.sleep(2)  # Затримка для тестування
-            query = "SELECT change_date FROM content_changes WHERE competitor_name = %s"
-            df = pd.read_sql(query, conn, params=[competitor])
+            years = get_change_years(conn, competitor)
 
-        if not df.empty:
-            years = sorted(pd.to_datetime(df['change_date']).dt.year.unique())
+        if years:
             selected_year = st.selectbox("Оберіть рік", years, key="year_selectbox")
             st.subheader(f"Загальні зміни для {competitor} у {selected_year} році")
-            render_contribution_chart_by_months(df, selected_year, conn, competitor)
+            render_contribution_chart_by_months(selected_year, conn, competitor)
         else:
             st.info("Немає змін для цього конкурента.")
     else:
         # Якщо не вибрано "Показати всі зміни конкурента", вибираємо сторінку
         with st.spinner('Завантаження списку сторінок...'):
             time.sleep(2)  # Затримка для тестування
-            page_query = "SELECT DISTINCT url FROM content_changes WHERE competitor_name = %s"
-            pages = pd.read_sql(page_query, conn, params=[competitor])['url'].tolist()
+            pages = get_changed_pages(conn, competitor)
 
         if not pages:
             st.info("Немає доступних сторінок для цього конкурента.")
@@ -610,34 +424,29 @@ def render_content_change_visualization(conn):
             # Показуємо зміни для вибраної сторінки
             with st.spinner('Завантаження даних про зміни...'):
                 time.sleep(2)  # Затримка для тестування
-                query = "SELECT change_date FROM content_changes WHERE competitor_name = %s AND url = %s"
-                df = pd.read_sql(query, conn, params=[competitor, selected_page])
+                years = get_change_years(conn, competitor, selected_page)
 
-            if not df.empty:
-                years = sorted(pd.to_datetime(df['change_date']).dt.year.unique())
+            if years:
                 selected_year = st.selectbox("Оберіть рік", years, key="year_selectbox")
                 st.subheader(f"Зміни для {competitor} на сторінці {selected_page} у {selected_year} році")
-                render_contribution_chart_by_months(df, selected_year, conn, competitor, selected_page)
+                render_contribution_chart_by_months(selected_year, conn, competitor, selected_page)
             else:
                 st.info("Немає змін для цієї сторінки.")
 
 
 def render_keyword_count(conn):
     st.title("Загальна кількість ключових слів")
-    # Отримуємо список конкурентів через функцію get_competitors_from_db
-    competitors = get_competitors_from_db(conn)
+    # Отримуємо список конкурентів з реєстру
+    competitors = get_snapshot_competitors(conn)
 
     competitor_name = st.selectbox("Виберіть конкурента", competitors, key="keyword_competitor_selectbox")
 
+    # Фільтри по датах і URL виконуються в SQL: завантажуються лише рядки та колонки для графіка
     with st.spinner('Завантаження даних...'):
-        df = get_keyword_data(conn, competitor_name)
-
-    if not df.empty:
-        df['date_checked'] = pd.to_datetime(df['date_checked'])
+        min_date, max_date = get_snapshot_date_range(conn, competitor_name)
 
+    if min_date is not None:
         # Фільтр по датах
-        min_date = df['date_checked'].min().date()
-        max_date = df['date_checked'].max().date()
         start_date = st.date_input('Початкова дата', min_date, min_value=min_date, max_value=max_date, key="keyword_start_date")
         end_date = st.date_input('Кінцева дата', max_date, min_value=min_date, max_value=max_date, key="keyword_end_date")
 
@@ -645,12 +454,11 @@ def render_keyword_count(conn):
             st.error('Початкова дата не може бути пізніше кінцевої дати.')
             return
 
-        df = df[(df['date_checked'].dt.date >= start_date) & (df['date_checked'].dt.date <= end_date)]
-
-        selected_urls = st.multiselect('Виберіть URL', df['url'].unique(), key="keyword_url_multiselect")
+        urls = get_snapshot_urls(conn, competitor_name, start_date, end_date)
+        selected_urls = st.multiselect('Виберіть URL', urls, key="keyword_url_multiselect")
 
         if selected_urls:
-            df = df[df['url'].isin(selected_urls)]
+            df = get_keyword_counts(conn, competitor_name, selected_urls, start_date, end_date)
 
             if df.empty:
                 st.warning("Немає даних для вибраних URL та дат.")
@@ -663,9 +471,10 @@ def render_keyword_count(conn):
                                                      df['url'].unique(), key="keyword_url_selectbox")
 
             if selected_url_for_keywords:
-                selected_page_data = df[df['url'] == selected_url_for_keywords].iloc[0]
-                if selected_page_data['keywords_found'] and isinstance(selected_page_data['keywords_found'], str):
-                    keywords_dict = extract_keywords(selected_page_data['keywords_found'])
+                keywords_found = get_first_keywords_found(conn, competitor_name, selected_url_for_keywords,
+                                                          start_date, end_date)
+                if keywords_found and isinstance(keywords_found, str):
+                    keywords_dict = extract_keywords(keywords_found)
 
                     st.write(f"**Знайдені ключові слова на {selected_url_for_keywords}:**")
                     st.write(keywords_dict)
@@ -678,9 +487,12 @@ def render_keyword_count(conn):
                     if selected_keywords:
                         chart_type = st.selectbox("Тип графіка",
                                                   ['Line Chart', 'Bar Chart'], key="keyword_chart_type_selectbox")
+                        # Історія всіх вибраних ключових слів завантажується одним запитом
+                        history_df = get_keywords_history(conn, competitor_name, selected_keywords,
+                                                          selected_url_for_keywords)
                         for keyword in selected_keywords:
                             st.subheader(f'Історія для ключового слова: {keyword}')
-                            keyword_history_df = get_keyword_history(conn, competitor_name, keyword)
+                            keyword_history_df = history_df[history_df['keyword'] == keyword.lower()]
                             if not keyword_history_df.empty:
                                 plot_keyword_history(keyword_history_df, keyword, selected_url_for_keywords,
                                                      chart_type)
@@ -696,8 +508,8 @@ def render_keyword_count(conn):
 
 def render_keyword_comparison(conn):
     st.title("Порівняння ключових слів між конкурентами")
-    # Отримуємо список конкурентів через функцію get_competitors_from_db
-    competitors = get_competitors_from_db(conn)
+    # Отримуємо список конкурентів з реєстру
+    competitors = get_snapshot_competitors(conn)
 
     selected_competitors = st.multiselect("Виберіть конкурентів для порівняння", competitors,
                                           default=competitors[:2], key="comparison_competitors_multiselect")
@@ -715,33 +527,35 @@ def render_keyword_comparison(conn):
 
 def render_page_content_with_keywords(conn):
     st.title("Контент сторінки з підсвіченими ключовими словами")
-    # Отримуємо список конкурентів через функцію get_competitors_from_db
-    competitors = get_competitors_from_db(conn)
+    # Отримуємо список конкурентів з реєстру
+    competitors = get_snapshot_competitors(conn)
 
     competitor_name_content = st.selectbox("Виберіть конкурента для перегляду контенту", competitors,
                                            key="content_competitor_selectbox_2")
 
-    df_content = get_keyword_data(conn, competitor_name_content)
+    # Сторінки і дати беруться легкими запитами, контент завантажується лише для обраного знімка
+    pages = get_pages_for_competitor(conn, competitor_name_content)
 
-    if not df_content.empty:
+    if pages:
         # Вибір URL для перегляду контенту
         selected_url_for_content = st.selectbox('Виберіть URL для перегляду контенту',
-                                                df_content['url'].unique(), key="content_url_selectbox_2")
+                                                pages, key="content_url_selectbox_2")
 
-        # Вибір дати
-        selected_date_for_content = st.selectbox('Виберіть дату',
-                                                 df_content[df_content['url'] == selected_url_for_content][
-                                                     'date_checked'].dt.date.unique(),
+        # Вибір дати (для кожного дня — перший знімок)
+        snapshot_dates = {}
+        for date in get_dates_for_page(conn, competitor_name_content, selected_url_for_content):
+            snapshot_dates.setdefault(pd.to_datetime(date).date(), date)
+        selected_date_for_content = st.selectbox('Виберіть дату', list(snapshot_dates),
                                                  key="content_date_selectbox")
 
         if selected_date_for_content:
-            # Фільтрація даних за URL та датою
-            page_content_data = df_content[(df_content['url'] == selected_url_for_content) & (
-                    df_content['date_checked'].dt.date == selected_date_for_content)]
+            date_checked = snapshot_dates[selected_date_for_content]
 
             # Отримання контенту сторінки
-            page_content = page_content_data['content'].values[0]
-            keywords_found = page_content_data['keywords_found'].values[0]
+            page_content = get_snapshot_content(conn, competitor_name_content, selected_url_for_content,
+                                                date_checked)
+            page_data = get_page_data(conn, competitor_name_content, selected_url_for_content, date_checked)
+            keywords_found = page_data['keywords_found'].values[0]
 
             # Обробка знайдених ключових слів
             keywords_dict = extract_keywords(keywords_found)
@@ -754,8 +568,8 @@ def render_page_content_with_keywords(conn):
 
 def render_content_comparison(conn):
     st.title("Порівняння контенту")
-    # Отримуємо список конкурентів через функцію get_competitors_from_db
-    competitors = get_competitors_from_db(conn)
+    # Отримуємо список конкурентів з реєстру
+    competitors = get_snapshot_competitors(conn)
 
     selected_competitor = st.selectbox('Виберіть конкурента', competitors)
 
@@ -809,10 +623,17 @@ def render_content_comparison(conn):
                         else:
                             st.info("Змін у метаданих не знайдено.")
 
-                        # Перевірка на наявність змін у контенті
-                        if data1['content'].values[0] != data2['content'].values[0]:
+                        # Зміни в контенті беруться зі збережених дифів сусідніх знімків; якщо пару не вдається
+                        # скласти з них, диф рахується з контенту
+                        content_diff = get_stored_diff(conn, selected_competitor, selected_page, date1_str, date2_str)
+                        if content_diff is None:
+                            content_diff = build_content_diff(
+                                get_snapshot_content(conn, selected_competitor, selected_page, date1_str),
+                                get_snapshot_content(conn, selected_competitor, selected_page, date2_str))
+                        # Грубе зведення з 0/0 означає перестановку рядків, а не відсутність змін
+                        if content_diff['added'] or content_diff['removed'] or content_diff['coarse']:
                             st.subheader("Зміни в контенті:")
-                            visualize_content_changes(data1['content'].values[0], data2['content'].values[0])
+                            visualize_content_diff(content_diff)
                         else:
                             st.info("Змін у контенті не знайдено.")
 